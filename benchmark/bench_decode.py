@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare `utils.decode` with the old ascii / chardet decode on pages of mixed encodings.
+
+Pages are made from `yascrapy/tests/test.html` with non-ascii text, some declare
+their charset in `Content-Type` or `<meta>`, some declare nothing.
+
+"""
+import os
+import time
+import codecs
+import chardet
+from yascrapy import utils
+
+
+def legacy_decode(s, content_type=None, url=None):
+    """ascii or `chardet` on the whole page, the old `utils.decode`."""
+    try:
+        return s.decode("ascii")
+    except Exception:
+        encoding = chardet.detect(s)["encoding"]
+        return s.decode(encoding)
+
+
+def make_corpus(html):
+    html = html.decode("utf-8")
+    zh = html.replace(u"<body", u"<body><p>%s</p" % (u"中文数据" * 20), 1)
+    jp = html.replace(u"<body", u"<body><p>%s</p" % (u"日本語のテキスト" * 20), 1)
+    de = html.replace(u"<body", u"<body><p>%s</p" % (u"Grüße aus Köln " * 20), 1)
+    zh_meta = zh.replace(u"<head>", u'<head><meta charset="gbk">', 1)
+    return [
+        ("utf-8 header", zh.encode("utf-8"), "text/html; charset=utf-8"),
+        ("utf-8", zh.encode("utf-8"), None),
+        ("utf-8 bom", codecs.BOM_UTF8 + jp.encode("utf-8"), None),
+        ("gbk meta", zh_meta.encode("gbk", "xmlcharrefreplace"), None),
+        ("gbk header", zh.encode("gbk", "xmlcharrefreplace"), "text/html; charset=gb2312"),
+        ("shift_jis", jp.encode("shift_jis", "xmlcharrefreplace"), None),
+        ("latin-1", de.encode("latin-1", "xmlcharrefreplace"), None),
+    ]
+
+
+def bench(name, func, corpus, cnt=20):
+    start = time.time()
+    for i in xrange(cnt):
+        for page_name, page, content_type in corpus:
+            func(page, content_type, "http://%s.example.com/" % page_name.split()[0])
+    end = time.time()
+    print "%s speed: %f pages/second" % (name, cnt * len(corpus) / (end - start))
+
+
+def main():
+    html_file = os.path.join(os.path.dirname(__file__), "..", "yascrapy", "tests", "test.html")
+    with open(html_file, "r") as f:
+        corpus = make_corpus(f.read())
+    for page_name, page, content_type in corpus:
+        start = time.time()
+        legacy_decode(page)
+        legacy_time = time.time() - start
+        start = time.time()
+        utils.decode(page, content_type, "http://%s.example.com/" % page_name.split()[0])
+        decode_time = time.time() - start
+        print "%s: %d bytes, legacy %f ms, decode %f ms" % (
+            page_name, len(page), legacy_time * 1000, decode_time * 1000)
+    bench("legacy", legacy_decode, corpus, cnt=2)
+    bench("decode", utils.decode, corpus)
+
+if __name__ == "__main__":
+    main()
@@ -26,5 +26,29 @@ def test():
     print "end time: ", end_time
     print "speed: %f times/second" % (page_cnt / (end_time - start_time))
 
+
+def test_pipeline(pipeline_size=100):
+    bloomd_client = get_client()
+    crawler_name = "test_crawler_1"
+    queue = FilterQueue(bloomd_client=bloomd_client, crawler_name=crawler_name,
+                        pipeline_size=pipeline_size)
+    page_cnt = 50000
+    logger = get_logger("test_pipeline")
+    start_time = time.time()
+    futures = []
+    for i in xrange(1, page_cnt + 1):
+        url = "http://stackoverflow.com/users?page=%d&tab=reputation&filter=week" % i
+        if i % 1000 == 0:
+            logger.info(str(i))
+        futures.append(queue.is_member_async(url))
+    queue.flush()
+    for future in futures:
+        future.result()
+    end_time = time.time()
+    queue.close()
+    print "pipeline_size: ", pipeline_size
+    print "speed: %f times/second" % (page_cnt / (end_time - start_time))
+
 if __name__ == "__main__":
     test()
+    test_pipeline()
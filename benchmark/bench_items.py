@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare hand-written `Response.xpath` parsing with `ItemPlan` on `test.html`."""
+import os
+import time
+from lxml.html import fromstring
+from yascrapy.response_queue import Selector
+from yascrapy.items import Field
+from yascrapy.items import ItemPlan
+
+
+class UserItem(dict):
+    name = Field(xpath='//h2[@class="user-card-name"]/text()[1]')
+    title = Field(css="title")
+    badges = Field(css=".badgecount", processors=[int], many=True)
+    tags = Field(xpath='//div[@class="tags"]/a/@href', many=True)
+
+
+class LinkItem(dict):
+    href = Field(xpath="@href")
+    text = Field(xpath=".", value="text")
+
+
+def parse_links(root):
+    items = []
+    for a in root.xpath("//a[@href]"):
+        item = LinkItem()
+        item["href"] = a.xpath("@href").extract()[0].strip()
+        item["text"] = a.strip()
+        items.append(item)
+    return items
+
+
+def parse(root):
+    item = UserItem()
+    item["name"] = root.xpath('//h2[@class="user-card-name"]/text()[1]').extract()[0].strip()
+    item["title"] = root.css("title").extract()[0].strip()
+    item["badges"] = [int(v.strip()) for v in root.css(".badgecount").extract()]
+    item["tags"] = [v.strip() for v in root.xpath('//div[@class="tags"]/a/@href').extract()]
+    return item
+
+
+def bench(name, func, root, cnt=2000):
+    start = time.time()
+    for i in xrange(cnt):
+        item = func(root)
+    end = time.time()
+    print "%s speed: %f pages/second" % (name, cnt / (end - start))
+    return item
+
+
+def main():
+    html_file = os.path.join(os.path.dirname(__file__), "..", "yascrapy", "tests", "test.html")
+    with open(html_file, "r") as f:
+        root = Selector(fromstring(f.read()))
+    plan = ItemPlan.from_item(UserItem)
+    item = bench("selectors", parse, root)
+    assert bench("item plan", plan.extract, root) == item
+    plan = ItemPlan.from_item(LinkItem, scope="//a[@href]")
+    items = bench("link selectors", parse_links, root, cnt=200)
+    assert bench("link item plan", plan.extract, root, cnt=200) == items
+
+if __name__ == "__main__":
+    main()
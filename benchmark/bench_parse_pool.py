@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare parsing `test.html` responses in threads with `ParsePool` processes."""
+import os
+import sys
+import json
+import time
+import Queue
+import threading
+import multiprocessing
+from yascrapy.parse_pool import ParsePool
+from yascrapy.response_queue import ResponseQueue
+from yascrapy.ssdb import get_clients
+from yascrapy.utils import init_resp_data
+
+
+def parse(response):
+    return [{"links": response.css("a").extract(), "name": response.xpath("//h2").extract()}]
+
+
+def make_worker():
+    worker = type("Worker", (object,), {})()
+    worker.crawler_name = "bench_crawler"
+    worker.ssdb_clients = get_clients(nodes=[{"Host": "127.0.0.1", "Port": 8888}])
+    worker.parse = parse
+    return worker
+
+
+def bench_threads(resp_data, cnt, threads_count):
+    resp_q = ResponseQueue("bench_crawler", ssdb_clients=make_worker().ssdb_clients)
+
+    def run():
+        for i in xrange(cnt / threads_count):
+            parse(resp_q._decode(resp_data))
+    start = time.time()
+    threads = [threading.Thread(target=run) for i in range(threads_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    end = time.time()
+    print "%d threads speed: %f responses/second" % (threads_count, cnt / (end - start))
+
+
+def bench_pool(resp_data, cnt, processes):
+    pool = ParsePool(make_worker(), processes)
+    results = Queue.Queue()
+    start = time.time()
+    for i in xrange(cnt):
+        pool.submit(resp_data, lambda *res: results.put(res))
+    for i in xrange(cnt):
+        results.get()
+    end = time.time()
+    pool.close()
+    print "%d processes speed: %f responses/second" % (processes, cnt / (end - start))
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else multiprocessing.cpu_count()
+    html_file = os.path.join(os.path.dirname(__file__), "..", "yascrapy", "tests", "test.html")
+    resp_d = init_resp_data("bench_crawler")
+    with open(html_file, "r") as f:
+        resp_d["html"] = f.read()
+    resp_data = json.dumps(resp_d)
+    cnt = 400
+    bench_threads(resp_data, cnt, processes)
+    bench_pool(resp_data, cnt, processes)
+
+if __name__ == "__main__":
+    main()
@@ -71,6 +71,57 @@ def test_rabbitmq_consume():
     ch.start_consuming()
     logging.info('end test basic_get')
 
+def fill_queue(ch, num):
+    for i in xrange(num):
+        ch.basic_publish(exchange='', routing_key=queue, body='http_response:test_crawler:%d' % i)
+
+
+def consume_batch(num, prefetch_count, ack_batch_size):
+    """consume `num` messages, ack every `ack_batch_size` messages with multiple=True."""
+    conn = pika.BlockingConnection(pika.ConnectionParameters(host=host, port=port))
+    ch = conn.channel()
+    ch.queue_declare(queue=queue, durable=True)
+    fill_queue(ch, num)
+    ch.basic_qos(prefetch_count=prefetch_count)
+    vars_ = {"cnt": 0, "last_tag": 0}
+
+    def callback(ch, method, properties, body):
+        vars_['cnt'] += 1
+        vars_['last_tag'] = method.delivery_tag
+        if vars_['cnt'] % ack_batch_size == 0:
+            ch.basic_ack(delivery_tag=method.delivery_tag, multiple=True)
+        if vars_['cnt'] >= num:
+            ch.stop_consuming()
+
+    start_time = time.time()
+    ch.basic_consume(callback, queue=queue)
+    ch.start_consuming()
+    end_time = time.time()
+    ch.basic_ack(delivery_tag=vars_['last_tag'], multiple=True)
+    conn.close()
+    logging.info("prefetch_count: %d ack_batch_size: %d speed: %f" % (
+        prefetch_count, ack_batch_size, vars_['cnt'] / (end_time - start_time)))
+
+
+def test_rabbitmq_consume_batch():
+    try:
+        num = int(sys.argv[1])
+    except:
+        logging.error('arguments num is wrong, e.g: python test_rabbitmq 10000')
+        return
+    for prefetch_count, ack_batch_size in [(1, 1), (10, 1), (10, 10), (100, 10), (100, 50), (500, 100)]:
+        consume_batch(num, prefetch_count, ack_batch_size)
+
+BENCHMARKS = {
+    'consume': test_rabbitmq_consume,
+    'get': test_rabbitmq_get,
+    'consume_batch': test_rabbitmq_consume_batch,
+}
+
 if __name__ == '__main__':
-    test_rabbitmq_consume()
-    # test_rabbitmq_get()
+    # e.g: python bench_rabbitmq.py 10000 consume_batch, default consume
+    name = sys.argv[2] if len(sys.argv) > 2 else 'consume'
+    if name not in BENCHMARKS:
+        logging.error('benchmark name is wrong, choose from %s' % ', '.join(sorted(BENCHMARKS)))
+        sys.exit(1)
+    BENCHMARKS[name]()
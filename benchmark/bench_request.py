@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#encoding: utf-8
+import sys
+import time
+from yascrapy.request_queue import Request
+from yascrapy.request_queue import LiteRequest
+from yascrapy.request_queue import CODECS
+
+
+def sizeof(obj):
+    """object size with its `__dict__` and the containers it owns."""
+    size = sys.getsizeof(obj)
+    attrs = getattr(obj, "__dict__", None)
+    if attrs is not None:
+        size += sys.getsizeof(attrs)
+    else:
+        attrs = dict([(k, getattr(obj, k)) for k in obj.__slots__])
+    for v in attrs.values():
+        if isinstance(v, (dict, list)):
+            size += sys.getsizeof(v)
+            if isinstance(v, dict):
+                for item in v.values():
+                    if isinstance(item, (dict, list)):
+                        size += sys.getsizeof(item)
+    return size
+
+
+def bench_construct():
+    kwargs = dict(
+        url="http://stackoverflow.com/users?page=1&tab=reputation&filter=week",
+        timeout=15,
+        crawler_name="github",
+        proxy_name="http_china",
+        method="GET",
+        params={},
+        data=""
+    )
+    cnt = 100000
+    for cls in (Request, LiteRequest):
+        start = time.time()
+        for i in xrange(cnt):
+            cls(**kwargs)
+        end = time.time()
+        print "%s: %d bytes/object, construct speed: %f/s" % (
+            cls.__name__, sizeof(cls(**kwargs)), cnt / (end - start))
+
+
+def main():
+    r = Request(
+        url="http://stackoverflow.com/users?page=1&tab=reputation&filter=week",
+        timeout=15,
+        crawler_name="github",
+        proxy_name="http_china",
+        method="GET",
+        headers={"User-Agent": "Mozilla/5.0 (X11; Linux x86_64)"},
+        params={},
+        data=""
+    )
+    cnt = 100000
+    for codec in sorted(CODECS):
+        try:
+            data = r.encode(codec)
+        except Exception as e:
+            print "%s: %s" % (codec, str(e))
+            continue
+        start = time.time()
+        for i in xrange(cnt):
+            r.encode(codec)
+        end = time.time()
+        encode_speed = cnt / (end - start)
+        req = Request()
+        start = time.time()
+        for i in xrange(cnt):
+            req.decode(data)
+        end = time.time()
+        print "%s: %d bytes/message, encode speed: %f/s, decode speed: %f/s" % (
+            codec, len(data), encode_speed, cnt / (end - start))
+
+if __name__ == "__main__":
+    bench_construct()
+    main()
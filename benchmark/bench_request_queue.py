@@ -53,6 +53,42 @@ def test():
     print "start time: ", start_time
     print "end time: ", end_time
     print "speed: %f times/second" % (page_cnt / (end_time - start_time))
+    return queue, publish_channel
+
+
+def test_safe_push(queue, publish_channel, batch_size=1000):
+    """Compare per-url `safe_push` with batched `safe_push_many`."""
+    crawler_name = queue.crawler_name
+    page_cnt = 50000
+    logger = get_logger("test_safe_push")
+    # use a fresh url space every run, bloomd filter is persistent.
+    run_id = int(time.time())
+
+    start_time = time.time()
+    for i in xrange(1, page_cnt + 1):
+        url = "http://stackoverflow.com/users?page=%d&run=%d&mode=single" % (i, run_id)
+        if i % 1000 == 0:
+            logger.info(str(i))
+        r = Request(url=url, timeout=15, headers={}, crawler_name=crawler_name)
+        queue.safe_push(r, publish_channel)
+    end_time = time.time()
+    print "safe_push speed: %f times/second" % (page_cnt / (end_time - start_time))
+
+    start_time = time.time()
+    batch = []
+    for i in xrange(1, page_cnt + 1):
+        url = "http://stackoverflow.com/users?page=%d&run=%d&mode=batch" % (i, run_id)
+        batch.append(Request(url=url, timeout=15, headers={}, crawler_name=crawler_name))
+        if len(batch) == batch_size:
+            queue.safe_push_many(batch, publish_channel)
+            batch = []
+            logger.info(str(i))
+    if batch:
+        queue.safe_push_many(batch, publish_channel)
+    end_time = time.time()
+    print "safe_push_many(batch_size=%d) speed: %f times/second" % (
+        batch_size, page_cnt / (end_time - start_time))
 
 if __name__ == "__main__":
-    test()
+    queue, publish_channel = test()
+    test_safe_push(queue, publish_channel)
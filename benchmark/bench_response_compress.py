@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare stored size and worker decode speed of compressed responses.
+
+Pages of one template are made from `yascrapy/tests/test.html` with random
+digits, the dictionary is trained on some of them and used on another one.
+
+"""
+import os
+import re
+import json
+import time
+import random
+from yascrapy.response_queue import Response
+from yascrapy.response_queue import train_dictionary
+from yascrapy.response_queue import lz4
+from yascrapy.utils import init_resp_data
+
+
+def make_page(html, seed):
+    r = random.Random(seed)
+    return re.sub(r"\d", lambda m: str(r.randint(0, 9)), html)
+
+
+def bench(name, resp, compression, html_only=False, dictionary=None):
+    cnt = 500
+    dictionaries = {}
+    if dictionary is not None:
+        dictionaries[dictionary.id] = dictionary
+    start = time.time()
+    for i in xrange(cnt):
+        data = resp.encode(compression, html_only, dictionary)
+    encode_time = time.time() - start
+    start = time.time()
+    for i in xrange(cnt):
+        Response().decode(data, dictionaries)
+    decode_time = time.time() - start
+    print "%s: %d bytes, encode speed: %f/s, decode speed: %f/s" % (
+        name, len(data), cnt / encode_time, cnt / decode_time)
+
+
+def main():
+    html_file = os.path.join(os.path.dirname(__file__), "..", "yascrapy", "tests", "test.html")
+    with open(html_file, "r") as f:
+        html = f.read()
+    dictionary = train_dictionary([make_page(html, i) for i in range(20)])
+    resp_d = init_resp_data("bench_crawler")
+    resp_d["html"] = make_page(html, 100)
+    resp = Response()
+    resp.from_json(json.dumps(resp_d))
+    print "dictionary: %d bytes" % len(dictionary.data)
+    bench("json", resp, None)
+    bench("zlib", resp, "zlib")
+    bench("zlib html", resp, "zlib", html_only=True)
+    bench("zlib dictionary", resp, "zlib", dictionary=dictionary)
+    bench("zlib html dictionary", resp, "zlib", html_only=True, dictionary=dictionary)
+    if lz4 is not None:
+        bench("lz4", resp, "lz4")
+        bench("lz4 html", resp, "lz4", html_only=True)
+
+if __name__ == "__main__":
+    main()
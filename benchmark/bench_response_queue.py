@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare `ResponseQueue.get` round-trips against a local redis stand-in.
+
+Usage:
+
+>>> python bench_response_queue.py 127.0.0.1 6379
+
+"""
+import os
+import sys
+import time
+import json
+from yascrapy.ssdb import get_clients
+from yascrapy.ssdb import get_client
+from yascrapy.response_queue import ResponseQueue
+from yascrapy.response_queue import Response
+from yascrapy.utils import init_resp_data
+
+
+def fill(resp_q, keys, resp):
+    for k in keys:
+        resp_q.push_cache(resp, k)
+
+
+def legacy_get(resp_q, resp_key):
+    """`GET` and `DEL` in two round-trips, the old `ResponseQueue.get`."""
+    client = get_client(resp_q.ssdb_clients, resp_key)
+    r = client["client"]
+    resp_data = r.get(resp_key)
+    r.delete(resp_key)
+    if not resp_data:
+        return None, 1
+    resp = Response()
+    resp.from_json(resp_data)
+    return resp, 0
+
+
+def bench(name, get, resp_q, keys):
+    start_time = time.time()
+    for k in keys:
+        resp, code = get(resp_q, k)
+        assert code == 0
+    end_time = time.time()
+    print "%s speed: %f gets/second" % (name, len(keys) / (end_time - start_time))
+
+
+def main():
+    host = sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 6379
+    crawler_name = "bench_crawler"
+    ssdb_clients = get_clients(nodes=[{"Host": host, "Port": port}])
+    html_file = os.path.join(os.path.dirname(__file__), "..", "yascrapy", "tests", "test.html")
+    resp_d = init_resp_data(crawler_name)
+    with open(html_file, "r") as f:
+        resp_d["html"] = f.read()
+    resp = Response()
+    resp.from_json(json.dumps(resp_d))
+    cnt = 10000
+    keys = ["http_response:%s:%d" % (crawler_name, i) for i in xrange(cnt)]
+
+    resp_q = ResponseQueue(crawler_name, ssdb_clients=ssdb_clients)
+    fill(resp_q, keys, resp)
+    bench("get + delete", legacy_get, resp_q, keys)
+
+    fill(resp_q, keys, resp)
+    bench("pipelined get", ResponseQueue.get, resp_q, keys)
+
+    getdel_q = ResponseQueue(crawler_name, ssdb_clients=ssdb_clients, use_getdel=True)
+    fill(getdel_q, keys, resp)
+    try:
+        bench("getdel", ResponseQueue.get, getdel_q, keys)
+    except Exception as e:
+        print "getdel not supported: %s" % str(e)
+
+if __name__ == "__main__":
+    main()
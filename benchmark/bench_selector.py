@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare selectors with and without the compiled selector cache on `test.html`."""
+import os
+import time
+from lxml.html import fromstring
+from yascrapy.response_queue import Selector
+from yascrapy.response_queue import selector_cache
+
+CSS_SELECTORS = [".user-card-name", ".badges .badgecount", "a.question-hyperlink", "#avatar-card img"]
+XPATH_SELECTORS = ['//h2[@class="user-card-name"]/text()', '//div[@class="tags"]/a/@href']
+
+
+def bench(name, root, cnt=2000):
+    start = time.time()
+    for i in xrange(cnt):
+        for css_selector in CSS_SELECTORS:
+            root.css(css_selector)
+        for xpath_selector in XPATH_SELECTORS:
+            root.xpath(xpath_selector)
+    end = time.time()
+    print "%s speed: %f pages/second" % (name, cnt / (end - start))
+
+
+def main():
+    html_file = os.path.join(os.path.dirname(__file__), "..", "yascrapy", "tests", "test.html")
+    with open(html_file, "r") as f:
+        root = Selector(fromstring(f.read()))
+    selector_cache.resize(0)
+    bench("no cache", root)
+    selector_cache.resize(1024)
+    bench("selector cache", root)
+    print selector_cache.stats()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import time
+import hash_ring
+from yascrapy.ssdb import get_clients
+from yascrapy.ssdb import get_client
+
+
+def legacy_get_client(clients, key):
+    """ring lookup with linear scan, the old `yascrapy.ssdb.get_client`."""
+    ssdb_nodes, ring = clients
+    found_server = ring.get_node(key)
+    if found_server is None:
+        return None
+    for ssdb_node in ssdb_nodes:
+        if ssdb_node["tag"] == found_server:
+            return ssdb_node
+    return None
+
+
+def bench(name, func, clients, keys):
+    start_time = time.time()
+    for k in keys:
+        func(clients, k)
+    end_time = time.time()
+    print "%s speed: %f lookups/second" % (name, len(keys) / (end_time - start_time))
+
+
+def test():
+    key_cnt = 100000
+    keys = ["http_response:test_crawler:http://stackoverflow.com/users?page=%d" % i
+            for i in xrange(key_cnt)]
+    # hot keys, looked up repeatedly
+    hot_keys = keys[:100] * (key_cnt / 100)
+    for node_cnt in [1, 8, 64]:
+        nodes = [{"Host": "10.0.0.%d" % i, "Port": 8888} for i in range(node_cnt)]
+        print "ssdb nodes: %d" % node_cnt
+        ssdb_nodes, ring = get_clients(nodes=nodes)
+        legacy_clients = (ssdb_nodes, hash_ring.HashRing([n["tag"] for n in ssdb_nodes]))
+        bench("legacy", legacy_get_client, legacy_clients, keys)
+        bench("get_client", get_client, (ssdb_nodes, ring), keys)
+        memo_clients = get_clients(nodes=nodes, memo_size=1000)
+        bench("get_client memo, hot keys", get_client, memo_clients, hot_keys)
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare full parse with `Response.stream` on a large page made of `test.html`."""
+import os
+import time
+import json
+import resource
+from yascrapy.response_queue import Response
+from yascrapy.response_queue import StreamExtractor
+from yascrapy.response_queue import StreamField
+from yascrapy.utils import init_resp_data
+
+
+def bench(name, func, resp, cnt=20):
+    start = time.time()
+    for i in xrange(cnt):
+        resp.root = None
+        res = func(resp)
+    end = time.time()
+    print "%s speed: %f pages/second, max rss: %d KB, %r" % (
+        name, cnt / (end - start), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, res)
+
+
+def main():
+    html_file = os.path.join(os.path.dirname(__file__), "..", "yascrapy", "tests", "test.html")
+    with open(html_file, "r") as f:
+        html = f.read()
+    body = html.index("<body")
+    # about 5MB page, the body repeated
+    html = html[:body] + html[body:].replace("</body>", "") * 100 + "</body></html>"
+    resp_d = init_resp_data("bench_crawler")
+    resp_d["html"] = html
+    resp = Response()
+    resp.from_json(json.dumps(resp_d))
+    print "page: %d bytes" % len(html)
+    extractor = StreamExtractor([
+        StreamField("title", "title"),
+        StreamField("name", "h2", attrs={"class": "user-card-name"}),
+    ])
+    bench("stream", lambda r: r.stream(extractor), resp)
+    bench("xpath", lambda r: (r.xpath("//title")[0].strip(),
+                              r.xpath('//h2[@class="user-card-name"]')[0].strip()), resp)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 # coding=utf-8
+from yascrapy.items import Field
 
 
 class TestItem(dict):
     uid = None
-    name = None
+    name = Field(xpath='//h2[@class="user-card-name"]/text()[1]')
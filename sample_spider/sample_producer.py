@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
-from yascrapy.request_queue import Request
+from yascrapy.request_queue import LiteRequest
 from yascrapy.base import BaseProducer
-import random
 
 
 class Producer(BaseProducer):
@@ -15,7 +14,7 @@ class Producer(BaseProducer):
             cnt += 1
             if cnt % 1000 == 0:
                 print cnt
-            r = Request(
+            r = LiteRequest(
                 url=url,
                 timeout=15,
                 crawler_name=self.crawler_name,
@@ -24,5 +23,5 @@ class Producer(BaseProducer):
                 params={},
                 data=''
             )
-            q = random.choice(self.req_queues)
+            q = self.choose_request_queue()
             q.safe_push(r, self.publish_channel)
@@ -11,7 +11,7 @@ class Worker(BaseWorker):
     def callback(self, channel, method, properties, body):
         resp_key = body
         response, err = self.resp_q.get(resp_key)
-        channel.basic_ack(delivery_tag=method.delivery_tag)
+        self.ack(channel, method)
         if response is None:
             logging.warning("no match response to response_key %s" % resp_key)
             return
@@ -27,7 +27,6 @@ class Worker(BaseWorker):
         self.db_handler.update(item)
 
     def _user_parse(self, response):
-        item = TestItem()
+        item = self.extract(response, TestItem)
         item['uid'] = int(response.url.split('/')[-2])
-        item['name'] = response.xpath(self.name_xpath).extract()[0].strip()
         return item
@@ -7,8 +7,38 @@ crawler_name = "sample_crawler"
 proxy_name = "http_oversea"
 bloomd_capacity = 100000
 bloomd_error_rate = 1e-3
+# in-process bloom filter in front of bloomd, shared by worker threads, 0 means disabled
+bloomd_local_capacity = 0
+# split bloomd filter across all BloomdNodes
+bloomd_sharded = False
+# producers check and set urls through a bloomd pipeline flushed every this
+# many commands or filter_pipeline_delay seconds, 0 means one request per url
+filter_pipeline_size = 0
+filter_pipeline_delay = 0.005
 request_queue_count = 10
 response_queue_count = 5
+# producer messages waiting for publisher confirms, 0 means wait for every message
+publish_window = 0
+# producers poll request queue depths every this many seconds and push to the
+# least full queues, "amqp" or "http" for rabbitmq management api, 0 means random queues
+queue_monitor_interval = 0
+queue_monitor_source = "amqp"
+request_queue_max = 1000000
+# handle responses in batch with `batch_callback` if more than 1
+response_batch_size = 1
+response_batch_delay = 0.1
+# rabbitmq consumer prefetch, acknowledge messages in batch if more than 1
+prefetch_count = 1
+ack_batch_size = 1
+ack_batch_delay = 0.1
+# compress test responses in ssdb, "zlib" or "lz4", workers detect it from the header
+response_compression = None
+# compiled css / xpath selectors kept by every worker process
+selector_cache_size = 1024
+# parse in this many processes with `parse` instead of `callback`, 0 means parse in threads
+parse_processes = 0
+# in-flight messages of one rabbitmq ioloop per process, 0 means one ioloop per thread
+concurrency = 0
 
 # settings used by this crawler
 test_urls = [
@@ -16,8 +46,6 @@ test_urls = [
     'http://stackoverflow.com/users/2698777/cphilo',
     'http://stackoverflow.com/users/341994/matt'
 ]
-# all xpath strings
-name_xpath = '//h2[@class="user-card-name"]/text()[1]'
 
 
 plugins = [
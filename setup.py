@@ -26,12 +26,16 @@ setup(
     install_requires=[
         "redis",
         "hash_ring",
-        "pika",
+        "pika>=0.10,<0.11",
         "requests==2.8.1",
         "lxml",
         "cssselect",
         "pymongo"
     ],
+    extras_require={
+        "msgpack": ["msgpack>=0.5.2"],
+        "lz4": ["lz4"]
+    },
     package_data={'yascrapy.tests': ['test.html', '404_err.html']},
     test_suite='nose.collector',
     tests_require=['nose', 'nose-cover3'],
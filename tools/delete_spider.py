@@ -5,6 +5,7 @@ import redis
 from yascrapy.config import Config
 from yascrapy import bloomd
 from yascrapy.rabbitmq import create_conn
+from yascrapy.ssdb import KeyScanner
 
 
 def del_bloomd_filter(cfg, crawler_name):
@@ -47,18 +48,20 @@ def del_ssdb_cache(cfg, crawler_name):
 
         start = "http_request:%s:" % crawler_name
         end = "http_request:%s:z" % crawler_name
-        keys = r.execute_command("keys", start, end, -1)
-        print "[info] crawler %s req keys: %d" % (crawler_name, len(keys))
-        for k in keys:
-            r.delete(k)
+        cnt = 0
+        for keys in KeyScanner(r, start, end).pages():
+            r.delete(*keys)
+            cnt += len(keys)
+        print "[info] crawler %s req keys: %d" % (crawler_name, cnt)
         print "[info] del crawler %s req keys on %s:%s success" % (crawler_name, ssdb_host, ssdb_port) 
         
         start = "http_response:%s:" % crawler_name
         end = "http_response:%s:z" % crawler_name
-        keys = r.execute_command("keys", start, end, -1)
-        print "[info] crawler %s resp keys: %d" % (crawler_name, len(keys))
-        for k in keys:
-            r.delete(k)
+        cnt = 0
+        for keys in KeyScanner(r, start, end).pages():
+            r.delete(*keys)
+            cnt += len(keys)
+        print "[info] crawler %s resp keys: %d" % (crawler_name, cnt)
         print "[info] del crawler %s resp keys on %s:%s success" % (crawler_name, ssdb_host, ssdb_port) 
 
 
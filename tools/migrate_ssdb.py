@@ -5,6 +5,7 @@ import json
 import redis
 import time
 import multiprocessing
+from yascrapy.ssdb import KeyScanner
 
 
 class SSDBMigration:
@@ -15,6 +16,8 @@ class SSDBMigration:
         self.from_port = cfg["from_port"]
         self.to_host = cfg["to_host"]
         self.to_port = cfg["to_port"]
+        self.page_size = cfg.get("page_size", 1000)
+        self.checkpoint = cfg.get("checkpoint")
 
     def run(self):
         start = "http_request:%s:" % self.crawler_name
@@ -33,23 +36,24 @@ class SSDBMigration:
         )
         fclient = redis.Redis(connection_pool=from_conn_pool)
         tclient = redis.Redis(connection_pool=to_conn_pool)
+        # cursor of every source node is kept, a restarted migration continues after it
+        scanner = KeyScanner(fclient, start, end, page_size=self.page_size,
+                             checkpoint=self.checkpoint)
         cnt = 0
         while True:
-            if cnt % 10000 == 0:
-                print cnt
-            keys = fclient.execute_command("keys", start, end, 1000)
-            if len(keys) == 0:
-                print "[info] ssdb node %s:%s empty" % (self.from_host, self.from_port)
-                time.sleep(5)
-                continue
-            values = fclient.mget(keys)
-            d = {k: values[i] for i, k in enumerate(keys)}
-            for k, v in d.items():
-                # print "[info] get k", k
-                pass
-            tclient.mset(d)
-            fclient.delete(*keys)
-            cnt += 1000
+            for keys in scanner.pages():
+                values = fclient.mget(keys)
+                d = dict([(k, v) for k, v in zip(keys, values) if v is not None])
+                if d:
+                    tclient.mset(d)
+                fclient.delete(*keys)
+                # pages may be short, print when the count passes every 10000 keys
+                if (cnt + len(keys)) // 10000 > cnt // 10000:
+                    print "[info] %s:%s migrated %d" % (self.from_host, self.from_port, cnt + len(keys))
+                cnt += len(keys)
+            print "[info] ssdb node %s:%s empty" % (self.from_host, self.from_port)
+            time.sleep(5)
+            scanner.reset()
 
 
 def input_params():
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import pika
-import redis
 from yascrapy.ssdb import get_client, get_clients
 from yascrapy.request_queue import Request
 from yascrapy.config import Config
@@ -45,13 +44,12 @@ class Rabbitmqtossdb:
 
     def callback(self, ch, method, properties, body):
         req = Request()
-        req.from_json(body)
+        req.decode(body)
         k = "http_request:%s:%s" % (self.crawler, req.url)
         # print k
         client = get_client(self.ssdb_clients, k)
         # print client["tag"]
-        rclient = redis.Redis(connection_pool=client['connection_pool'])
-        rclient.set(k, body)
+        client["client"].set(k, body)
         ch.basic_ack(delivery_tag=method.delivery_tag)
 
 def input_params():
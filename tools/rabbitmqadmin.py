@@ -9,6 +9,8 @@ import random
 import pprint
 import traceback
 import logging
+from yascrapy.config import Config
+from yascrapy.rabbitmq import QueueMonitor
 
 def get_conn():
     conf_file = '/etc/yascrapy/config.json'
@@ -64,6 +66,15 @@ def get(args):
     pprint.pprint(random.choice(res))
     conn.close()
 
+def depth(args):
+    queues = args.queues.split(',')
+    cfg = Config(conf_file=args.conf).get()
+    monitor = QueueMonitor(cfg, queues, source=args.source)
+    depths = monitor.poll()
+    for queue in queues:
+        print "%s: %s" % (queue, depths.get(queue, "not found"))
+    monitor.stop()
+
 def input_params():
     parser = argparse.ArgumentParser(prog="rabbitmq operators", 
         description="Target: rabbitmq operators, include delete, get, etc"
@@ -95,8 +106,35 @@ def input_params():
         type=str
     )
 
+    depth_parser = subparsers.add_parser(
+        "depth",
+        help="show message count of rabbitmq queues"
+    )
+    depth_parser.add_argument(
+        '-q',
+        '--queues',
+        help='specify the queues, use "," to split queues, e.g queue1,queue2',
+        default='',
+        type=str
+    )
+    depth_parser.add_argument(
+        '-f',
+        '--conf',
+        help='specify common config file, default `/etc/yascrapy/common.json`',
+        default='/etc/yascrapy/common.json',
+        type=str
+    )
+    depth_parser.add_argument(
+        '-s',
+        '--source',
+        help='specify `amqp` for passive queue_declare, `http` for rabbitmq management api',
+        choices=['amqp', 'http'],
+        default='amqp'
+    )
+
     delete_parser.set_defaults(func=delete)
     get_parser.set_defaults(func=get)
+    depth_parser.set_defaults(func=depth)
 
     args = parser.parse_args()
     args.func(args)
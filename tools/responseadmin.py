@@ -4,6 +4,7 @@ import redis
 import argparse
 from yascrapy.ssdb import get_client
 from yascrapy.ssdb import get_clients
+from yascrapy.ssdb import KeyScanner
 from yascrapy.config import Config
 
 
@@ -30,17 +31,17 @@ def status(args):
     start = "http_response:%s:" % crawler_name
     end = "http_response:%s:z" % crawler_name
     nodes = Config().get()["SSDBNodes"]
-    clients = get_clients(nodes=nodes)
+    ssdb_clients, ring = get_clients(nodes=nodes)
     total = 0
-    for client in clients:
+    for client in ssdb_clients:
         print "%s:%s" % (client["node"]["Host"], client["node"]["Port"])
-        r = redis.Redis(connection_pool=client["connection_pool"])
-        keys = r.execute_command("keys", start, end, -1)
-        total += len(keys)
-        print "length: ", len(keys)
+        scanner = KeyScanner(client["client"], start, end, page_size=args.page_size)
+        length = 0
+        for keys in scanner.pages():
+            length += len(keys)
+        total += length
+        print "length: ", length
     print "total: ", total
-    
-
 
 
 def input_params():
@@ -55,6 +56,7 @@ def input_params():
     )
     status_parser.set_defaults(func=status)
     status_parser.add_argument("-c", "--crawler_name", help="specify crawler name, can not be empty", default="", type=str)
+    status_parser.add_argument("-p", "--page_size", help="specify keys counted in one ssdb request, default 10000", default=10000, type=int)
 
     get_parser = subparsers.add_parser(
         "get",
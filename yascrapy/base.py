@@ -3,18 +3,25 @@
 from .request_queue import RequestQueue
 from .response_queue import ResponseQueue
 from .response_queue import Response
+from .response_queue import selector_cache
 from .filter_queue import FilterQueue
+from .items import ItemPlan
 from .ssdb import get_clients
-from .ssdb import get_proxy_client
 from .rabbitmq import create_conn
 from .rabbitmq import AsyncConsumer
+from .rabbitmq import AsyncPublisher
+from .rabbitmq import QueueMonitor
 from . import bloomd
 from .config import Config
-from .utils import init_req_data, init_resp_data
+from .resources import Resources
+from .utils import init_req_data, init_resp_data, decode
 import logging
 import requests
 import json
+import Queue
+import os
 import random
+import time
 import re
 import inspect
 import importlib
@@ -27,7 +34,6 @@ class BaseProducer(object):
 
         from yascrapy.request_queue import Request
         from yascrapy.base import BaseProducer
-        import random
 
         class Producer(BaseProducer):
 
@@ -43,7 +49,7 @@ class BaseProducer(object):
                         params={},
                         data=''
                     )
-                    q = random.choice(self.req_queues)
+                    q = self.choose_request_queue()
                     q.safe_push(r, self.publish_channel)
 
     """
@@ -68,8 +74,13 @@ class BaseProducer(object):
             crawler_name=self.crawler_name,
             bloomd_client=bloomd_client,
             capacity=self.bloomd_capacity,
-            prob=self.bloomd_error_rate
+            prob=self.bloomd_error_rate,
+            local_capacity=getattr(self, "bloomd_local_capacity", 0),
+            pipeline_size=getattr(self, "filter_pipeline_size", 0),
+            pipeline_delay=getattr(self, "filter_pipeline_delay", 0.005),
+            sharded=getattr(self, "bloomd_sharded", False)
         )
+        self.filter_q = filter_q
 
         ch = self.rabbitmq_conn.channel()
         ch.exchange_declare(
@@ -107,8 +118,26 @@ class BaseProducer(object):
             )
             self.req_queues.append(q)
 
-        self.publish_channel = self.rabbitmq_conn.channel()
-        self.publish_channel.confirm_delivery()
+        self._req_queue_names = dict([(q.queue_name, q) for q in self.req_queues])
+        # `yascrapy_producer` builds producers before forking, the poll thread
+        # is started by `start` or `choose_request_queue` in the process using it
+        self.queue_monitor = None
+        self._monitor_pid = None
+        monitor_interval = getattr(self, "queue_monitor_interval", 0)
+        if monitor_interval:
+            self.queue_monitor = QueueMonitor(
+                cfg, [q.queue_name for q in self.req_queues],
+                interval=monitor_interval,
+                source=getattr(self, "queue_monitor_source", "amqp")
+            )
+
+        publish_window = getattr(self, "publish_window", 0)
+        if publish_window:
+            self.publish_channel = AsyncPublisher(
+                self.rabbitmq_conn, window=publish_window)
+        else:
+            self.publish_channel = self.rabbitmq_conn.channel()
+            self.publish_channel.confirm_delivery()
 
     def load_settings(self, settings):
         """Load attributes from settings module.
@@ -128,10 +157,57 @@ class BaseProducer(object):
                     setattr(self, attr, v)
                     add_attributes.append(attr)
 
+    def choose_request_queue(self):
+        """Choose a `RequestQueue` to push to.
+
+        With `queue_monitor_interval` in `settings`, queues are chosen by depths
+        cached by `yascrapy.rabbitmq.QueueMonitor`, the least full queues get
+        most requests, and it waits while all queues have `request_queue_max`
+        messages. Otherwise a random queue is chosen.
+
+        :returns: `RequestQueue` object.
+
+        """
+        if self.queue_monitor is None:
+            return random.choice(self.req_queues)
+        self._start_monitor()
+        queue_max = getattr(self, "request_queue_max", 1000000)
+        while True:
+            queue_name = self.queue_monitor.choose(queue_max)
+            if queue_name is not None:
+                break
+            time.sleep(self.queue_monitor.interval)
+        return self._req_queue_names[queue_name]
+
+    def _start_monitor(self):
+        """Start the `QueueMonitor` poll thread once in the current process."""
+        if self.queue_monitor is not None and self._monitor_pid != os.getpid():
+            self._monitor_pid = os.getpid()
+            self.queue_monitor.start()
+
     def run(self):
         """You need override this method to put initial links to `RequestQueue`."""
         pass
 
+    def start(self):
+        """Entry with `yascrapy_producer` script, call `run` and wait for
+        publisher confirms if `publish_window` in `settings` is set.
+
+        With `publish_window`, `publish_channel` is `yascrapy.rabbitmq.AsyncPublisher`,
+        up to `publish_window` messages wait for confirms at the same time.
+
+        With `filter_pipeline_size`, `safe_push` checks and sets urls through
+        a bloomd pipeline, its buffered commands are sent and waited for at the end.
+
+        """
+        self._start_monitor()
+        try:
+            self.run()
+            if isinstance(self.publish_channel, AsyncPublisher):
+                self.publish_channel.flush()
+        finally:
+            self.filter_q.close()
+
 
 class BaseWorker(object):
 
@@ -151,7 +227,8 @@ class BaseWorker(object):
     """
 
     def __init__(self, log_level=logging.INFO, test=False, profile=False,
-                 profile_log="", config_file="/etc/yascrapy/common.json", settings=None):
+                 profile_log="", config_file="/etc/yascrapy/common.json", settings=None,
+                 resources=None):
         """Init with params from `yascrapy_worker` script.
 
         :param log_level: logging level to use, use `logging.INFO` on default.
@@ -160,6 +237,8 @@ class BaseWorker(object):
         :param profile_log: string, profile log file path if `profile` is `True`.
         :param config_file: optional string, config file used by all workers.
         :param  settings: python module object, configs used by this worker.
+        :param resources: optional `yascrapy.resources.Resources` object, clients
+            shared with other worker threads, this worker creates its own if not specified.
 
         """
         self.load_settings(settings)
@@ -173,15 +252,38 @@ class BaseWorker(object):
             self.request_queue_count = 1
         self.profile = profile
         self.profile_log = profile_log
-        self.cfg = Config(conf_file=config_file).get()
-        self.ssdb_clients = get_clients(nodes=self.cfg["SSDBNodes"])
-        self.proxy_client = get_proxy_client(cfg=self.cfg)
-        self.bloomd_client = bloomd.get_client(nodes=self.cfg["BloomdNodes"])
+        selector_cache.resize(getattr(self, "selector_cache_size", selector_cache.maxsize))
+        self._item_plans = {}
+        # set by `yascrapy_worker` if `parse_processes` is set, see `parse`
+        self.parse_pool = None
+        # set by `yascrapy.runtime.EventRuntime`
+        self.runtime = None
+        self._parsed = Queue.Queue()
+        self._parse_pending = 0
+        self._parse_conn = None
+        self._parse_timer = 0
+        self._batch = []
+        self._batch_id = 0
+        if resources is None:
+            resources = Resources(config_file)
+        self.resources = resources
+        self.cfg = resources.cfg
+        self.ssdb_clients = resources.ssdb_clients
+        self.proxy_client = resources.proxy_client
+        self.bloomd_client = resources.bloomd_client
+        # one local filter of urls added by all worker threads of the process
+        local_capacity = getattr(self, "bloomd_local_capacity", 0)
+        local_filter = None
+        if local_capacity:
+            local_filter = resources.local_filter(
+                self.crawler_name, local_capacity, self.bloomd_error_rate)
         self.filter_q = FilterQueue(
             crawler_name=self.crawler_name,
             bloomd_client=self.bloomd_client,
             capacity=self.bloomd_capacity,
-            prob=self.bloomd_error_rate
+            prob=self.bloomd_error_rate,
+            local_filter=local_filter,
+            sharded=getattr(self, "bloomd_sharded", False)
         )
         logging.basicConfig(
             level=log_level,
@@ -241,20 +343,215 @@ class BaseWorker(object):
 
             resp_key = body
             response, err = self.resp_q.get(resp_key)
-            channel.basic_ack(delivery_tag=method.delivery_tag)
+            self.ack(channel, method)
 
             ... Then comes to your response parsing logic ...
 
         """
         pass
 
+    def extract(self, response, item_class, scope=None):
+        """Extract item with the `Field` attributes of `item_class`, see `yascrapy.items`.
+
+        :param response: `Response` object.
+        :param item_class: class, dict subclass with `Field` attributes.
+        :param scope: optional string, xpath of item nodes, returns a list of items.
+        :returns: item object, or list of item objects if `scope` is set.
+
+        The `ItemPlan` of every item class is compiled once for this worker.
+        """
+        plan = self._item_plans.get((item_class, scope))
+        if plan is None:
+            plan = ItemPlan.from_item(item_class, scope)
+            self._item_plans[(item_class, scope)] = plan
+        return plan.extract(response)
+
+    def batch_callback(self, channel, deliveries, responses):
+        """Write this method instead of `callback` if `response_batch_size` in
+        `settings` is more than 1. Responses of the batch are fetched from ssdb
+        with `ResponseQueue.get_many`, the batch is handled when it is full or
+        `response_batch_delay` seconds after its first message.
+
+        :param channel: rabbitmq channel to use with `RequestQueue`.
+        :param deliveries: list of tuple, `(method, properties, body)` of every rabbitmq message.
+        :param responses: list of `Response` object or None if ssdb empty, same order as `deliveries`.
+
+        :Example usage::
+
+            for (method, properties, body), response in zip(deliveries, responses):
+                self.ack(channel, method)
+                if response is None:
+                    continue
+
+                ... Then comes to your response parsing logic ...
+
+        """
+        pass
+
+    def parse(self, response):
+        """Write this method instead of `callback` if `parse_processes` in `settings`
+        is set, responses are parsed in a process pool, see `yascrapy.parse_pool`.
+
+        :param response: `Response` object.
+        :returns: list of items and `Request` objects.
+
+        This method runs in a child process, do not use rabbitmq, ssdb or plugins
+        here. Items are saved and requests are pushed by `handle_results`.
+
+        :Example usage::
+
+            item = self.extract(response, TestItem)
+            item['uid'] = int(response.url.split('/')[-2])
+            return [item]
+
+        """
+        return []
+
+    def handle_results(self, channel, items, requests):
+        """Handle `parse` results in the rabbitmq ioloop thread, the message is
+        acknowledged after it. Override it if `db_handler` plugin is not used.
+
+        :param channel: rabbitmq channel the message comes from.
+        :param items: list of items returned by `parse`.
+        :param requests: list of `LiteRequest` object returned by `parse`.
+
+        """
+        if requests:
+            self.req_q.safe_push_many(requests, self.publish_channel)
+        db_handler = getattr(self, "db_handler", None)
+        if items and db_handler is not None:
+            db_handler.update(items)
+
+    def _pool_callback(self, channel, method, properties, body):
+        self._pool_submit(channel, method, body, self.resp_q.get_data(body))
+
+    def _pool_submit(self, channel, method, body, resp_data):
+        if resp_data is None:
+            logging.warning("no match response to response_key %s" % body)
+            self.ack(channel, method)
+            return
+        batch_id = self._batch_id
+        self.parse_pool.submit(
+            resp_data,
+            lambda items, requests, error: self._parsed.put(
+                (batch_id, channel, method, items, requests, error))
+        )
+        self._parse_pending += 1
+        self._arm_parse_drain(channel.connection)
+
+    def _arm_parse_drain(self, conn):
+        """Schedule `_drain_parsed` on the ioloop of `conn` if it is not yet.
+        Timeouts of a closed connection never run, `init_resp_queue` arms
+        the drain again on the new connection."""
+        if self._parse_conn is conn:
+            return
+        self._parse_conn = conn
+        self._parse_timer += 1
+        timer = self._parse_timer
+        conn.add_timeout(0.01, lambda: self._drain_parsed(timer))
+
+    def _drain_parsed(self, timer=None):
+        """Handle parsed results in the ioloop thread, pika is not thread-safe."""
+        if timer is not None and timer != self._parse_timer:
+            # timeout of an old connection
+            return
+        conn = self._parse_conn
+        self._parse_conn = None
+        while True:
+            try:
+                batch_id, channel, method, items, requests, error = self._parsed.get_nowait()
+            except Queue.Empty:
+                break
+            self._parse_pending -= 1
+            # unacked messages of a closed channel are redelivered, drop them
+            if batch_id != self._batch_id:
+                continue
+            try:
+                if error is not None:
+                    raise Exception(error)
+                self.handle_results(channel, items, requests)
+                self.ack(channel, method)
+            except Exception, e:
+                logging.error("parse catch exception: %s" % str(e))
+                self._close_channel(channel)
+        if self._parse_pending > 0 and conn is not None:
+            self._arm_parse_drain(conn)
+
+    def _batch_callback(self, channel, method, properties, body):
+        self._batch.append((method, properties, body))
+        if len(self._batch) >= self.response_batch_size:
+            self._flush_batch(channel)
+        elif len(self._batch) == 1:
+            batch_id = self._batch_id
+            channel.connection.add_timeout(
+                getattr(self, "response_batch_delay", 0.1),
+                lambda: self._flush_batch(channel, batch_id)
+            )
+
+    def _flush_batch(self, channel, batch_id=None):
+        if batch_id is not None and batch_id != self._batch_id:
+            return
+        batch = self._batch
+        self._batch = []
+        self._batch_id += 1
+        if not batch:
+            return
+        try:
+            responses = self.resp_q.get_many([body for _, _, body in batch])
+            self.batch_callback(channel, batch, responses)
+        except Exception, e:
+            logging.error("batch_callback catch exception: %s" % str(e))
+            self._close_channel(channel)
+
     def _callback(self, channel, method, properties, body):
         logging.info(method.NAME)
+        if self.runtime is not None:
+            self.runtime.on_message(channel, method, properties, body)
+            return
+        if self.parse_pool is not None:
+            try:
+                self._pool_callback(channel, method, properties, body)
+            except Exception, e:
+                logging.error("callback catch exception: %s" % str(e))
+                self._close_channel(channel)
+            return
+        if getattr(self, "response_batch_size", 1) > 1:
+            self._batch_callback(channel, method, properties, body)
+            return
         try:
             self.callback(channel, method, properties, body)
         except Exception, e:
             logging.error("callback catch exception: %s" % str(e))
-            channel.close()
+            self._close_channel(channel)
+
+    def _close_channel(self, channel):
+        """Ack processed messages before closing channel, only the unprocessed
+        messages are redelivered."""
+        consumer = getattr(self, "consumer", None)
+        if consumer is not None:
+            try:
+                consumer.flush_acks()
+            except Exception, e:
+                logging.error("flush acks fail: %s" % str(e))
+        # unacked messages of the channel are redelivered, results and
+        # fetched responses of them still in flight are dropped or put back
+        self._batch = []
+        self._batch_id += 1
+        channel.close()
+
+    def ack(self, channel, method):
+        """Acknowledge a processed rabbitmq message, use it instead of `channel.basic_ack`
+        to support `ack_batch_size` in `settings`.
+
+        :param channel: rabbitmq channel the message comes from.
+        :param method: rabbitmq message method frame.
+
+        """
+        consumer = getattr(self, "consumer", None)
+        if consumer is None:
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+        else:
+            consumer.ack(method.delivery_tag)
 
     def run(self):
         """Entry with `yascrapy_worker` script.
@@ -268,6 +565,7 @@ class BaseWorker(object):
         try:
             consumer = AsyncConsumer(
                 cfg=self.cfg, cbk=self._callback, worker=self)
+            self.consumer = consumer
             rabbitmq_conn = consumer.connect()
             rabbitmq_conn.ioloop.start()
         except (KeyboardInterrupt, SystemExit):
@@ -286,6 +584,17 @@ class BaseWorker(object):
             resp_queue_name = "http_response:%s:%d" % (
                 self.crawler_name, resp_queue_index)
         logging.debug("init_resp_queue: %s" % resp_queue_name)
+        # unacked messages of a closed channel are redelivered, drop them
+        self._batch = []
+        self._batch_id += 1
+        # drains scheduled on the old connection never run, parse results
+        # still arriving are drained and dropped on the new one
+        self._parse_conn = None
+        self._parse_timer += 1
+        if self._parse_pending > 0:
+            self._arm_parse_drain(rabbitmq_conn)
+        if self.runtime is not None:
+            self.runtime.reset(rabbitmq_conn)
         self.resp_q = ResponseQueue(
             self.crawler_name,
             ssdb_clients=self.ssdb_clients,
@@ -339,7 +648,7 @@ class BaseWorker(object):
             resp = requests.get(url, headers=test_headers)
             req_d = init_req_data(self.crawler_name)
             resp_d = init_resp_data(self.crawler_name)
-            resp_d["html"] = resp.content
+            resp_d["html"] = decode(resp.content, resp.headers.get("content-type"), resp.url)
             resp_d["url"] = resp.url
             resp_d["status_code"] = resp.status_code
             resp_d["reason"] = resp.status_code
@@ -354,7 +663,8 @@ class BaseWorker(object):
         ch = rabbitmq_conn.channel()
         resp_q = ResponseQueue(
             self.crawler_name,
-            ssdb_clients=self.ssdb_clients
+            ssdb_clients=self.ssdb_clients,
+            compression=getattr(self, "response_compression", None)
         )
         for resp_data in resp_arr:
             resp = Response()
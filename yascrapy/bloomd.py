@@ -1,15 +1,156 @@
 # -*- coding: utf-8 -*
+import hash_ring
 from .libs.pybloomd import BloomdClient
+from .libs.pybloomd import PooledBloomdClient
+from .libs.pybloomd import BloomdConnectionPool
+from .libs.pybloomd import BloomdError
 
 
-def get_client(nodes=[]):
-    """Get bloomd client, note that this bloomd client is not thread-safe.
+def get_client(nodes=[], max_connections=None):
+    """Get bloomd client, note that this bloomd client is not thread-safe
+    unless `max_connections` is specified.
 
     :param nodes: bloomd nodes from config file.
+    :param max_connections: optional int, use `PooledBloomdClient` with this
+        connection pool size per node, the client can be shared by threads.
     :returns: `BoomdClient` object.
 
     """
     tags = []
     for node in nodes:
         tags.append("%s:%s" % (node["Host"], node["Port"]))
+    if max_connections:
+        return PooledBloomdClient(tags, max_connections=max_connections)
     return BloomdClient(tags)
+
+
+class ShardedFilter(object):
+
+    """Split one crawler filter across all bloomd servers with a hash ring,
+    we use client side partitioning like `yascrapy.ssdb.get_clients`.
+
+    Every server holds filter `[name]_shard_[index]` with `capacity / N` keys,
+    `index` is the server position in `BloomdNodes`, keep the nodes order stable.
+    This class has the same interface as `BloomdFilter` used by `FilterQueue`.
+
+    """
+
+    def __init__(self, bloomd_client, name, capacity=1e8, prob=1e-5):
+        """Create or open shard filters on every server.
+
+        :param bloomd_client: BloomdClient object, get it from `get_client`.
+        :param name: string, filter name.
+        :param capacity: float, total capacity of all shards.
+        :param prob: float, error rate of every shard.
+
+        """
+        servers = bloomd_client.servers
+        self.name = name
+        self.shards = {}
+        for i, server in enumerate(servers):
+            self.shards[server] = bloomd_client.create_filter(
+                "%s_shard_%d" % (name, i),
+                capacity=capacity / len(servers),
+                prob=prob,
+                server=server
+            )
+        # Init hash_ring is expensive operation, need reused.
+        self.ring = hash_ring.HashRing(servers)
+
+    def _get_shard(self, key):
+        if isinstance(key, unicode):
+            return self.shards[self.ring.get_node(key.encode("utf-8"))]
+        return self.shards[self.ring.get_node(key)]
+
+    def _group(self, keys):
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(self._get_shard(key), []).append(i)
+        return groups
+
+    def _fan_out(self, cmd, keys):
+        """Send one multi or bulk command to every shard first, then read all
+        responses, so all servers work on the batch in parallel.
+        """
+        groups = self._group(keys)
+        sent = []
+        try:
+            for shard, indexes in groups.items():
+                conn = shard.conn
+                pool = None
+                if isinstance(conn, BloomdConnectionPool):
+                    pool = conn
+                    conn = pool.get_connection()
+                sent.append((shard, indexes, conn, pool))
+                conn.send(("%s %s " % (cmd, shard.name)) +
+                          " ".join([shard._get_key(keys[i]) for i in indexes]))
+            res = [None] * len(keys)
+            for shard, indexes, conn, pool in sent:
+                resp = conn.read()
+                if not (resp[:3] == "Yes" or resp[:2] == "No"):
+                    raise BloomdError("Got response: %s" % resp)
+                for i, r in zip(indexes, resp.split(" ")):
+                    res[i] = r == "Yes"
+        except:
+            # unread responses left on these connections, drop them
+            for shard, indexes, conn, pool in sent:
+                if pool is not None:
+                    pool.release(conn, discard=True)
+                else:
+                    conn.close()
+            raise
+        for shard, indexes, conn, pool in sent:
+            if pool is not None:
+                pool.release(conn)
+        return res
+
+    def add(self, key):
+        """Add a new key to its shard filter."""
+        return self._get_shard(key).add(key)
+
+    def __contains__(self, key):
+        """Check if the key is contained in its shard filter."""
+        return key in self._get_shard(key)
+
+    def bulk(self, keys):
+        """Add multiple keys, one bulk command per shard in parallel."""
+        return self._fan_out("b", keys)
+
+    def multi(self, keys):
+        """Check multiple keys, one multi command per shard in parallel."""
+        return self._fan_out("m", keys)
+
+    def __len__(self):
+        return sum([len(shard) for shard in self.shards.values()])
+
+    def auto_pipeline(self, max_commands=100, max_delay=0.005):
+        """Create one `BloomdAutoPipeline` per shard, see `BloomdFilter.auto_pipeline`."""
+        return ShardedPipeline(self, max_commands, max_delay)
+
+
+class ShardedPipeline(object):
+
+    """Route pipelined commands to the pipeline of the key shard."""
+
+    def __init__(self, sharded_filter, max_commands=100, max_delay=0.005):
+        self.sharded_filter = sharded_filter
+        self.pipelines = {}
+        for server, shard in sharded_filter.shards.items():
+            self.pipelines[shard.name] = shard.auto_pipeline(max_commands, max_delay)
+
+    def _get_pipeline(self, key):
+        return self.pipelines[self.sharded_filter._get_shard(key).name]
+
+    def add(self, key, callback=None):
+        return self._get_pipeline(key).add(key, callback)
+
+    def check(self, key, callback=None):
+        return self._get_pipeline(key).check(key, callback)
+
+    def flush(self):
+        for pipeline in self.pipelines.values():
+            pipeline.flush()
+
+    def close(self):
+        for pipeline in self.pipelines.values():
+            pipeline.close()
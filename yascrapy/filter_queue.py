@@ -1,4 +1,8 @@
 # -*- coding: utf-8 -*-
+import os
+from .libs.bloomfilter import BloomFilter
+from .libs.pybloomd import BloomdFuture
+from .bloomd import ShardedFilter
 
 
 class FilterError(Exception):
@@ -19,32 +23,95 @@ class FilterQueue(object):
         crawled or not. We use bloomd server on backend currently.
     """
 
-    def __init__(self, bloomd_client=None, crawler_name=None, capacity=1e8, prob=1e-5):
+    def __init__(self, bloomd_client=None, crawler_name=None, capacity=1e8, prob=1e-5,
+                 local_capacity=0, local_prob=None, pipeline_size=0, pipeline_delay=0.005,
+                 sharded=False, local_filter=None):
         """Set filter queue initial params.
 
         :param bloomd_client: BloomdClient object, get it from `yascrapy.bloomd` module.
         :param crawler_name: string, crawler name.
         :param capacity: float, crawler links capacity, ensure that it is large enough.
         :param prob: float, error rate with crawler link checks.
+        :param local_capacity: optional int, capacity of the in-process bloom filter
+            in front of bloomd, 0 means no local filter.
+        :param local_prob: optional float, error rate of the local filter, use `prob` if not specified.
+        :param pipeline_size: optional int, use an auto-batching bloomd pipeline for
+            `is_member_async` and `push_async`, flush when this many commands are buffered.
+            0 means no pipeline.
+        :param pipeline_delay: optional float, seconds to wait before flushing a partial batch.
+        :param sharded: optional bool, split the filter across all bloomd servers of
+            `bloomd_client`, see `yascrapy.bloomd.ShardedFilter`. Every server holds
+            `capacity / N` keys. A sharded filter does not share keys with the unsharded
+            filter of the same crawler.
+        :param local_filter: optional `yascrapy.libs.bloomfilter.BloomFilter` object used as
+            the local filter instead of a new one of `local_capacity`, workers share one per
+            process, see `yascrapy.resources.Resources.local_filter`.
         :raises: FilterError.
 
         create_filter will not update the existed bloomd_filter attributes.
 
+        Urls found in the local filter are answered without bloomd round-trip,
+        the local filter costs about `local_capacity * 1.44 * log2(1 / local_prob)` bits.
+        False positives of both filters add up.
+
+        With pipeline, many checks are in flight over one socket. The pipeline
+        connection and threads are created on first use in every process.
+        `RequestQueue.safe_push` uses the pipeline if it is set, producers set
+        it with `filter_pipeline_size` in `settings`. Resolve the futures on the
+        publishing thread, rabbitmq channels are not thread-safe::
+
+            futures = [(r, filter_q.is_member_async(r.url)) for r in reqs]
+            for r, future in futures:
+                if not future.result():
+                    req_q.push(r, channel)
+                    filter_q.push_async(r.url)
+            filter_q.flush()
+
         """
         if bloomd_client is None:
             raise FilterError("bloomd_client cannot be None")
         if crawler_name is None:
             raise FilterError("crawler_name cannot be None")
         self.bloomd_client = bloomd_client
-        self.filter = self.bloomd_client.create_filter(
-            crawler_name,
-            capacity=capacity,
-            prob=prob
-        )
+        if sharded:
+            self.filter = ShardedFilter(
+                self.bloomd_client,
+                crawler_name,
+                capacity=capacity,
+                prob=prob
+            )
+        else:
+            self.filter = self.bloomd_client.create_filter(
+                crawler_name,
+                capacity=capacity,
+                prob=prob
+            )
+        self.local_filter = local_filter
+        if local_filter is None and local_capacity:
+            self.local_filter = BloomFilter(local_capacity, local_prob or prob)
+        self.local_hits = 0
+        self.local_misses = 0
+        self.pipeline_size = pipeline_size
+        self.pipeline_delay = pipeline_delay
+        self.pipeline = None
+        self._pipeline_pid = None
+
+    def _get_pipeline(self):
+        """Get the pipeline of the current process, None if pipeline is not used."""
+        if not self.pipeline_size:
+            return None
+        # pipeline threads do not survive fork, children create their own
+        if self.pipeline is None or self._pipeline_pid != os.getpid():
+            self.pipeline = self.filter.auto_pipeline(
+                max_commands=self.pipeline_size, max_delay=self.pipeline_delay)
+            self._pipeline_pid = os.getpid()
+        return self.pipeline
 
     def push(self, url):
         """Push url to this bloomd filter."""
         self.filter.add(url)
+        if self.local_filter is not None:
+            self.local_filter.add(url)
 
     def is_member(self, url):
         """Check whether url is crawled or not.
@@ -53,6 +120,115 @@ class FilterQueue(object):
         :returns: bool, True if url if crawled.
 
         """
+        if self.local_filter is not None:
+            if url in self.local_filter:
+                self.local_hits += 1
+                return True
+            self.local_misses += 1
         if url in self.filter:
+            if self.local_filter is not None:
+                self.local_filter.add(url)
             return True
         return False
+
+    def push_many(self, urls):
+        """Push multiple urls to this bloomd filter with one bulk command.
+
+        :param urls: list of string, urls to be pushed.
+
+        """
+        if not urls:
+            return
+        self.filter.bulk(urls)
+        if self.local_filter is not None:
+            self.local_filter.bulk(urls)
+
+    def is_member_many(self, urls):
+        """Check whether multiple urls are crawled or not with one multi command.
+
+        :param urls: list of string, urls to be checked.
+        :returns: list of bool, in the same order as `urls`.
+
+        """
+        if not urls:
+            return []
+        if self.local_filter is None:
+            return self.filter.multi(urls)
+        res = self.local_filter.multi(urls)
+        missed = [i for i, found in enumerate(res) if not found]
+        self.local_hits += len(urls) - len(missed)
+        self.local_misses += len(missed)
+        if missed:
+            remote = self.filter.multi([urls[i] for i in missed])
+            for i, found in zip(missed, remote):
+                if found:
+                    res[i] = True
+                    self.local_filter.add(urls[i])
+        return res
+
+    def _done_future(self, result, callback):
+        future = BloomdFuture()
+        if callback is not None:
+            future.add_done_callback(callback)
+        future.set_result(result)
+        return future
+
+    def push_async(self, url, callback=None):
+        """Push url to this bloomd filter through the pipeline.
+
+        :param url: string, url to be pushed.
+        :param callback: optional function, called with the future when bloomd responds.
+        :returns: `BloomdFuture` object.
+
+        Same as `push` if pipeline is not used.
+        """
+        if self.local_filter is not None:
+            self.local_filter.add(url)
+        pipeline = self._get_pipeline()
+        if pipeline is None:
+            return self._done_future(self.filter.add(url), callback)
+        return pipeline.add(url, callback)
+
+    def is_member_async(self, url, callback=None):
+        """Check whether url is crawled or not through the pipeline.
+
+        :param url: string, url to be checked.
+        :param callback: optional function, called with the future when the result is ready,
+            it runs on the pipeline reader thread.
+        :returns: `BloomdFuture` object, its result is True if url is crawled.
+
+        Same as `is_member` if pipeline is not used.
+        """
+        if self.local_filter is not None:
+            if url in self.local_filter:
+                self.local_hits += 1
+                return self._done_future(True, callback)
+            self.local_misses += 1
+        pipeline = self._get_pipeline()
+        if pipeline is None:
+            return self._done_future(url in self.filter, callback)
+        return pipeline.check(url, callback)
+
+    def flush(self):
+        """Send buffered pipeline commands now."""
+        if self.pipeline is not None and self._pipeline_pid == os.getpid():
+            self.pipeline.flush()
+
+    def close(self):
+        """Wait for buffered pipeline commands and close the pipeline connection."""
+        if self.pipeline is not None and self._pipeline_pid == os.getpid():
+            self.pipeline.close()
+        self.pipeline = None
+
+    def stats(self):
+        """Get local filter counters.
+
+        :returns: dict, contains `local_hits`, `local_misses` and `local_size`.
+            `local_misses` is the count of checks sent to bloomd server.
+
+        """
+        return {
+            "local_hits": self.local_hits,
+            "local_misses": self.local_misses,
+            "local_size": len(self.local_filter) if self.local_filter is not None else 0
+        }
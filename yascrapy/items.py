@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+from lxml import etree
+from .response_queue import Response
+from .response_queue import Selector
+from .response_queue import selector_cache
+
+
+class ItemError(Exception):
+
+    """This exception is raised when using `Field` and `ItemPlan` class."""
+
+    def __init__(self, value):
+        """Use string `value` as error message."""
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+
+class Field(object):
+
+    """Declare how one item field is extracted, use it as item class attribute.
+
+    :Example usage::
+
+        class UserItem(dict):
+            uid = None
+            name = Field(xpath='//h2[@class="user-card-name"]/text()[1]')
+            badges = Field(css=".badgecount", processors=[int], many=True)
+
+    """
+
+    def __init__(self, xpath=None, css=None, value="text", processors=None,
+                 many=False, default=None, strip=True):
+        """
+        :param xpath: string, xpath selector, relative to the plan scope if any.
+        :param css: string, css selector, use it instead of `xpath`.
+        :param value: optional string, `text` for element text content, `@attr`
+            for an element attribute, `html` for element html. Strings selected
+            by the xpath such as `text()` or `@href` are used as they are.
+        :param processors: optional list of functions, applied to every value in order.
+        :param many: optional bool, the field is a list of all values, otherwise the first value.
+        :param default: optional, value if nothing is selected and `many` is False.
+        :param strip: optional bool, strip string values before processors.
+        :raises: ItemError
+
+        """
+        if (xpath is None) == (css is None):
+            raise ItemError("one of xpath and css must be set")
+        if xpath is None:
+            xpath = selector_cache.css_to_xpath(css)
+        if not (value in ("text", "html") or value.startswith("@")):
+            raise ItemError("unknown field value %s" % value)
+        self.xpath = xpath
+        self.value = value
+        self.processors = processors or []
+        self.many = many
+        self.default = default
+        self.strip = strip
+
+    def _convert(self, result):
+        if isinstance(result, basestring):
+            v = result
+        elif not etree.iselement(result):
+            # numbers and booleans of xpath functions
+            return result
+        elif self.value == "text":
+            v = result.text_content()
+        elif self.value == "html":
+            v = etree.tostring(result, encoding=unicode)
+        else:
+            v = result.get(self.value[1:])
+            if v is None:
+                return None
+        if self.strip:
+            v = v.strip()
+        return v
+
+    def extract(self, results):
+        """Convert xpath results to the field value."""
+        if not isinstance(results, list):
+            results = [results]
+        values = []
+        for result in results:
+            v = self._convert(result)
+            if v is None:
+                continue
+            for processor in self.processors:
+                v = processor(v)
+            if not self.many:
+                return v
+            values.append(v)
+        if self.many:
+            return values
+        return self.default
+
+
+class ItemPlan(object):
+
+    """Fields of an item compiled once to `lxml.etree.XPath` objects.
+
+    `extract` runs them on the lxml tree directly, no `Selector` or
+    `SelectorList` is created, and returns items of `item_class`, which are
+    plain dicts such as `TestItem` in the sample spider. Build a plan once
+    and reuse it for every page, `BaseWorker.extract` caches plans.
+
+    """
+
+    def __init__(self, fields, item_class=dict, scope=None):
+        """
+        :param fields: dict, field name to `Field` object.
+        :param item_class: optional class, dict or a dict subclass.
+        :param scope: optional string, xpath selecting one node per item,
+            fields are relative to it, `extract` returns a list of items.
+
+        """
+        self.item_class = item_class
+        self.fields = []
+        for name, field in sorted(fields.items()):
+            # plain strings instead of smart strings keep no reference to the tree
+            self.fields.append((name, field, etree.XPath(field.xpath, smart_strings=False)))
+        self.scope = None
+        if scope is not None:
+            self.scope = etree.XPath(scope)
+
+    @classmethod
+    def from_item(cls, item_class, scope=None):
+        """Build plan from `Field` attributes of an item class.
+
+        :param item_class: class, dict subclass with `Field` attributes.
+        :param scope: optional string, see `ItemPlan`.
+        :returns: `ItemPlan` object.
+        :raises: ItemError
+
+        """
+        fields = {}
+        for attr in dir(item_class):
+            v = getattr(item_class, attr)
+            if isinstance(v, Field):
+                fields[attr] = v
+        if not fields:
+            raise ItemError("%s has no Field attribute" % item_class.__name__)
+        return cls(fields, item_class, scope)
+
+    def _extract_one(self, node):
+        item = self.item_class()
+        for name, field, xpath in self.fields:
+            item[name] = field.extract(xpath(node))
+        return item
+
+    def extract(self, root):
+        """Extract item from page.
+
+        :param root: `Response`, `Selector` or lxml element.
+        :returns: item object, or list of item objects if the plan has `scope`.
+
+        """
+        if isinstance(root, Response):
+            if not isinstance(root.root, Selector):
+                root._set_root()
+            root = root.root
+        if isinstance(root, Selector):
+            root = root.elem
+        if self.scope is None:
+            if root is None:
+                return self.item_class()
+            return self._extract_one(root)
+        if root is None:
+            return []
+        return [self._extract_one(node) for node in self.scope(root)]
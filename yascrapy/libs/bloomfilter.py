@@ -0,0 +1,89 @@
+"""
+This module implements a compact in-process bloom filter backed by a bytearray.
+"""
+__all__ = ["BloomFilter"]
+import math
+import struct
+import hashlib
+import threading
+
+
+class BloomFilter(object):
+    """
+    Provides a local bloom filter with the same add/contains interface as BloomdFilter.
+    Adds are serialized by a lock, so threads of a process can share one filter.
+    """
+    def __init__(self, capacity, prob):
+        """
+        Creates a new BloomFilter, sized from capacity and prob.
+
+        :Parameters:
+            - capacity : The expected number of keys.
+            - prob : The probability of false positives at `capacity` keys.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive!")
+        if not 0 < prob < 1:
+            raise ValueError("prob must be between 0 and 1!")
+        self.capacity = int(capacity)
+        self.prob = prob
+        # m = -n * ln(p) / ln(2)^2, k = m / n * ln(2)
+        bits = int(math.ceil(-self.capacity * math.log(prob) / (math.log(2) ** 2)))
+        self.num_bits = max(bits, 8)
+        self.num_hashes = max(int(round(float(self.num_bits) / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def _offsets(self, key):
+        """
+        Returns the bit offsets of the key, uses double hashing over one md5 digest.
+        """
+        if isinstance(key, unicode):
+            key = key.encode("utf-8")
+        h1, h2 = struct.unpack("<QQ", hashlib.md5(key).digest())
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in xrange(self.num_hashes)]
+
+    def add(self, key):
+        """
+        Adds a new key to the filter. Returns True/False if the key was added.
+        """
+        offsets = self._offsets(key)
+        with self.lock:
+            bits = self.bits
+            added = False
+            for offset in offsets:
+                mask = 1 << (offset & 7)
+                if not bits[offset >> 3] & mask:
+                    bits[offset >> 3] |= mask
+                    added = True
+            if added:
+                self.size += 1
+        return added
+
+    def bulk(self, keys):
+        "Adds multiple keys in the filter"
+        return [self.add(k) for k in keys]
+
+    def __contains__(self, key):
+        "Checks if the key is contained in the filter."
+        bits = self.bits
+        for offset in self._offsets(key):
+            if not bits[offset >> 3] & (1 << (offset & 7)):
+                return False
+        return True
+
+    def multi(self, keys):
+        "Checks for multiple keys in the filter"
+        return [k in self for k in keys]
+
+    def __len__(self):
+        "Returns the approximate count of items in the filter."
+        return self.size
+
+    def clear(self):
+        "Clears all keys in the filter."
+        with self.lock:
+            self.bits = bytearray(len(self.bits))
+            self.size = 0
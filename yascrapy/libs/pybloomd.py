@@ -1,13 +1,19 @@
 """
 This module implements a client for the BloomD server.
 """
-__all__ = ["BloomdError", "BloomdConnection", "BloomdClient", "BloomdFilter"]
+__all__ = ["BloomdError", "BloomdConnection", "BloomdClient", "BloomdFilter",
+           "BloomdConnectionPool", "PooledBloomdClient", "BloomdAutoPipeline", "BloomdFuture"]
 __version__ = "0.4.6"
 import logging
 import socket
+import select
 import errno
 import time
 import hashlib
+import Queue
+import threading
+from collections import deque
+from contextlib import contextmanager
 
 # Check for TCP_NODELAY support
 HAS_TCP_NODELAY = hasattr(socket, "TCP_NODELAY")
@@ -58,6 +64,21 @@ class BloomdConnection(object):
         self.fh = None
         return s
 
+    def close(self):
+        "Closes the socket, a new socket is created on next command"
+        if self.fh is not None:
+            try:
+                self.fh.close()
+            except socket.error:
+                pass
+            self.fh = None
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except socket.error:
+                pass
+            self.sock = None
+
     def send(self, cmd):
         "Sends a command with out the newline to the server"
         if self.sock is None:
@@ -315,6 +336,202 @@ class BloomdClient(object):
                 raise BloomdError("Got response: '%s' from '%s'" % (resp, server))
 
 
+class BloomdConnectionPool(object):
+    "Provides a bounded, thread-safe pool of connections to one server"
+    def __init__(self, server, timeout, max_connections=10, wait_timeout=None, idle_check_interval=30):
+        """
+        Creates a new BloomdConnectionPool.
+
+        :Parameters:
+            - server: Provided as a string, either as "host" or "host:port".
+            - timeout: The socket timeout to use.
+            - max_connections (optional): Maximum connections opened to the server. Defaults to 10.
+            - wait_timeout (optional): Seconds to wait for a free connection, defaults to wait forever.
+            - idle_check_interval (optional): Connections idle longer than this many seconds
+              are health-checked before checkout. Defaults to 30.
+        """
+        self.server = server
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.wait_timeout = wait_timeout
+        self.idle_check_interval = idle_check_interval
+        self.logger = logging.getLogger("pybloomd.BloomdConnectionPool.%s" % server)
+        # None is a free slot without an opened connection, reuse the last
+        # released connection first to keep the others idle.
+        self.pool = Queue.LifoQueue(max_connections)
+        for _ in xrange(max_connections):
+            self.pool.put_nowait(None)
+
+    def _is_healthy(self, conn):
+        """
+        Checks an idle connection. No response is pending on a pooled
+        connection, so a readable socket means it was closed by the server.
+        """
+        if conn.sock is None:
+            return True
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+        except (socket.error, select.error, ValueError):
+            return False
+        return not readable
+
+    def get_connection(self):
+        "Checks out a connection, blocks if all connections are in use"
+        try:
+            conn = self.pool.get(block=True, timeout=self.wait_timeout)
+        except Queue.Empty:
+            raise BloomdError("No free connection to %s in pool!" % self.server)
+        if conn is None:
+            return BloomdConnection(self.server, self.timeout)
+        if time.time() - conn.last_used > self.idle_check_interval and not self._is_healthy(conn):
+            self.logger.info("Reconnect idle connection to bloomd server")
+            conn.close()
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Returns a connection to the pool. Discarded connections are closed,
+        they may have unread responses.
+        """
+        if discard:
+            conn.close()
+            conn = None
+        else:
+            conn.last_used = time.time()
+        self.pool.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a connection for the `with` block, use it when commands
+        and responses span multiple calls::
+
+            with pool.connection() as conn:
+                conn.send("info test")
+                info = conn.response_block_to_dict()
+        """
+        conn = self.get_connection()
+        try:
+            yield conn
+        except:
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    def send_and_receive(self, cmd):
+        "Sends a command and reads the response on a pooled connection"
+        with self.connection() as conn:
+            return conn.send_and_receive(cmd)
+
+    def close(self):
+        "Closes all idle connections"
+        conns = []
+        while True:
+            try:
+                conns.append(self.pool.get_nowait())
+            except Queue.Empty:
+                break
+        for conn in conns:
+            if conn is not None:
+                conn.close()
+            self.pool.put_nowait(None)
+
+
+class PooledBloomdClient(BloomdClient):
+    """
+    Provides a thread-safe client, every command checks out a connection
+    from the per-server pool, so one client can be shared by many threads.
+    """
+    def __init__(self, servers, timeout=None, hash_keys=False, max_connections=10, wait_timeout=None):
+        """
+        Creates a new pooled BloomD client.
+
+        :Parameters:
+            - servers : A list of servers, which are provided as strings in the "host" or "host:port".
+            - timeout: (Optional) A socket timeout to use, defaults to no timeout.
+            - hash_keys: (Optional) Should keys be hashed before sending to bloomd. Defaults to False.
+            - max_connections: (Optional) Maximum connections per server. Defaults to 10.
+            - wait_timeout: (Optional) Seconds to wait for a free connection, defaults to wait forever.
+        """
+        BloomdClient.__init__(self, servers, timeout, hash_keys)
+        self.max_connections = max_connections
+        self.wait_timeout = wait_timeout
+
+    def _server_connection(self, server):
+        "Returns a connection pool to a server, pools are cached."
+        pool = self.server_conns.get(server)
+        if pool is None:
+            pool = self.server_conns.setdefault(server, BloomdConnectionPool(
+                server, self.timeout, self.max_connections, self.wait_timeout))
+        return pool
+
+    def create_filter(self, name, capacity=None, prob=None, in_memory=False, server=None):
+        """
+        Creates a new filter on the BloomD server and returns a PooledBloomdFilter,
+        see `BloomdClient.create_filter`.
+        """
+        if prob and not capacity:
+            raise ValueError("Must provide size with probability!")
+        pool = self._get_connection(name, strict=False, explicit_server=server)
+        cmd = "create %s" % name
+        if capacity:
+            cmd += " capacity=%d" % capacity
+        if prob:
+            cmd += " prob=%f" % prob
+        if in_memory:
+            cmd += " in_memory=1"
+        with pool.connection() as conn:
+            conn.send(cmd)
+            resp = conn.read()
+        if resp == "Done":
+            return PooledBloomdFilter(pool, name, self.hash_keys)
+        elif resp == "Exists":
+            return self[name]
+        else:
+            raise BloomdError("Got response: %s" % resp)
+
+    def __getitem__(self, name):
+        "Gets a PooledBloomdFilter object based on the name."
+        pool = self._get_connection(name)
+        return PooledBloomdFilter(pool, name, self.hash_keys)
+
+    def list_filters(self, prefix=None, inc_server=False):
+        """
+        Lists all the available filters across all servers,
+        see `BloomdClient.list_filters`.
+        """
+        if prefix:
+            cmd = "list %s" % prefix
+        else:
+            cmd = "list"
+
+        responses = {}
+        for server in self.servers:
+            with self._server_connection(server).connection() as conn:
+                conn.send(cmd)
+                resp = conn.readblock()
+            for line in resp:
+                name, info = line.split(" ", 1)
+                if inc_server:
+                    responses[name] = server, info
+                else:
+                    responses[name] = info
+
+        return responses
+
+    def flush(self):
+        "Instructs all servers to flush to disk"
+        for server in self.servers:
+            resp = self._server_connection(server).send_and_receive("flush")
+            if resp != "Done":
+                raise BloomdError("Got response: '%s' from '%s'" % (resp, server))
+
+    def close(self):
+        "Closes all idle pooled connections"
+        for pool in self.server_conns.values():
+            pool.close()
+
+
 class BloomdFilter(object):
     "Provides an interface to a single Bloomd filter"
     def __init__(self, conn, name, hash_keys=False):
@@ -414,6 +631,14 @@ class BloomdFilter(object):
         "Creates a BloomdPipeline for pipelining multiple queries"
         return BloomdPipeline(self.conn, self.name, self.hash_keys)
 
+    def auto_pipeline(self, max_commands=100, max_delay=0.005):
+        """
+        Creates a BloomdAutoPipeline on a new dedicated connection,
+        see `BloomdAutoPipeline`.
+        """
+        conn = BloomdConnection("%s:%d" % self.conn.server, self.conn.timeout)
+        return BloomdAutoPipeline(conn, self.name, self.hash_keys, max_commands, max_delay)
+
 
 class BloomdPipeline(object):
     "Provides an interface to a single Bloomd filter"
@@ -546,3 +771,250 @@ class BloomdPipeline(object):
                 raise Exception("Unknown command! Command: %s" % name)
 
         return all_resp
+
+
+class BloomdFuture(object):
+    "Provides the pending result of a command sent by BloomdAutoPipeline"
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        "Returns True if the result or exception is set"
+        return self._event.is_set()
+
+    def _set(self, result, exception):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._result = result
+            self._exception = exception
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+    def set_result(self, result):
+        "Sets the result and runs callbacks"
+        self._set(result, None)
+
+    def set_exception(self, exception):
+        "Sets the exception and runs callbacks"
+        self._set(None, exception)
+
+    def add_done_callback(self, callback):
+        """
+        Calls `callback(future)` when the future is done, at once if it is
+        already done. Callbacks run on the pipeline reader thread.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def result(self, timeout=None):
+        "Waits for the response, returns the result or raises the error"
+        if not self._event.wait(timeout):
+            raise BloomdError("Timeout waiting for bloomd response!")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class BloomdAutoPipeline(object):
+    """
+    Provides an auto-batching pipeline on a dedicated connection. Commands are
+    buffered and written with one sendall when `max_commands` commands are
+    buffered or `max_delay` seconds passed since the first one. A reader thread
+    matches the responses to the returned BloomdFuture objects in order, so
+    many commands can be in flight on one socket.
+    """
+    def __init__(self, conn, name, hash_keys=False, max_commands=100, max_delay=0.005):
+        """
+        Creates a new BloomdAutoPipeline object.
+
+        :Parameters:
+            - conn : The BloomdConnection to use, it should not be used by others
+            - name : The name of the filter
+            - hash_keys : Should the keys be hashed client side
+            - max_commands (optional) : Flush when this many commands are buffered. Defaults to 100.
+            - max_delay (optional) : Flush when the oldest buffered command waits
+              this many seconds. Defaults to 0.005.
+        """
+        self.conn = conn
+        self.name = name
+        self.hash_keys = hash_keys
+        self.max_commands = max_commands
+        self.max_delay = max_delay
+        self.buf = []
+        self.inflight = deque()
+        self.sock = None
+        # bumped on every reconnect, a reader thread only serves its own socket
+        self.generation = 0
+        self.closed = False
+        # reentrant, future callbacks may run while the lock is held
+        self.lock = threading.RLock()
+        self.cond = threading.Condition(self.lock)
+        self.flusher = threading.Thread(target=self._flush_loop)
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def _get_key(self, key):
+        """
+        Returns the key we should send to the server
+        """
+        if self.hash_keys:
+            return hashlib.sha1(key).hexdigest()
+        return key
+
+    def _append(self, name, cmd, callback):
+        future = BloomdFuture()
+        if callback is not None:
+            future.add_done_callback(callback)
+        with self.lock:
+            if self.closed:
+                raise BloomdError("Pipeline is closed!")
+            self.buf.append((name, cmd, future))
+            if len(self.buf) >= self.max_commands:
+                self._flush_locked()
+            elif len(self.buf) == 1:
+                self.cond.notify()
+        return future
+
+    def add(self, key, callback=None):
+        """
+        Adds a new key to the filter. Returns a BloomdFuture of True/False if the key was added.
+        """
+        return self._append("add", "s %s %s" % (self.name, self._get_key(key)), callback)
+
+    def check(self, key, callback=None):
+        "Checks if the key is contained in the filter. Returns a BloomdFuture of True/False."
+        return self._append("check", "c %s %s" % (self.name, self._get_key(key)), callback)
+
+    def flush(self):
+        "Sends all buffered commands now"
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        buf = self.buf
+        if not buf:
+            return
+        self.buf = []
+        try:
+            if self.sock is None:
+                self._connect_locked()
+            self.inflight.extend([(name, future) for name, _, future in buf])
+            self.sock.sendall("".join([cmd + "\n" for _, cmd, _ in buf]))
+        except socket.error as e:
+            self.conn.logger.exception("Failed to send pipelined commands to bloomd server!")
+            self._fail_locked(BloomdError("Failed to send command: %s" % e))
+            for _, _, future in buf:
+                future.set_exception(BloomdError("Failed to send command: %s" % e))
+
+    def _connect_locked(self):
+        sock = self.conn._create_socket()
+        # the reader blocks on the socket without timeout between batches
+        sock.settimeout(None)
+        self.sock = sock
+        self.generation += 1
+        reader = threading.Thread(target=self._read_loop, args=(sock, self.generation))
+        reader.daemon = True
+        reader.start()
+
+    def _fail_locked(self, error):
+        "Fails all in-flight commands and drops the socket"
+        inflight = self.inflight
+        self.inflight = deque()
+        self.generation += 1
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except socket.error:
+                pass
+            self.sock = None
+        for _, future in inflight:
+            future.set_exception(error)
+
+    def _flush_loop(self):
+        with self.lock:
+            while not self.closed:
+                if not self.buf:
+                    self.cond.wait()
+                    continue
+                self.cond.wait(self.max_delay)
+                self._flush_locked()
+
+    def _read_loop(self, sock, generation):
+        fh = sock.makefile()
+        while True:
+            try:
+                line = fh.readline()
+            except (socket.error, ValueError):
+                line = None
+            with self.lock:
+                if generation != self.generation:
+                    return
+                if not line:
+                    self._fail_locked(BloomdError("Connection to bloomd server closed!"))
+                    return
+                if not self.inflight:
+                    self._fail_locked(BloomdError("Got unexpected response: %s" % line.rstrip("\r\n")))
+                    return
+                _, future = self.inflight.popleft()
+            resp = line.rstrip("\r\n")
+            if resp in ("Yes", "No"):
+                future.set_result(resp == "Yes")
+            else:
+                future.set_exception(BloomdError("Got response: %s" % resp))
+
+    def close(self):
+        "Sends buffered commands, waits for their responses and closes the connection"
+        with self.lock:
+            self._flush_locked()
+            pending = [future for _, future in self.inflight]
+            self.closed = True
+            self.cond.notify()
+        for future in pending:
+            future._event.wait()
+        with self.lock:
+            self._fail_locked(BloomdError("Pipeline is closed!"))
+
+
+class PooledBloomdFilter(BloomdFilter):
+    "Provides an interface to a single Bloomd filter over a BloomdConnectionPool"
+    def info(self):
+        "Returns the info dictionary about the filter."
+        with self.conn.connection() as conn:
+            conn.send("info %s" % (self.name))
+            return conn.response_block_to_dict()
+
+    def pipeline(self):
+        "Creates a BloomdPipeline which executes on one pooled connection"
+        return PooledBloomdPipeline(self.conn, self.name, self.hash_keys)
+
+    def auto_pipeline(self, max_commands=100, max_delay=0.005):
+        "Creates a BloomdAutoPipeline on a new connection outside the pool"
+        conn = BloomdConnection(self.conn.server, self.conn.timeout)
+        return BloomdAutoPipeline(conn, self.name, self.hash_keys, max_commands, max_delay)
+
+
+class PooledBloomdPipeline(BloomdPipeline):
+    "Provides a pipeline which checks out one connection per execute"
+    def execute(self):
+        """
+        Executes the pipelined commands on a connection checked out
+        from the pool, see `BloomdPipeline.execute`.
+        """
+        pool = self.conn
+        with pool.connection() as conn:
+            self.conn = conn
+            try:
+                return BloomdPipeline.execute(self)
+            finally:
+                self.conn = pool
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+import time
+import random
+import logging
+import threading
+import Queue
+from .rabbitmq import AsyncPublisher
+from .request_queue import LiteRequest
+from .ssdb import KeyScanner
+
+# put on stage queues to stop the next stage
+STOP = None
+
+
+class StageStats(object):
+
+    """Items handled by one loader stage and seconds spent on them."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, items, seconds):
+        with self.lock:
+            self.items += items
+            self.batches += 1
+            self.busy += seconds
+
+
+class CacheLoader(object):
+
+    """Load cached requests of one ssdb node to rabbitmq as a pipeline.
+
+    Stages run in their own threads, connected by bounded queues, so ssdb
+    reads, decoding and publishing overlap and a slow stage blocks the
+    stages before it instead of buffering without limit:
+
+        * scan: list keys of `(prefix, prefix + "z"]` in batches with
+          `yascrapy.ssdb.KeyScanner`, starts over at the end of the range.
+        * fetch: `mget` values of a key batch.
+        * decode: decode values to `LiteRequest` objects.
+        * publish: `publish_threads` threads, each with its own rabbitmq
+          connection and `AsyncPublisher`, push requests and wait for confirms
+          of the batch. With a `QueueMonitor`, requests go to queues chosen by
+          cached depths, the least full queues get most of them, otherwise
+          to random queues.
+        * delete: delete keys of confirmed batches from ssdb.
+
+    Keys of a batch are deleted only after all its requests are confirmed,
+    keys of a failed batch stay in ssdb and are loaded again on the next
+    pass of the scan. Keys with undecodable values are logged once and kept
+    in ssdb, the loader adds them to `skipped` and does not load them again.
+    `yascrapy_cache` runs one loader process per ssdb node.
+
+    :Example usage::
+
+        loader = CacheLoader(redis_client, req_qs, lambda: create_conn(cfg))
+        loader.run()
+
+    """
+
+    STAGES = ["scan", "fetch", "decode", "publish", "delete"]
+
+    def __init__(self, ssdb_client, req_qs, conn_factory, prefix=None, batch_size=3000,
+                 queue_size=4, publish_threads=1, window=3000, monitor=None,
+                 queue_max=5000, idle_delay=1, report_interval=10):
+        """
+        :param ssdb_client: `redis.Redis` client of one ssdb node.
+        :param req_qs: list of `RequestQueue` objects, one for every rabbitmq queue.
+        :param conn_factory: function without params returning a new rabbitmq
+            connection, see `yascrapy.rabbitmq.create_conn`.
+        :param prefix: optional string, key prefix, `http_request:$crawler_name:` on default.
+        :param batch_size: optional int, keys of one batch.
+        :param queue_size: optional int, max batches waiting between two stages.
+        :param publish_threads: optional int, publish threads and rabbitmq connections.
+        :param window: optional int, max unconfirmed messages of one publish thread.
+        :param monitor: optional `yascrapy.rabbitmq.QueueMonitor` object of the queues.
+        :param queue_max: optional int, max messages of a queue, used with `monitor`.
+        :param idle_delay: optional float, seconds to wait when ssdb or queues are full.
+        :param report_interval: optional float, seconds between two `report` logs in `run`.
+
+        """
+        self.ssdb_client = ssdb_client
+        self.req_qs = dict([(req_q.queue_name, req_q) for req_q in req_qs])
+        self.conn_factory = conn_factory
+        if prefix is None:
+            prefix = "http_request:%s:" % req_qs[0].crawler_name
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.publish_threads = publish_threads
+        self.window = window
+        self.monitor = monitor
+        self.queue_max = queue_max
+        self.idle_delay = idle_delay
+        self.report_interval = report_interval
+        self.stats = dict([(name, StageStats(name)) for name in self.STAGES])
+        self.queues = dict([(name, Queue.Queue(maxsize=queue_size)) for name in self.STAGES[1:]])
+        # keys between scan and delete, the scan skips them when it starts over
+        self.inflight = set()
+        # keys with undecodable values, left in ssdb and not scanned again
+        self.skipped = set()
+        self.inflight_lock = threading.Lock()
+        self.threads = []
+        self.started = None
+        self._stopping = threading.Event()
+
+    def start(self, once=False):
+        """Start stage threads.
+
+        :param once: optional bool, stop after one pass over the keys, or run until `stop`.
+
+        """
+        self.started = time.time()
+        targets = [
+            (self._scan, (once,)),
+            (self._stage, ("fetch", self._fetch, "fetch", "decode", 1)),
+            (self._stage, ("decode", self._decode, "decode", "publish", self.publish_threads)),
+            (self._stage, ("delete", self._delete, "delete", None, 1, self.publish_threads)),
+        ]
+        targets += [(self._publish_loop, ()) for i in range(self.publish_threads)]
+        for target, args in targets:
+            t = threading.Thread(target=target, args=args)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def stop(self):
+        """Stop scanning, batches in the pipeline are finished."""
+        self._stopping.set()
+
+    def join(self, timeout=None):
+        """Wait for stage threads.
+
+        :returns: bool, True if all threads have stopped.
+
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        for t in self.threads:
+            t.join(None if deadline is None else max(deadline - time.time(), 0))
+        return not any(t.is_alive() for t in self.threads)
+
+    def run(self, once=False):
+        """Start the pipeline and log `report` every `report_interval` seconds
+        until it stops."""
+        self.start(once)
+        while not self.join(self.report_interval):
+            logging.info(self.report())
+        logging.info(self.report())
+
+    def throughput(self):
+        """Get throughput of every stage.
+
+        :returns: dict, stage name to dict of handled `items`, `batches`,
+            `rate` in items/second since start and `busy` ratio of the stage threads.
+
+        """
+        elapsed = max(time.time() - (self.started or time.time()), 1e-6)
+        result = {}
+        for name, stat in self.stats.items():
+            result[name] = {
+                "items": stat.items,
+                "batches": stat.batches,
+                "rate": stat.items / elapsed,
+                "busy": stat.busy / elapsed,
+            }
+        return result
+
+    def report(self):
+        """Get one line throughput report, such as `scan: 3000 (1500.0/s, busy 2%) ... skipped: 0`."""
+        result = self.throughput()
+        return " ".join("%s: %d (%.1f/s, busy %d%%)" % (
+            name, result[name]["items"], result[name]["rate"], result[name]["busy"] * 100
+        ) for name in self.STAGES) + " skipped: %d" % len(self.skipped)
+
+    def _release(self, keys):
+        with self.inflight_lock:
+            self.inflight.difference_update(keys)
+
+    def _scan(self, once):
+        scanner = KeyScanner(self.ssdb_client, self.prefix, self.prefix + "z", self.batch_size)
+        try:
+            while not self._stopping.is_set():
+                found = 0
+                t = time.time()
+                for keys in scanner.pages():
+                    with self.inflight_lock:
+                        batch = [k for k in keys if k not in self.inflight and k not in self.skipped]
+                        self.inflight.update(batch)
+                    self.stats["scan"].add(len(batch), time.time() - t)
+                    if batch:
+                        found += len(batch)
+                        self.queues["fetch"].put(batch)
+                    if self._stopping.is_set():
+                        break
+                    t = time.time()
+                # end of the range, start over to load new keys and keys of failed batches
+                if once:
+                    break
+                if not found:
+                    self._stopping.wait(self.idle_delay)
+                scanner.reset()
+        except Exception as e:
+            logging.error("loader scan fail: %s" % str(e))
+        self.queues["fetch"].put(STOP)
+
+    def _stage(self, name, func, in_name, out_name, out_stops, in_stops=1):
+        """Run `func` on every batch of `in_name` queue and put results to `out_name` queue."""
+        in_q = self.queues[in_name]
+        while in_stops > 0:
+            batch = in_q.get()
+            if batch is STOP:
+                in_stops -= 1
+                continue
+            t = time.time()
+            try:
+                result = func(batch)
+            except Exception as e:
+                logging.error("loader %s fail: %s" % (name, str(e)))
+                self._release(batch[0] if isinstance(batch, tuple) else batch)
+                continue
+            self.stats[name].add(len(batch[0]) if isinstance(batch, tuple) else len(batch),
+                                 time.time() - t)
+            if out_name is not None:
+                self.queues[out_name].put(result)
+        for i in range(out_stops if out_name is not None else 0):
+            self.queues[out_name].put(STOP)
+
+    def _fetch(self, keys):
+        return keys, self.ssdb_client.mget(keys)
+
+    def _decode(self, batch):
+        keys, values = batch
+        ok_keys = []
+        bad_keys = []
+        reqs = []
+        for k, v in zip(keys, values):
+            if v is None:
+                # deleted by others after the scan
+                continue
+            r = LiteRequest()
+            try:
+                r.decode(v)
+            except Exception as e:
+                logging.error("decode %s fail: %s" % (k, str(e)))
+                bad_keys.append(k)
+                continue
+            ok_keys.append(k)
+            reqs.append(r)
+        with self.inflight_lock:
+            # undecodable values stay in ssdb, the scan leaves them out of later passes
+            self.skipped.update(bad_keys)
+            self.inflight.difference_update(set(keys) - set(ok_keys))
+        return ok_keys, reqs
+
+    def _delete(self, keys):
+        try:
+            if keys:
+                self.ssdb_client.delete(*keys)
+        finally:
+            self._release(keys)
+
+    def _publish_loop(self):
+        in_q = self.queues["publish"]
+        conn = None
+        publisher = None
+        while True:
+            batch = in_q.get()
+            if batch is STOP:
+                break
+            keys, reqs = batch
+            t = time.time()
+            try:
+                if publisher is None:
+                    conn = self.conn_factory()
+                    publisher = AsyncPublisher(conn, window=self.window)
+                self._publish(publisher, reqs)
+            except Exception as e:
+                logging.error("loader publish fail: %s" % str(e))
+                self._release(keys)
+                publisher = self._close(conn)
+                continue
+            self.stats["publish"].add(len(keys), time.time() - t)
+            self.queues["delete"].put(keys)
+        if publisher is not None:
+            try:
+                publisher.close()
+            finally:
+                self._close(conn)
+        self.queues["delete"].put(STOP)
+
+    def _publish(self, publisher, reqs):
+        queue_names = sorted(self.req_qs)
+        for r in reqs:
+            if self.monitor is None:
+                queue_name = random.choice(queue_names)
+            else:
+                queue_name = self.monitor.choose(self.queue_max, queue_names)
+                while queue_name is None:
+                    logging.info("all request queues have more than %d messages" % self.queue_max)
+                    time.sleep(self.idle_delay)
+                    queue_name = self.monitor.choose(self.queue_max, queue_names)
+            self.req_qs[queue_name].push(r, publisher)
+        # keys are deleted after this, wait for every confirm of the batch
+        publisher.flush()
+        if publisher.dropped:
+            dropped = publisher.dropped
+            publisher.dropped = 0
+            raise Exception("%d messages nacked too many times" % dropped)
+
+    def _close(self, conn):
+        try:
+            if conn is not None:
+                conn.close()
+        except Exception:
+            pass
+        return None
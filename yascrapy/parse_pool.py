@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import cPickle
+import traceback
+import multiprocessing
+from .request_queue import RequestMixin
+from .request_queue import LiteRequest
+from .response_queue import ResponseQueue
+
+# worker of the child processes, inherited with fork when the pool starts
+_worker = None
+_resp_q = None
+
+
+def _init_process():
+    global _resp_q
+    _resp_q = ResponseQueue(_worker.crawler_name, ssdb_clients=_worker.ssdb_clients)
+
+
+def _parse(resp_data):
+    """Run in child process, returns pickled `(items, requests, error)`, requests
+    are encoded strings, error is traceback string or None.
+
+    The result is pickled here, py2 `multiprocessing.Pool` never calls the
+    callback if it fails to pickle a result, such as an item with a lambda.
+    """
+    try:
+        resp = _resp_q._decode(resp_data)
+        items = []
+        requests = []
+        for r in _worker.parse(resp) or []:
+            if isinstance(r, RequestMixin):
+                requests.append(r.encode("tuple"))
+            else:
+                items.append(r)
+        return cPickle.dumps((items, requests, None), cPickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return cPickle.dumps(([], [], traceback.format_exc()), cPickle.HIGHEST_PROTOCOL)
+
+
+class ParsePool(object):
+
+    """Process pool running `BaseWorker.parse` out of the rabbitmq ioloop threads.
+
+    The pool forks when it is created, start it before the worker threads.
+    Children use a copy of `worker`, so `parse` must not use rabbitmq, ssdb
+    or plugin connections, it gets a `Response` and returns items and `Request`
+    objects, which are handled by `BaseWorker.handle_results` in the ioloop thread.
+
+    """
+
+    def __init__(self, worker, processes=None):
+        """
+        :param worker: `BaseWorker` object, its `parse` method is used by children.
+        :param processes: optional int, process count, cpu count on default.
+
+        """
+        global _worker
+        _worker = worker
+        self.pool = multiprocessing.Pool(processes, initializer=_init_process)
+
+    def submit(self, resp_data, callback):
+        """Parse response data from ssdb in a child process.
+
+        :param resp_data: string, `ResponseQueue.get_data` result.
+        :param callback: function called with `(items, requests, error)` in the
+            pool result thread, `requests` are `LiteRequest` objects.
+
+        """
+        def _on_result(res):
+            try:
+                items, requests, error = cPickle.loads(res)
+                requests = [self._decode_request(r) for r in requests]
+            except Exception:
+                items, requests, error = [], [], traceback.format_exc()
+            callback(items, requests, error)
+        self.pool.apply_async(_parse, (resp_data,), callback=_on_result)
+
+    def _decode_request(self, data):
+        r = LiteRequest()
+        r.decode(data)
+        return r
+
+    def close(self):
+        """Wait for submitted responses and stop child processes."""
+        self.pool.close()
+        self.pool.join()
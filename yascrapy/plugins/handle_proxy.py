@@ -1,6 +1,5 @@
 #!/usr/bin/python
 # coding: utf-8
-import redis
 import logging
 
 
@@ -18,8 +17,7 @@ class Plugin(object):
 
     def del_proxy(self, proxy):
         k = 'http_proxy:%s' % self.proxy_name
-        r = redis.Redis(connection_pool=self.proxy_client["connection_pool"])
-        res = r.srem(k, proxy)
+        res = self.proxy_client["client"].srem(k, proxy)
         if res:
             logging.info('delete proxy: %s' % proxy)
             return True
@@ -30,5 +28,4 @@ class Plugin(object):
     def get(self):
         """Get random proxy from proxy queue in ssdb, not add benchmark."""
         k = 'http_proxy:%s' % self.proxy_name
-        r = redis.Redis(connection_pool=self.proxy_client["connection_pool"])
-        return r.srandmember(k)
+        return self.proxy_client["client"].srandmember(k)
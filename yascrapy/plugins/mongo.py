@@ -9,13 +9,20 @@ class Plugin(object):
     def __init__(self, worker):
         db_name = worker.db_name
         columns = worker.mongo_tables
-        self.client = pymongo.MongoClient(
-            host=worker.mongo_ip,
-            port=worker.mongo_port,
-            connect=False,
-            maxPoolSize=1000,
-            w=0
-        )
+        def _create_client():
+            return pymongo.MongoClient(
+                host=worker.mongo_ip,
+                port=worker.mongo_port,
+                connect=False,
+                maxPoolSize=1000,
+                w=0
+            )
+        # MongoClient is thread-safe, share one per process
+        resources = getattr(worker, "resources", None)
+        if resources is None:
+            self.client = _create_client()
+        else:
+            self.client = resources.get(("mongo", worker.mongo_ip, worker.mongo_port), _create_client)
         self.db_name = db_name
         self.columns = columns
         self.is_set_index = False
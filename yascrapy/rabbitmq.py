@@ -3,6 +3,11 @@
 import pika
 import logging
 import time
+import random
+import urllib
+import threading
+import requests
+from collections import OrderedDict
 
 
 def create_conn(cfg):
@@ -26,12 +31,314 @@ def create_conn(cfg):
     return conn
 
 
+class AsyncPublisher(object):
+
+    """Publish with asynchronous publisher confirms on a blocking connection.
+
+    `channel.confirm_delivery()` on `pika.BlockingConnection` makes every publish
+    wait for its confirm. This class keeps up to `window` messages waiting for
+    confirms, tracks them by delivery tag and publishes nacked messages again.
+    It has `basic_publish` like rabbitmq channel, use it as the channel of
+    `RequestQueue.push`. Call `flush` before you depend on the messages, such as
+    deleting their ssdb cache.
+
+    This class drives the private `_impl` and `_flush_output` of pika 0.10 channels,
+    setup.py pins pika to 0.10.x, check it before upgrading pika.
+
+    :Example::
+
+        publisher = AsyncPublisher(create_conn(cfg), window=1000)
+        for r in reqs:
+            req_q.push(r, publisher)
+        publisher.flush()
+
+    """
+
+    def __init__(self, conn, window=1000, max_resend=3):
+        """Open a confirm mode channel on the connection.
+
+        :param conn: `pika.BlockingConnection`, get it from `create_conn`.
+        :param window: optional int, max messages waiting for confirms.
+        :param max_resend: optional int, drop a message nacked more than this many times.
+
+        """
+        self.conn = conn
+        self.window = window
+        self.max_resend = max_resend
+        self.channel = conn.channel()
+        self._impl = self.channel._impl
+        self._outstanding = OrderedDict()
+        self._delivery_tag = 0
+        self.published = 0
+        self.nacked = 0
+        self.dropped = 0
+        self._impl.confirm_delivery(self._on_delivery_confirm)
+
+    def _on_delivery_confirm(self, method_frame):
+        method = method_frame.method
+        confirmation_type = method.NAME.split('.')[1].lower()
+        if method.multiple:
+            tags = [tag for tag in self._outstanding if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        for tag in tags:
+            msg = self._outstanding.pop(tag, None)
+            if msg is None or confirmation_type == "ack":
+                continue
+            self.nacked += 1
+            if msg[-1] >= self.max_resend:
+                self.dropped += 1
+                logging.error("message to %s nacked %d times, dropped" % (msg[1], msg[-1] + 1))
+                continue
+            self._publish(*msg[:-1], resend=msg[-1] + 1)
+
+    def _publish(self, exchange, routing_key, body, properties, resend=0):
+        self._impl.basic_publish(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=body,
+            properties=properties
+        )
+        self._delivery_tag += 1
+        self._outstanding[self._delivery_tag] = (exchange, routing_key, body, properties, resend)
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        """Publish a message, wait only if `window` messages are not confirmed.
+
+        :returns: bool, True when the message is sent, see `flush` for the confirm.
+
+        """
+        if len(self._outstanding) >= self.window:
+            self.channel._flush_output(lambda: len(self._outstanding) < self.window)
+        self._publish(exchange, routing_key, body, properties)
+        self.published += 1
+        # write the frames out and handle confirms arrived, without waiting
+        self.channel._flush_output()
+        return True
+
+    def flush(self):
+        """Wait until all published messages are confirmed, nacked messages
+        are published again and waited for too."""
+        if self._outstanding:
+            self.channel._flush_output(lambda: not self._outstanding)
+
+    def close(self):
+        """Flush and close the channel."""
+        self.flush()
+        self.channel.close()
+
+
+class QueueMonitor(object):
+
+    """Depths of rabbitmq queues polled in a background thread.
+
+    Producers, `yascrapy_cache` and tools read the cached depths instead of
+    declaring every queue before every batch. Depths are polled every
+    `interval` seconds with passive `queue_declare` on a connection of the
+    monitor thread, or with one rabbitmq management api request for all
+    queues on `RabbitmqManagerIp` and `RabbitmqManagerPort` of `Config`.
+    The management api refreshes its stats every few seconds, use it with
+    many queues or many monitors.
+
+    :Example::
+
+        monitor = QueueMonitor(cfg, ["http_request:test:0", "http_request:test:1"])
+        monitor.start()
+        queue_name = monitor.choose(queue_max=5000)
+
+    """
+
+    def __init__(self, cfg, queue_names, interval=1, source="amqp", vhost="/",
+                 conn_factory=None, timeout=5):
+        """
+        :param cfg: `Config` object, get it from `yascrapy.config` module.
+        :param queue_names: list of string, queues to poll.
+        :param interval: optional float, seconds between two polls.
+        :param source: optional string, `amqp` for passive `queue_declare`,
+            `http` for rabbitmq management api.
+        :param vhost: optional string, rabbitmq virtual host used by `http` source.
+        :param conn_factory: optional function without params returning a
+            rabbitmq connection, `create_conn(cfg)` on default.
+        :param timeout: optional float, `http` source request timeout.
+
+        """
+        if source not in ("amqp", "http"):
+            raise Exception("unknown queue monitor source %s" % source)
+        self.cfg = cfg
+        self.queue_names = list(queue_names)
+        self.interval = interval
+        self.source = source
+        self.vhost = vhost
+        self.conn_factory = conn_factory or (lambda: create_conn(cfg))
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.updated = None
+        self.errors = 0
+        self._depths = {}
+        self._conn = None
+        self._channel = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Poll once and start the poll thread."""
+        self._poll_safe()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the poll thread and close its connection."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._close()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self._poll_safe()
+
+    def _poll_safe(self):
+        try:
+            self.poll()
+        except Exception as e:
+            # depths of the last poll are kept
+            self.errors += 1
+            logging.error("poll queue depths fail: %s" % str(e))
+            self._close()
+
+    def _close(self):
+        conn = self._conn
+        self._conn = None
+        self._channel = None
+        try:
+            if conn is not None:
+                conn.close()
+        except Exception:
+            pass
+
+    def poll(self):
+        """Get depths from rabbitmq now and cache them, `start` calls it every `interval`.
+
+        :returns: dict, queue name to message count, missing queues are not included.
+
+        """
+        if self.source == "http":
+            depths = self._poll_http()
+        else:
+            depths = self._poll_amqp()
+        with self.lock:
+            self._depths = depths
+            self.updated = time.time()
+        return dict(depths)
+
+    def _poll_amqp(self):
+        depths = {}
+        for queue_name in self.queue_names:
+            if self._channel is None:
+                if self._conn is None:
+                    self._conn = self.conn_factory()
+                self._channel = self._conn.channel()
+            try:
+                infoq = self._channel.queue_declare(queue=queue_name, durable=True, passive=True)
+            except pika.exceptions.ChannelClosed:
+                # passive declare of a missing queue closes the channel
+                self._channel = None
+                continue
+            depths[queue_name] = infoq.method.message_count
+        return depths
+
+    def _poll_http(self):
+        url = "http://%s:%s/api/queues/%s" % (
+            self.cfg["RabbitmqManagerIp"], self.cfg["RabbitmqManagerPort"],
+            urllib.quote(self.vhost, safe=""))
+        resp = requests.get(
+            url,
+            params={"columns": "name,messages"},
+            auth=(self.cfg["RabbitmqUser"], self.cfg["RabbitmqPassword"]),
+            timeout=self.timeout
+        )
+        resp.raise_for_status()
+        names = set(self.queue_names)
+        depths = {}
+        for q in resp.json():
+            if q["name"] in names:
+                depths[q["name"]] = q.get("messages") or 0
+        return depths
+
+    def depth(self, queue_name):
+        """Get cached depth of a queue, None if it is not polled successfully."""
+        with self.lock:
+            return self._depths.get(queue_name)
+
+    def depths(self):
+        """Get cached depths, dict of queue name to message count."""
+        with self.lock:
+            return dict(self._depths)
+
+    def with_room(self, queue_max, queue_names=None):
+        """Get queues with less than `queue_max` cached messages, queues
+        without depth are included.
+
+        :param queue_max: int, max messages of a queue.
+        :param queue_names: optional list of string, all polled queues on default.
+        :returns: list of string.
+
+        """
+        if queue_names is None:
+            queue_names = self.queue_names
+        with self.lock:
+            return [q for q in queue_names if self._depths.get(q, 0) < queue_max]
+
+    def choose(self, queue_max, queue_names=None, count=1):
+        """Choose a queue randomly, weighted by its room `queue_max - depth`,
+        so the least full queues get most messages. The cached depth is raised
+        by `count` until the next poll, messages pushed between two polls are
+        spread too.
+
+        :param queue_max: int, max messages of a queue.
+        :param queue_names: optional list of string, all polled queues on default.
+        :param count: optional int, messages pushed to the chosen queue.
+        :returns: string, queue name, None if all queues are full.
+
+        """
+        if queue_names is None:
+            queue_names = self.queue_names
+        with self.lock:
+            rooms = []
+            total = 0
+            for q in queue_names:
+                room = queue_max - self._depths.get(q, 0)
+                if room > 0:
+                    rooms.append((q, room))
+                    total += room
+            if not rooms:
+                return None
+            x = random.random() * total
+            for q, room in rooms:
+                x -= room
+                if x < 0:
+                    break
+            if q in self._depths:
+                self._depths[q] += count
+            return q
+
+
 class AsyncConsumer:
 
     """Define asynchronous ioloop to fetch links from rabbitmq `http_request` queue.
 
     This class is for internal use.
 
+    Worker `settings` used by this class:
+
+        * prefetch_count, optional int, unacked messages per consumer, default 1.
+          It is raised to `response_batch_size` and `ack_batch_size` if they are larger.
+        * ack_batch_size, optional int, acknowledge every N processed messages
+          with one `basic_ack(multiple=True)`, default 1 means no batch.
+        * ack_batch_delay, optional float, seconds to wait before acknowledging
+          a partial batch, default 0.1.
+
     """
 
     def __init__(self, cbk=None, cfg=None, worker=None):
@@ -50,6 +357,66 @@ class AsyncConsumer:
 
         # worker is `yascraoy.Worker` instance
         self.worker = worker
+        self.ack_batch_size = getattr(worker, "ack_batch_size", 1)
+        self.ack_batch_delay = getattr(worker, "ack_batch_delay", 0.1)
+        self.prefetch_count = max(
+            getattr(worker, "prefetch_count", 1),
+            getattr(worker, "response_batch_size", 1),
+            self.ack_batch_size,
+            1
+        )
+        self._ack_timer = None
+        self._reset_acks()
+
+    def _reset_acks(self):
+        """Delivery tags restart with a new channel, unacked messages of the
+        old channel are redelivered by rabbitmq server."""
+        if self._ack_timer is not None:
+            try:
+                self._connection.remove_timeout(self._ack_timer)
+            except Exception as e:
+                logging.warn("remove ack timer fail: %s" % str(e))
+        self._ack_timer = None
+        # all tags up to `_ack_floor` are processed, tags up to `_acked` are acked.
+        self._ack_floor = 0
+        self._acked = 0
+        self._processed = set()
+
+    def ack(self, delivery_tag):
+        """Acknowledge one processed message.
+
+        :param delivery_tag: rabbitmq message delivery tag.
+
+        With `ack_batch_size` more than 1, messages are acked with `multiple=True`
+        only when all messages before them are processed too. Every message on
+        the consumer channel must be acked with this method then.
+
+        """
+        if self.ack_batch_size <= 1:
+            self._channel.basic_ack(delivery_tag=delivery_tag)
+            return
+        self._processed.add(delivery_tag)
+        while self._ack_floor + 1 in self._processed:
+            self._ack_floor += 1
+            self._processed.remove(self._ack_floor)
+        if self._ack_floor - self._acked >= self.ack_batch_size:
+            self.flush_acks()
+        elif self._ack_timer is None and self._ack_floor > self._acked:
+            self._ack_timer = self._connection.add_timeout(
+                self.ack_batch_delay, self._on_ack_timer)
+
+    def _on_ack_timer(self):
+        self._ack_timer = None
+        self.flush_acks()
+
+    def flush_acks(self):
+        """Acknowledge all processed messages now."""
+        if self._ack_timer is not None:
+            self._connection.remove_timeout(self._ack_timer)
+            self._ack_timer = None
+        if self._ack_floor > self._acked:
+            self._channel.basic_ack(delivery_tag=self._ack_floor, multiple=True)
+            self._acked = self._ack_floor
 
     def get_params(self):
         credentials = pika.PlainCredentials(
@@ -78,7 +445,8 @@ class AsyncConsumer:
         logging.info("channel opened")
         self.worker.init_resp_queue(self._connection)
         self._channel = channel
-        self._channel.basic_qos(prefetch_count=1)
+        self._reset_acks()
+        self._channel.basic_qos(prefetch_count=self.prefetch_count)
         self._channel.add_on_cancel_callback(self.on_consumer_cancelled)
         self._channel.add_on_close_callback(self.on_channel_closed)
         logging.info("add some yascrapy callbacks to consumer channel")
@@ -139,6 +507,10 @@ class AsyncConsumer:
         self._channel.close()
 
     def stop(self):
+        try:
+            self.flush_acks()
+        except Exception as e:
+            logging.warn("flush acks fail: %s" % str(e))
         try:
             self._channel.basic_cancel(self.on_cancelok, self._consumer_tag)
             logging.info('Sending a Basic.Cancel RPC command to RabbitMQ')
@@ -2,9 +2,17 @@
 import json
 from requests import Request as RequestLib
 from .ssdb import get_client
-import redis
 import pika
 import logging
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# `Request` attributes on the wire, positional codecs use this order.
+REQUEST_ATTRS = ["proxy_name", "method", "url", "headers", "data",
+                 "params", "cookies", "crawler_name", "timeout"]
 
 
 class RequestError(Exception):
@@ -19,7 +27,123 @@ class RequestError(Exception):
         return repr(self.value)
 
 
-class Request(RequestLib):
+class JsonCodec(object):
+
+    """Plain json object, the format used by downloaders, no header byte."""
+
+    name = "json"
+    tag = "{"
+
+    def encode(self, values):
+        return json.dumps(dict(zip(REQUEST_ATTRS, values)))
+
+    def decode(self, data):
+        d = json.loads(data)
+        return [d[attr] for attr in REQUEST_ATTRS]
+
+
+class TupleCodec(object):
+
+    """Compact json array of attribute values in `REQUEST_ATTRS` order."""
+
+    name = "tuple"
+    tag = "\x01"
+
+    def encode(self, values):
+        return self.tag + json.dumps(values, separators=(",", ":"))
+
+    def decode(self, data):
+        return json.loads(data[1:])
+
+
+class MsgpackCodec(object):
+
+    """msgpack array of attribute values in `REQUEST_ATTRS` order, needs `msgpack` library."""
+
+    name = "msgpack"
+    tag = "\x02"
+
+    def encode(self, values):
+        if msgpack is None:
+            raise RequestError("msgpack codec needs msgpack library")
+        return self.tag + msgpack.packb(values, use_bin_type=True)
+
+    def decode(self, data):
+        if msgpack is None:
+            raise RequestError("msgpack codec needs msgpack library")
+        return msgpack.unpackb(data[1:], raw=False)
+
+
+# codecs by name and by header byte, `decode_request` detects codec from the first byte.
+CODECS = {}
+CODEC_TAGS = {}
+
+
+def register_codec(codec):
+    """Register a `Request` codec object.
+
+    :param codec: object with `name`, one byte `tag`, `encode(values)` and `decode(data)`.
+
+    """
+    CODECS[codec.name] = codec
+    CODEC_TAGS[codec.tag] = codec
+
+
+for _codec in (JsonCodec(), TupleCodec(), MsgpackCodec()):
+    register_codec(_codec)
+
+
+class RequestMixin(object):
+
+    """Serialization shared by `Request` and `LiteRequest`."""
+
+    __slots__ = ()
+
+    def from_json(self, data):
+        """Set `Request` attributes from data, no return value.
+
+        :param data: json string to loads.
+        :returns: no return value.
+
+        """
+        data = json.loads(data)
+        for attr in REQUEST_ATTRS:
+            setattr(self, attr, data[attr])
+
+    def to_json(self):
+        """Convert `Request` to json string."""
+        d = {}
+        for attr in REQUEST_ATTRS:
+            d[attr] = getattr(self, attr)
+        return json.dumps(d)
+
+    def encode(self, codec="json"):
+        """Convert `Request` to string with the codec.
+
+        :param codec: optional string, codec name, `json`, `tuple` or `msgpack`.
+        :returns: string, the first byte tags the codec, `json` is the same as `to_json`.
+        :raises: RequestError
+
+        """
+        if codec not in CODECS:
+            raise RequestError("unknown request codec %s" % codec)
+        return CODECS[codec].encode([getattr(self, attr) for attr in REQUEST_ATTRS])
+
+    def decode(self, data):
+        """Set `Request` attributes from string of any registered codec, no return value.
+
+        :param data: string from `encode` or `to_json`.
+        :raises: RequestError
+
+        """
+        codec = CODEC_TAGS.get(data[:1])
+        if codec is None:
+            raise RequestError("unknown request codec header %r" % data[:1])
+        for attr, v in zip(REQUEST_ATTRS, codec.decode(data)):
+            setattr(self, attr, v)
+
+
+class Request(RequestMixin, RequestLib):
 
     """`Request` class is used to store http request object.
 
@@ -74,28 +198,66 @@ class Request(RequestLib):
         self.method = method if method else 'GET'
         self.timeout = timeout if timeout else 15
 
-    def from_json(self, data):
-        """Set `Request` attributes from data, no return value.
 
-        :param data: json string to loads.
-        :returns: no return value.
+class LiteRequest(RequestMixin):
+
+    """`LiteRequest` is a `__slots__` record with the public fields of `Request`.
+
+    It does not build `requests.Request` hooks and other objects, use it when
+    many requests are created, such as in producers. `RequestQueue` accepts it
+    the same as `Request`. Call `to_request_lib` if `requests.Request` is needed.
+
+    :Example usage::
 
+        r = LiteRequest(
+            method="GET",
+            proxy_name="http_china",
+            crawler_name="test_crawler",
+            url="http://github.com",
+        )
+
+    """
+
+    __slots__ = ("proxy_name", "method", "url", "headers", "data",
+                 "params", "cookies", "crawler_name", "timeout")
+
+    def __init__(self, method=None, url=None, proxy_name=None, headers=None, files=None,
+                 data=None, params=None, auth=None, cookies=None, hooks=None,
+                 crawler_name=None, timeout=None, json=None):
+        """Same params and defaults as `Request`, `files`, `auth`, `hooks` and
+        `json` are accepted but not stored, they are not sent on the wire.
         """
-        data = json.loads(data)
-        attrs = ["proxy_name", "method", "url", "headers", "data",
-                 "params", "cookies", "crawler_name", "timeout"]
-        for attr in attrs:
-            setattr(self, attr, data[attr])
+        self.proxy_name = proxy_name
+        self.method = method if method else 'GET'
+        self.url = url
+        self.headers = {} if headers is None else headers
+        self.data = data if data else ''
+        self.params = {} if params is None else params
+        self.cookies = cookies
+        self.crawler_name = crawler_name
+        self.timeout = timeout if timeout else 15
 
-    def to_json(self):
-        """Convert `Request` to json string."""
-        attrs = ["proxy_name", "method", "url", "headers", "data",
-                 "params", "cookies", "crawler_name", "timeout"]
-        d = {}
-        for attr in attrs:
-            v = getattr(self, attr)
-            d[attr] = v
-        return json.dumps(d)
+    def to_request_lib(self):
+        """Convert to `Request`, which is a `requests.Request`."""
+        return Request(
+            method=self.method,
+            url=self.url,
+            proxy_name=self.proxy_name,
+            headers=self.headers,
+            data=self.data,
+            params=self.params,
+            cookies=self.cookies,
+            crawler_name=self.crawler_name,
+            timeout=self.timeout
+        )
+
+
+def _log_filter_error(future):
+    """Callback of pipelined bloomd adds, nobody waits for them."""
+    try:
+        future.result()
+    except Exception as e:
+        logging.error("bloomd add fail: %s" % str(e))
 
 
 class RequestQueue(object):
@@ -129,7 +291,7 @@ class RequestQueue(object):
 
     """
 
-    def __init__(self, crawler_name, ssdb_clients=None, filter_q=None, queue_name=None):
+    def __init__(self, crawler_name, ssdb_clients=None, filter_q=None, queue_name=None, codec="json"):
         """Rabbitmq-Server one physical queue on one node, use multiple queues with same crawler.
 
         :param queue_name: optional string, rabbitmq queue name,
@@ -139,6 +301,8 @@ class RequestQueue(object):
         :param ssdb_clients: ssdb_clients to use, get this param from `yascrapy.ssdb` module.
         :param filter_q: `FilterQueue` object, get this param from `yascrap.filter_queue` module.
         :param queue_name: optional string, use default queue name if not specified.
+        :param codec: optional string, `Request` codec used on rabbitmq and ssdb,
+            see `Request.encode`. Readers detect the codec, but downloaders only read `json`.
         :raises: RequestError
 
         """
@@ -157,6 +321,9 @@ class RequestQueue(object):
         self.error_queue_name = "http_request:%s:error" % crawler_name
         self.routing_key = self.queue_name
         self.filter_q = filter_q
+        if codec not in CODECS:
+            raise RequestError("unknown request codec %s" % codec)
+        self.codec = codec
 
     def declare_error_queue(self, channel):
         '''declare error queue, not used.'''
@@ -251,8 +418,7 @@ class RequestQueue(object):
         client = get_client(self.ssdb_clients, k)
         if not client:
             raise RequestError('ssdb_client can not be none')
-        rclient = redis.Redis(connection_pool=client['connection_pool'])
-        rclient.set(k, r.to_json())
+        client["client"].set(k, r.encode(self.codec))
 
     def error_push_cache(self, r):
         '''interface for error handler to push `Request` to ssdb.
@@ -293,13 +459,13 @@ class RequestQueue(object):
             )
         if queue_name is None:
             queue_name = self.queue_name
-        if not isinstance(r, Request):
-            raise RequestError("param must be Request object")
+        if not isinstance(r, (Request, LiteRequest)):
+            raise RequestError("param must be Request or LiteRequest object")
         # logging.info("push %s" % r.url)
         ok = channel.basic_publish(
             exchange=self.exchange_name,
             routing_key=queue_name,
-            body=r.to_json(),
+            body=r.encode(self.codec),
             properties=pika.BasicProperties(
                 delivery_mode=1
             )
@@ -314,12 +480,65 @@ class RequestQueue(object):
         :param http_filter: optional string, use `r.url` on default if `http_filter` is not specified.
 
         If publish confirm fail, message lost and http_filter not set.
+
+        With `pipeline_size` of `filter_q`, the check is sent through the bloomd
+        pipeline and the url is set without waiting for bloomd, call
+        `filter_q.close` before exit to wait for the buffered commands.
         """
         if http_filter is None:
             http_filter = r.url
-        is_crawled = self.filter_q.is_member(http_filter)
+        if self.filter_q.pipeline_size:
+            future = self.filter_q.is_member_async(http_filter)
+            self.filter_q.flush()
+            is_crawled = future.result()
+        else:
+            is_crawled = self.filter_q.is_member(http_filter)
         if is_crawled:
             return
         else:
             self.push(r, channel)
-            self.filter_q.push(http_filter)
+            if self.filter_q.pipeline_size:
+                self.filter_q.push_async(http_filter, callback=_log_filter_error)
+            else:
+                self.filter_q.push(http_filter)
+
+    def safe_push_many(self, requests, channel, http_filters=None):
+        """Push `Request` objects whose urls are not crawled to rabbitmq server.
+
+        :param requests: list of `Request` object.
+        :param channel: rabbitmq channel to use.
+        :param http_filters: optional list of string, same length as `requests`,
+            use `r.url` for every request on default if not specified.
+        :returns: list of `Request` object, requests actually pushed.
+
+        Batch version of `safe_push`, use one bloomd `multi` command to check the
+        whole batch and one bloomd `bulk` command to set the pushed urls, or
+        the bloomd pipeline with `pipeline_size` of `filter_q`.
+        Duplicated urls in the same batch are pushed only once.
+        """
+        if http_filters is None:
+            http_filters = [r.url for r in requests]
+        if len(http_filters) != len(requests):
+            raise RequestError("http_filters length not equal requests length")
+        if self.filter_q.pipeline_size:
+            futures = [self.filter_q.is_member_async(f) for f in http_filters]
+            self.filter_q.flush()
+            crawled = [future.result() for future in futures]
+        else:
+            crawled = self.filter_q.is_member_many(http_filters)
+        pushed = []
+        pushed_filters = []
+        seen = set()
+        for r, http_filter, is_crawled in zip(requests, http_filters, crawled):
+            if is_crawled or http_filter in seen:
+                continue
+            seen.add(http_filter)
+            self.push(r, channel)
+            pushed.append(r)
+            pushed_filters.append(http_filter)
+        if self.filter_q.pipeline_size:
+            for http_filter in pushed_filters:
+                self.filter_q.push_async(http_filter, callback=_log_filter_error)
+        else:
+            self.filter_q.push_many(pushed_filters)
+        return pushed
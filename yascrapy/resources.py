@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import threading
+from .config import Config
+from .ssdb import get_clients
+from .ssdb import get_proxy_client
+from .libs.bloomfilter import BloomFilter
+from . import bloomd
+
+
+class Resources(object):
+
+    """Clients shared by all worker threads of a process, every one is created
+    once on first use. `yascrapy_worker` passes one `Resources` object to all
+    workers of a process.
+
+    :Example usage::
+
+        resources = Resources("/etc/yascrapy/common.json", threads=10)
+        workers = [Worker(config_file=resources.config_file, settings=settings,
+                          resources=resources) for i in range(10)]
+
+    """
+
+    def __init__(self, config_file="/etc/yascrapy/common.json", threads=1):
+        """
+        :param config_file: optional string, config file used by all workers.
+        :param threads: optional int, worker threads using the resources, bloomd
+            client is a connection pool of this size if more than 1.
+
+        """
+        self.config_file = config_file
+        self.threads = threads
+        self.lock = threading.RLock()
+        self.resources = {}
+
+    def get(self, name, factory):
+        """Get shared resource, create it with `factory` if it does not exist.
+
+        :param name: hashable, resource name, such as `("mongo", host, port)` in plugins.
+        :param factory: function without params, the resource must be thread-safe.
+        :returns: resource object.
+
+        """
+        with self.lock:
+            if name not in self.resources:
+                self.resources[name] = factory()
+            return self.resources[name]
+
+    @property
+    def cfg(self):
+        """Config loaded from `config_file`."""
+        return self.get("cfg", lambda: Config(conf_file=self.config_file).get())
+
+    @property
+    def ssdb_clients(self):
+        """ssdb clients and hash ring of `SSDBNodes`, see `yascrapy.ssdb.get_clients`."""
+        return self.get("ssdb_clients", lambda: get_clients(nodes=self.cfg["SSDBNodes"]))
+
+    @property
+    def proxy_client(self):
+        """Proxy redis client, see `yascrapy.ssdb.get_proxy_client`."""
+        return self.get("proxy_client", lambda: get_proxy_client(cfg=self.cfg))
+
+    @property
+    def bloomd_client(self):
+        """bloomd client of `BloomdNodes`, thread-safe `PooledBloomdClient` if `threads` is more than 1."""
+        return self.get("bloomd_client", lambda: bloomd.get_client(
+            nodes=self.cfg["BloomdNodes"],
+            max_connections=self.threads if self.threads > 1 else None
+        ))
+
+    def local_filter(self, name, capacity, prob):
+        """In-process bloom filter of urls added by all workers of the process,
+        see `local_filter` of `yascrapy.filter_queue.FilterQueue`.
+
+        :param name: string, filter name, such as the crawler name.
+        :param capacity: int, filter capacity.
+        :param prob: float, error rate of the filter.
+        :returns: `yascrapy.libs.bloomfilter.BloomFilter` object.
+
+        """
+        return self.get(("local_filter", name), lambda: BloomFilter(capacity, prob))
+
+    def close(self):
+        """Close resources which have `close` method."""
+        with self.lock:
+            for resource in self.resources.values():
+                if hasattr(resource, "close"):
+                    resource.close()
+            self.resources = {}
@@ -1,9 +1,16 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import os
 import json
+import zlib
+import struct
 import pika
-import redis
+import threading
+from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
 from lxml.html import fromstring
+from lxml.html import HtmlElementClassLookup
+from lxml import etree
 import cssselect
 from requests import Response as ResponseLib
 from traceback import print_exc
@@ -11,6 +18,21 @@ from requests.packages.urllib3._collections import HTTPHeaderDict
 from . import utils
 from .ssdb import get_client
 import logging
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+
+# `Response` attributes on the wire.
+RESPONSE_ATTRS = ["url", "html", "status_code", "reason", "error_code",
+                  "error_msg", "crawler_name", "http_request", "http_proxy"]
+
+# Compressed responses start with this byte, downloader json starts with "{".
+# Header: magic, compressor tag, mode ("p" whole payload or "h" html field),
+# 4 bytes big endian dictionary id, 0 without dictionary.
+RESPONSE_MAGIC = "\x10"
+RESPONSE_HEADER = struct.Struct(">ccI")
 
 
 class ResponseError(Exception):
@@ -25,6 +47,141 @@ class ResponseError(Exception):
         return repr(self.value)
 
 
+class ResponseDictionary(object):
+
+    """Preset dictionary of pages with the same template, such as one crawler pages.
+
+    zlib keeps a 32KB window, the compressor is primed with the dictionary once
+    and copied for every response. Create it with `train_dictionary`.
+
+    """
+
+    def __init__(self, data):
+        """:param data: string, dictionary content, only the last 32KB are useful."""
+        self.data = data
+        self.id = (zlib.crc32(data) & 0xffffffff) or 1
+        self._compressors = {}
+        c = zlib.compressobj()
+        self._decompressor = zlib.decompressobj()
+        self._decompressor.decompress(c.compress(data) + c.flush(zlib.Z_SYNC_FLUSH))
+
+    def compressor(self, level):
+        """Get a zlib compress object which has seen the dictionary."""
+        if level not in self._compressors:
+            c = zlib.compressobj(level)
+            c.compress(self.data)
+            c.flush(zlib.Z_SYNC_FLUSH)
+            self._compressors[level] = c
+        return self._compressors[level].copy()
+
+    def decompressor(self):
+        """Get a zlib decompress object which has seen the dictionary."""
+        return self._decompressor.copy()
+
+
+def train_dictionary(samples, size=32 * 1024, min_ratio=0.5):
+    """Build `ResponseDictionary` from html pages of the same crawler.
+
+    :param samples: list of string, html pages.
+    :param size: optional int, max dictionary size.
+    :param min_ratio: optional float, keep lines found in this ratio of pages.
+    :returns: `ResponseDictionary` object.
+
+    Template lines shared by most pages are kept, the most common ones last,
+    so they are nearest to the compressed page in the zlib window.
+    """
+    counts = {}
+    for sample in samples:
+        if isinstance(sample, unicode):
+            sample = sample.encode("utf-8")
+        for line in set(sample.splitlines(True)):
+            if len(line.strip()) >= 8:
+                counts[line] = counts.get(line, 0) + 1
+    min_count = max(1, int(len(samples) * min_ratio))
+    lines = [line for line, cnt in counts.items() if cnt >= min_count]
+    lines.sort(key=lambda line: (counts[line], len(line)))
+    data = "".join(lines)
+    return ResponseDictionary(data[-size:])
+
+
+class ZlibCompressor(object):
+
+    """zlib stream, supports `ResponseDictionary`."""
+
+    name = "zlib"
+    tag = "z"
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data, dictionary=None):
+        if dictionary is None:
+            return zlib.compress(data, self.level)
+        c = dictionary.compressor(self.level)
+        return c.compress(data) + c.flush()
+
+    def decompress(self, data, dictionary=None):
+        if dictionary is None:
+            return zlib.decompress(data)
+        d = dictionary.decompressor()
+        return d.decompress(data) + d.flush()
+
+
+class Lz4Compressor(object):
+
+    """lz4 block, faster than zlib with less ratio, needs `lz4` library."""
+
+    name = "lz4"
+    tag = "4"
+
+    def compress(self, data, dictionary=None):
+        if lz4 is None:
+            raise ResponseError("lz4 compressor needs lz4 library")
+        if dictionary is not None:
+            raise ResponseError("lz4 compressor does not support dictionary")
+        return lz4.block.compress(data)
+
+    def decompress(self, data, dictionary=None):
+        if lz4 is None:
+            raise ResponseError("lz4 compressor needs lz4 library")
+        return lz4.block.decompress(data)
+
+
+# compressors by name and by header tag.
+COMPRESSORS = {}
+COMPRESSOR_TAGS = {}
+
+
+def register_compressor(compressor):
+    """Register a `Response` compressor object.
+
+    :param compressor: object with `name`, one byte `tag`, `compress(data, dictionary)`
+        and `decompress(data, dictionary)`.
+
+    """
+    COMPRESSORS[compressor.name] = compressor
+    COMPRESSOR_TAGS[compressor.tag] = compressor
+
+
+for _compressor in (ZlibCompressor(), Lz4Compressor()):
+    register_compressor(_compressor)
+
+
+class MissingDictionary(ResponseError):
+
+    """Compressed `Response` uses a dictionary which is not loaded."""
+
+    def __init__(self, dict_id):
+        self.dict_id = dict_id
+        self.value = "response dictionary %d not loaded" % dict_id
+
+
+# attributes set by `requests.Response.__init__`, built on first access.
+COMPAT_ATTRS = frozenset(["_content", "_content_consumed", "status_code", "headers",
+                          "url", "encoding", "history", "reason", "cookies",
+                          "elapsed", "request"])
+
+
 class Response(ResponseLib):
 
     """Use `requests.Response` as the base class to make interface simple.
@@ -33,6 +190,9 @@ class Response(ResponseLib):
     use reqeusts.version `2.8.1` because we use some internal interface in `requests` 
     library.
 
+    Workers mostly use `html`, `xpath` and `css`, so the `requests.Response`
+    attributes and the urllib3 `raw` body are built on first access.
+
     """
 
     def __init__(self):
@@ -41,7 +201,43 @@ class Response(ResponseLib):
         library to detect charset of the html content.
 
         """
+        self._raw = None
+        self._raw_pending = False
+
+    def __getattr__(self, name):
+        # only called if normal attribute lookup fails
+        if name in COMPAT_ATTRS and not self.__dict__.get("_compat_ready"):
+            self._init_compat()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def _init_compat(self):
+        attrs = dict(self.__dict__)
+        self._compat_ready = True
         ResponseLib.__init__(self)
+        # `raw` body is `html` encoded with utf-8, requests needs no chardet
+        self.encoding = "utf-8"
+        self.__dict__.update(attrs)
+
+    @property
+    def text(self):
+        """Same as `html`, which is decoded by the downloader or `utils.decode`."""
+        if isinstance(self.html, unicode):
+            return self.html
+        return utils.decode(self.html, url=self.url)
+
+    @property
+    def raw(self):
+        """urllib3 `HTTPResponse` of `html`, built on first access."""
+        if self._raw_pending:
+            self._raw_pending = False
+            self._set_raw()
+        return self._raw
+
+    @raw.setter
+    def raw(self, value):
+        self._raw = value
+        self._raw_pending = False
 
     def _set_raw(self):
         utils.add_urllib3_response({
@@ -58,7 +254,9 @@ class Response(ResponseLib):
         :returns: no return value.
 
         """
-        data = json.loads(data)
+        self._set_data(json.loads(data))
+
+    def _set_data(self, data):
         self.url = data["url"]
         self.html = data["html"]
         self.status_code = data["status_code"]
@@ -69,7 +267,7 @@ class Response(ResponseLib):
         self.http_request = data["http_request"]
         self.http_proxy = data["http_proxy"]
         self.root = None
-        self._set_raw()
+        self._raw_pending = True
 
     def to_json(self):
         """Convert `Request` to json string."""
@@ -81,6 +279,67 @@ class Response(ResponseLib):
             d[attr] = v
         return json.dumps(d)
 
+    def encode(self, compression=None, html_only=False, dictionary=None):
+        """Convert `Response` to string, compressed with a header if `compression` is set.
+
+        :param compression: optional string, compressor name, `zlib` or `lz4`.
+        :param html_only: optional bool, compress `html` only, other fields stay json.
+        :param dictionary: optional `ResponseDictionary` object.
+        :returns: string, the same as `to_json` if `compression` is None.
+        :raises: ResponseError
+
+        """
+        if compression is None:
+            return self.to_json()
+        if compression not in COMPRESSORS:
+            raise ResponseError("unknown response compressor %s" % compression)
+        compressor = COMPRESSORS[compression]
+        dict_id = dictionary.id if dictionary is not None else 0
+        if not html_only:
+            header = RESPONSE_HEADER.pack(compressor.tag, "p", dict_id)
+            return RESPONSE_MAGIC + header + compressor.compress(self.to_json(), dictionary)
+        d = {}
+        for attr in RESPONSE_ATTRS:
+            if attr != "html":
+                d[attr] = getattr(self, attr)
+        meta = json.dumps(d)
+        html = self.html
+        if isinstance(html, unicode):
+            html = html.encode("utf-8")
+        header = RESPONSE_HEADER.pack(compressor.tag, "h", dict_id)
+        return (RESPONSE_MAGIC + header + struct.pack(">I", len(meta)) + meta +
+                compressor.compress(html, dictionary))
+
+    def decode(self, data, dictionaries=None):
+        """Set `Response` attributes from `encode` or downloader json string, no return value.
+
+        :param data: string, the header is detected from the first byte.
+        :param dictionaries: optional dict, `ResponseDictionary` objects by id.
+        :raises: ResponseError, MissingDictionary if the dictionary is not in `dictionaries`.
+
+        """
+        if data[:1] != RESPONSE_MAGIC:
+            return self.from_json(data)
+        offset = 1 + RESPONSE_HEADER.size
+        tag, mode, dict_id = RESPONSE_HEADER.unpack(data[1:offset])
+        compressor = COMPRESSOR_TAGS.get(tag)
+        if compressor is None:
+            raise ResponseError("unknown response compressor header %r" % tag)
+        dictionary = None
+        if dict_id:
+            dictionary = (dictionaries or {}).get(dict_id)
+            if dictionary is None:
+                raise MissingDictionary(dict_id)
+        if mode == "p":
+            return self.from_json(compressor.decompress(data[offset:], dictionary))
+        if mode != "h":
+            raise ResponseError("unknown response compression mode %r" % mode)
+        meta_len, = struct.unpack(">I", data[offset:offset + 4])
+        offset += 4
+        d = json.loads(data[offset:offset + meta_len])
+        d["html"] = compressor.decompress(data[offset + meta_len:], dictionary).decode("utf-8")
+        self._set_data(d)
+
     def _set_root(self):
         try:
             self.root = Selector(fromstring(self.html))
@@ -107,6 +366,225 @@ class Response(ResponseLib):
             self._set_root()
         return self.root.css(css_selector)
 
+    def stream(self, extractor):
+        """Extract fields while the html is parsed incrementally, see `StreamExtractor`.
+
+        :param extractor: `StreamExtractor` object, build it once and reuse it.
+        :returns: dict, field name to value.
+
+        Parsing stops once every field is found, use it instead of `xpath` and
+        `css` when the fields are in the beginning of large pages.
+        """
+        return extractor.extract(self.html)
+
+
+class StreamField(object):
+
+    """Field of `StreamExtractor`, matched on the end tag of an element.
+
+    :Example usage::
+
+        StreamField("title", "title")
+        StreamField("name", "h2", attrs={"class": "user-card-name"})
+        StreamField("links", "a", value="@href", many=True)
+
+    """
+
+    def __init__(self, name, tag, attrs=None, value="text", many=False):
+        """
+        :param name: string, field name in the result.
+        :param tag: string, element tag.
+        :param attrs: optional dict, attribute values the element must have,
+            `class` matches one of the element classes.
+        :param value: optional, `text` for stripped text content, `@attr` for
+            an attribute, or a function called with the lxml element.
+        :param many: optional bool, collect all matches in a list, parsing
+            does not stop early before the end of the page.
+
+        """
+        self.name = name
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.many = many
+        if callable(value):
+            self.value = value
+        elif value == "text":
+            self.value = lambda elem: elem.text_content().strip()
+        elif value.startswith("@"):
+            self.value = lambda elem: elem.get(value[1:])
+        else:
+            raise ResponseError("unknown stream field value %s" % value)
+
+    def match(self, elem):
+        for k, v in self.attrs.items():
+            attr = elem.get(k)
+            if attr is None:
+                return False
+            if k == "class":
+                if v not in attr.split():
+                    return False
+            elif attr != v:
+                return False
+        return True
+
+
+class StreamExtractor(object):
+
+    """Extract fields from html with `lxml.etree.HTMLPullParser`.
+
+    The page is fed in chunks, fields are evaluated when their elements end,
+    and the parser stops once every field without `many` is found. Elements
+    after that are never parsed nor allocated.
+
+    """
+
+    def __init__(self, fields, chunk_size=16 * 1024):
+        """
+        :param fields: list of `StreamField` object.
+        :param chunk_size: optional int, bytes fed to the parser at a time.
+
+        """
+        self.fields = fields
+        self.chunk_size = chunk_size
+        self.tags = {}
+        for field in fields:
+            self.tags.setdefault(field.tag, []).append(field)
+        self.stop_early = len(fields) > 0 and not [f for f in fields if f.many]
+
+    def extract(self, html):
+        """Extract fields from html.
+
+        :param html: string or unicode.
+        :returns: dict, field name to value, None or [] if not found.
+
+        """
+        if isinstance(html, unicode):
+            html = html.encode("utf-8")
+        res = {}
+        pending = set()
+        for field in self.fields:
+            if field.many:
+                res[field.name] = []
+            else:
+                res[field.name] = None
+                pending.add(field.name)
+        parser = etree.HTMLPullParser(events=("end",), tag=list(self.tags), encoding="utf-8")
+        # the same element classes as `fromstring`, so `Selector` works on them
+        parser.set_element_class_lookup(HtmlElementClassLookup())
+        offset = 0
+        done = False
+        while not done and offset < len(html):
+            parser.feed(html[offset:offset + self.chunk_size])
+            offset += self.chunk_size
+            done = self._read_events(parser, res, pending)
+        if not done:
+            parser.close()
+            self._read_events(parser, res, pending)
+        return res
+
+    def _read_events(self, parser, res, pending):
+        for event, elem in parser.read_events():
+            for field in self.tags.get(elem.tag, ()):
+                if field.name not in pending and not field.many:
+                    continue
+                if not field.match(elem):
+                    continue
+                if field.many:
+                    res[field.name].append(field.value(elem))
+                else:
+                    res[field.name] = field.value(elem)
+                    pending.discard(field.name)
+            if self.stop_early and not pending:
+                return True
+        return False
+
+
+class SelectorCache(object):
+
+    """Process-wide LRU cache of CSS to XPath translations and compiled
+    `lxml.etree.XPath` objects, crawlers use the same selectors on every page.
+
+    """
+
+    def __init__(self, maxsize=1024):
+        """:param maxsize: int, max entries of each cache, 0 means no cache."""
+        self.maxsize = maxsize
+        self.translator = cssselect.GenericTranslator()
+        self.css_cache = OrderedDict()
+        self.xpath_cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.css_hits = self.css_misses = 0
+        self.xpath_hits = self.xpath_misses = 0
+
+    def _get(self, cache, key):
+        with self.lock:
+            value = cache.pop(key, None)
+            if value is not None:
+                cache[key] = value
+            return value
+
+    def _put(self, cache, key, value):
+        with self.lock:
+            cache[key] = value
+            while len(cache) > self.maxsize:
+                cache.popitem(last=False)
+
+    def css_to_xpath(self, css_selector):
+        """Translate CSS selector to XPath string."""
+        xpath_selector = self._get(self.css_cache, css_selector)
+        if xpath_selector is not None:
+            self.css_hits += 1
+            return xpath_selector
+        self.css_misses += 1
+        xpath_selector = self.translator.css_to_xpath(css_selector)
+        self._put(self.css_cache, css_selector, xpath_selector)
+        return xpath_selector
+
+    def compile(self, xpath_selector):
+        """Get compiled `lxml.etree.XPath` object of XPath string."""
+        xpath = self._get(self.xpath_cache, xpath_selector)
+        if xpath is not None:
+            self.xpath_hits += 1
+            return xpath
+        self.xpath_misses += 1
+        xpath = etree.XPath(xpath_selector)
+        self._put(self.xpath_cache, xpath_selector, xpath)
+        return xpath
+
+    def resize(self, maxsize):
+        """Change max entries, least recently used entries are dropped."""
+        with self.lock:
+            self.maxsize = maxsize
+            for cache in (self.css_cache, self.xpath_cache):
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.css_cache.clear()
+            self.xpath_cache.clear()
+            self.css_hits = self.css_misses = 0
+            self.xpath_hits = self.xpath_misses = 0
+
+    def stats(self):
+        """Get cache stats.
+
+        :returns: dict, `maxsize`, entries and hits / misses of css and xpath caches.
+
+        """
+        return {
+            "maxsize": self.maxsize,
+            "css_size": len(self.css_cache),
+            "css_hits": self.css_hits,
+            "css_misses": self.css_misses,
+            "xpath_size": len(self.xpath_cache),
+            "xpath_hits": self.xpath_hits,
+            "xpath_misses": self.xpath_misses,
+        }
+
+
+selector_cache = SelectorCache()
+
 
 class SelectorList(list):
 
@@ -155,40 +633,84 @@ class Selector:
         return self.elem.text_content().strip()
 
     def css(self, css_selector):
-        xpath_selector = cssselect.GenericTranslator().css_to_xpath(
-            css_selector)
+        xpath_selector = selector_cache.css_to_xpath(css_selector)
         return self.xpath(xpath_selector)
 
     def _css(self, css_selector):
-        xpath_selector = cssselect.GenericTranslator().css_to_xpath(
-            css_selector)
+        xpath_selector = selector_cache.css_to_xpath(css_selector)
         return self._xpath(xpath_selector)
 
     def _xpath(self, xpath_selector):
         if self.elem is None:
             elems = []
         else:
-            elems = self.elem.xpath(xpath_selector)
+            elems = selector_cache.compile(xpath_selector)(self.elem)
         return [Selector(elem) for elem in elems]
 
     def xpath(self, xpath_selector):
         return SelectorList(self._xpath(xpath_selector))
 
 
+class NodePool(object):
+
+    """Process-wide threads running one ssdb command per node in parallel,
+    shared by all `ResponseQueue` objects, workers create a new one on every
+    rabbitmq reconnect.
+
+    """
+
+    def __init__(self):
+        self.pool = None
+        self.pid = None
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def map(self, func, items):
+        """Run `func` on every item in the pool, grown to `len(items)` threads.
+
+        :returns: list, results in the same order as `items`.
+
+        """
+        with self.lock:
+            # threads of a pool do not survive fork, children create their own
+            if self.pool is None or self.pid != os.getpid() or self.size < len(items):
+                if self.pool is not None and self.pid == os.getpid():
+                    # tasks already submitted still run, then its threads exit
+                    self.pool.close()
+                self.pool = ThreadPool(len(items))
+                self.pid = os.getpid()
+                self.size = len(items)
+            # submitted under the lock, the pool is not closed before it
+            result = self.pool.map_async(func, items)
+        return result.get()
+
+
+node_pool = NodePool()
+
+
 class ResponseQueue(object):
 
     """`ResponseQueue` have two types. `Response.url` queue is on rabbitmq server.
     `Response` json string is on ssdb. The `worker` get url from rabbitmq server and 
     get the response html content from ssdb indexed with the url."""
 
-    def __init__(self, crawler_name, queue_name=None, ssdb_clients=None):
+    def __init__(self, crawler_name, queue_name=None, ssdb_clients=None, use_getdel=False,
+                 compression=None, compress_html_only=False, dictionary=None):
         """Set response queue init params.
 
         :param crawler_name: string, crawler name to use.
         :param queue_name: optional string, use `http_response:[crawler_name]` on default if not specified.
         :param ssdb_clients: ssdb clients, get it from `yascrapy.ssdb` module.
+        :param use_getdel: optional bool, use atomic `GETDEL` command in `get`,
+            only redis server 6.2+ supports it, ssdb does not.
+        :param compression: optional string, compressor name used by `push_cache`.
+        :param compress_html_only: optional bool, compress `html` field only in `push_cache`.
+        :param dictionary: optional `ResponseDictionary`, used by `push_cache` with `zlib`.
         :raises: ResponseError
 
+        `get` and `get_many` detect compression from the response header,
+        dictionaries not loaded are read from ssdb, see `save_dictionary`.
+
         """
         self.crawler_name = crawler_name
         if queue_name is None:
@@ -198,6 +720,45 @@ class ResponseQueue(object):
         if ssdb_clients is None:
             raise ResponseError("ssdb_clients cannot be None")
         self.ssdb_clients = ssdb_clients
+        self.use_getdel = use_getdel
+        self.compression = compression
+        self.compress_html_only = compress_html_only
+        self.dictionary = dictionary
+        self.dictionaries = {}
+        self._preloaded = {}
+        if dictionary is not None:
+            self.dictionaries[dictionary.id] = dictionary
+
+    def save_dictionary(self, dictionary):
+        """Save `ResponseDictionary` to ssdb with key `response_dict:[id]`, so
+        workers can decode responses compressed with it.
+        """
+        dict_key = "response_dict:%d" % dictionary.id
+        get_client(self.ssdb_clients, dict_key)["client"].set(dict_key, dictionary.data)
+        self.dictionaries[dictionary.id] = dictionary
+
+    def load_dictionary(self, dict_id):
+        """Load `ResponseDictionary` saved by `save_dictionary`.
+
+        :param dict_id: int, dictionary id from the response header.
+        :raises: ResponseError
+
+        """
+        dict_key = "response_dict:%d" % dict_id
+        data = get_client(self.ssdb_clients, dict_key)["client"].get(dict_key)
+        if data is None:
+            raise ResponseError("response dictionary %d not found" % dict_id)
+        self.dictionaries[dict_id] = ResponseDictionary(data)
+        return self.dictionaries[dict_id]
+
+    def _decode(self, resp_data):
+        resp = Response()
+        try:
+            resp.decode(resp_data, self.dictionaries)
+        except MissingDictionary as e:
+            self.load_dictionary(e.dict_id)
+            resp.decode(resp_data, self.dictionaries)
+        return resp
 
     def declare(self, channel):
         """Decalre queue asynchronously with the given rabbitmq channel."""
@@ -228,8 +789,8 @@ class ResponseQueue(object):
         client = get_client(self.ssdb_clients, resp_key)
         if not client:
             raise ResponseError('ssdb_client can not be none')
-        r = redis.Redis(connection_pool=client['connection_pool'])
-        r.set(resp_key, resp.to_json())
+        client["client"].set(resp_key, resp.encode(
+            self.compression, self.compress_html_only, self.dictionary))
 
     def get(self, resp_key):
         """Get `Response` from ssdb indexed by the `resp_key`.
@@ -238,16 +799,127 @@ class ResponseQueue(object):
         :returns: tuple, `(response, code)`. 
             `response` is `Response` object.
             `code`, 0 means OK, 1 means ssdb empty.
+
+        `GET` and `DEL` are sent in one write with a pipeline, one round-trip
+        for every response. Each response key is consumed by one worker, so
+        no other client deletes the key between them.
         """
-        resp = Response()
-        client = get_client(self.ssdb_clients, resp_key)
-        r = redis.Redis(connection_pool=client["connection_pool"])
-        resp_data = r.get(resp_key)
-        r.delete(resp_key)
+        if resp_key in self._preloaded:
+            resp_data = self._preloaded.pop(resp_key)
+        else:
+            resp_data = self.get_data(resp_key)
         if not resp_data:
             return None, 1
-        resp.from_json(resp_data)
-        return resp, 0
+        return self._decode(resp_data), 0
+
+    def preload(self, resp_key, resp_data):
+        """Keep response string fetched by `get_many_data`, the next `get` of
+        `resp_key` returns it without ssdb request.
+
+        :param resp_key: string.
+        :param resp_data: string, or None if ssdb empty.
+
+        """
+        self._preloaded[resp_key] = resp_data
+
+    def get_data(self, resp_key):
+        """Get and delete `Response` string from ssdb without decoding it, see `get`.
+
+        :param resp_key: string.
+        :returns: string, None if ssdb empty, decode it with `Response.decode`.
+
+        """
+        client = get_client(self.ssdb_clients, resp_key)
+        r = client["client"]
+        if self.use_getdel:
+            resp_data = r.execute_command("GETDEL", resp_key)
+        else:
+            pipe = r.pipeline(transaction=False)
+            pipe.get(resp_key)
+            pipe.delete(resp_key)
+            resp_data, _ = pipe.execute()
+        return resp_data or None
+
+    def restore_data(self, resp_key, resp_data):
+        """Put back response string got by `get_data` or `get_many_data`, when
+        the rabbitmq message is not processed and will be redelivered.
+        """
+        if resp_data is not None:
+            get_client(self.ssdb_clients, resp_key)["client"].set(resp_key, resp_data)
+
+    def get_many(self, resp_keys):
+        """Get multiple `Response` from ssdb and delete them.
+
+        :param resp_keys: list of string.
+        :returns: list, `Response` object or None if ssdb empty, in the same order as `resp_keys`.
+
+        Keys are grouped by ssdb node. With one node, `MGET` and a multiple
+        keys `DEL` are sent in one write. With several nodes, `MGET` runs on
+        all nodes in parallel first, then `DEL`, see `get_many_data`.
+        """
+        responses = []
+        for resp_data in self.get_many_data(resp_keys):
+            if resp_data is None:
+                responses.append(None)
+                continue
+            responses.append(self._decode(resp_data))
+        return responses
+
+    def get_many_data(self, resp_keys):
+        """Get and delete multiple `Response` strings without decoding them, see `get_many`.
+
+        :param resp_keys: list of string.
+        :returns: list, string or None if ssdb empty, in the same order as `resp_keys`.
+
+        With several ssdb nodes, keys are deleted only after `MGET` succeeds on
+        every node, and put back if `DEL` fails on any node, so on errors all
+        responses stay in ssdb for the redelivered messages.
+        """
+        if not resp_keys:
+            return []
+        groups = {}
+        for i, resp_key in enumerate(resp_keys):
+            client = get_client(self.ssdb_clients, resp_key)
+            groups.setdefault(client["tag"], (client, []))[1].append(i)
+        values = [None] * len(resp_keys)
+        if len(groups) == 1:
+            client = groups.values()[0][0]
+            pipe = client["client"].pipeline(transaction=False)
+            pipe.mget(resp_keys)
+            pipe.delete(*resp_keys)
+            resp_data, _ = pipe.execute()
+            return [d or None for d in resp_data]
+
+        groups = [(client, [resp_keys[i] for i in indexes], indexes)
+                  for client, indexes in groups.values()]
+        results = self._map_nodes(lambda group: group[0]["client"].mget(group[1]), groups)
+        for ok, result in results:
+            if not ok:
+                raise result
+        for (client, keys, indexes), (_, resp_data) in zip(groups, results):
+            for i, data in zip(indexes, resp_data):
+                values[i] = data
+
+        results = self._map_nodes(lambda group: group[0]["client"].delete(*group[1]), groups)
+        if not all(ok for ok, _ in results):
+            for (client, keys, indexes), (ok, _) in zip(groups, results):
+                if not ok:
+                    continue
+                data = dict([(resp_keys[i], values[i]) for i in indexes if values[i] is not None])
+                if data:
+                    client["client"].mset(data)
+            raise [result for ok, result in results if not ok][0]
+        return [resp_data or None for resp_data in values]
+
+    def _map_nodes(self, func, groups):
+        """Run `func` on every group in `node_pool`, returns list of
+        `(ok, result or exception)` in the same order."""
+        def _run(group):
+            try:
+                return True, func(group)
+            except Exception as e:
+                return False, e
+        return node_pool.map(_run, groups)
 
     def push(self, resp_key, channel):
         """Push response key to queue to rabbitmq server.
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import Queue
+
+
+class EventRuntime(object):
+
+    """Run all in-flight messages of a worker process on one rabbitmq ioloop.
+
+    The worker has one rabbitmq connection, one set of ssdb, bloomd and plugin
+    clients, and up to `concurrency` unacknowledged messages, rabbitmq stops
+    delivering more until some are acknowledged. Response keys are collected on
+    the ioloop and fetched from ssdb in batches by `fetch_threads` threads with
+    `ResponseQueue.get_many_data`, then every message is dispatched on the ioloop:
+
+        * to `ParsePool` if `parse_processes` is set, see `BaseWorker.parse`.
+        * to `batch_callback` if `response_batch_size` is more than 1.
+        * to `callback` otherwise, `resp_q.get` returns the fetched response
+          without ssdb request, so existing callbacks keep working.
+
+    """
+
+    def __init__(self, worker, concurrency=1000, fetch_threads=4,
+                 fetch_batch_size=100, fetch_delay=0.005):
+        """
+        :param worker: `BaseWorker` object.
+        :param concurrency: optional int, max unacknowledged messages of the worker.
+        :param fetch_threads: optional int, threads fetching responses from ssdb.
+        :param fetch_batch_size: optional int, max response keys of one fetch.
+        :param fetch_delay: optional float, seconds to wait for a full fetch batch.
+
+        """
+        self.worker = worker
+        self.concurrency = concurrency
+        self.fetch_threads = fetch_threads
+        self.fetch_batch_size = fetch_batch_size
+        self.fetch_delay = fetch_delay
+        worker.prefetch_count = max(getattr(worker, "prefetch_count", 1), concurrency)
+        worker.runtime = self
+        self.received = 0
+        self.dispatched = 0
+        self._pending = []
+        self._timer = None
+        self._conn = None
+        self._fetching = 0
+        self._drain_conn = None
+        self._drain_timer = 0
+        self._fetch_q = Queue.Queue()
+        self._done_q = Queue.Queue()
+        self.threads = []
+
+    def start_fetchers(self):
+        """Start fetch threads, `run` calls it. Start `ParsePool` before it."""
+        while len(self.threads) < self.fetch_threads:
+            t = threading.Thread(target=self._fetch_loop)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def run(self):
+        """Run the worker ioloop in this thread."""
+        self.start_fetchers()
+        self.worker.run()
+
+    def stats(self):
+        """Get runtime stats.
+
+        :returns: dict, `received` and `dispatched` messages, messages `waiting`
+            for a fetch and fetch batches in progress.
+
+        """
+        return {
+            "received": self.received,
+            "dispatched": self.dispatched,
+            "waiting": len(self._pending),
+            "fetching": self._fetching,
+        }
+
+    def reset(self, conn):
+        """Called by `BaseWorker.init_resp_queue` with a new rabbitmq connection.
+
+        Timeouts of the old connection never run. Messages waiting for a fetch
+        are dropped, rabbitmq redelivers them. Batches being fetched are drained
+        on the new connection, their responses are put back to ssdb.
+        """
+        self._conn = conn
+        self._timer = None
+        self._pending = []
+        self._drain_conn = None
+        if self._fetching > 0:
+            self._arm_drain()
+
+    def on_message(self, channel, method, properties, body):
+        """Called on the ioloop for every rabbitmq message, see `BaseWorker._callback`."""
+        self.received += 1
+        self._conn = channel.connection
+        self._pending.append((self.worker._batch_id, channel, method, properties, body))
+        if len(self._pending) >= self.fetch_batch_size:
+            self._submit()
+        elif self._timer is None:
+            conn = self._conn
+            self._timer = conn.add_timeout(self.fetch_delay, lambda: self._on_timer(conn))
+
+    def _on_timer(self, conn):
+        if conn is not self._conn:
+            # timeout of an old connection
+            return
+        self._timer = None
+        self._submit()
+
+    def _submit(self):
+        if self._timer is not None:
+            self._conn.remove_timeout(self._timer)
+            self._timer = None
+        batch = self._pending
+        self._pending = []
+        if not batch:
+            return
+        self._fetch_q.put((self.worker.resp_q, batch))
+        self._fetching += 1
+        self._arm_drain()
+
+    def _arm_drain(self):
+        """Schedule `_drain` on the current connection if it is not yet."""
+        if self._drain_conn is self._conn:
+            return
+        self._drain_conn = self._conn
+        self._drain_timer += 1
+        timer = self._drain_timer
+        self._conn.add_timeout(self.fetch_delay, lambda: self._drain(timer))
+
+    def _fetch_loop(self):
+        while True:
+            resp_q, batch = self._fetch_q.get()
+            try:
+                values = resp_q.get_many_data([body for _, _, _, _, body in batch])
+                self._done_q.put((resp_q, batch, values, None))
+            except Exception as e:
+                self._done_q.put((resp_q, batch, None, e))
+
+    def _drain(self, timer=None):
+        """Dispatch fetched batches on the ioloop, pika is not thread-safe."""
+        if timer is not None and timer != self._drain_timer:
+            # timeout of an old connection
+            return
+        self._drain_conn = None
+        while True:
+            try:
+                resp_q, batch, values, error = self._done_q.get_nowait()
+            except Queue.Empty:
+                break
+            self._fetching -= 1
+            try:
+                self._dispatch(resp_q, batch, values, error)
+            except Exception as e:
+                logging.error("runtime dispatch catch exception: %s" % str(e))
+        if self._fetching > 0:
+            self._arm_drain()
+
+    def _dispatch(self, resp_q, batch, values, error):
+        worker = self.worker
+        if error is not None:
+            logging.error("fetch responses fail: %s" % str(error))
+            if batch[0][0] == worker._batch_id:
+                worker._close_channel(batch[0][1])
+            return
+        current = []
+        for message, resp_data in zip(batch, values):
+            # unacked messages of a closed channel are redelivered, keep their responses
+            if message[0] != worker._batch_id:
+                resp_q.restore_data(message[4], resp_data)
+            else:
+                current.append((message, resp_data))
+        self.dispatched += len(current)
+        if not current:
+            return
+        channel = current[0][0][1]
+        if worker.parse_pool is not None:
+            for (_, _, method, _, body), resp_data in current:
+                worker._pool_submit(channel, method, body, resp_data)
+            return
+        if getattr(worker, "response_batch_size", 1) > 1:
+            deliveries = [(method, properties, body) for (_, _, method, properties, body), _ in current]
+            responses = [resp_q._decode(d) if d is not None else None for _, d in current]
+            try:
+                worker.batch_callback(channel, deliveries, responses)
+            except Exception as e:
+                logging.error("batch_callback catch exception: %s" % str(e))
+                worker._close_channel(channel)
+            return
+        for i, ((_, _, method, properties, body), resp_data) in enumerate(current):
+            resp_q.preload(body, resp_data)
+            try:
+                worker.callback(channel, method, properties, body)
+            except Exception as e:
+                logging.error("callback catch exception: %s" % str(e))
+                worker._close_channel(channel)
+                for (_, _, _, _, rest_body), rest_data in current[i + 1:]:
+                    resp_q.restore_data(rest_body, rest_data)
+                return
+            finally:
+                resp_q._preloaded.pop(body, None)
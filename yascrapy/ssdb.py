@@ -1,7 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*
+import os
+import json
 import redis
 import hash_ring
+import threading
+from collections import OrderedDict
 
 
 def get_proxy_client(max_connections=100, cfg=None):
@@ -9,7 +13,8 @@ def get_proxy_client(max_connections=100, cfg=None):
 
     :param max_connections: optional int, connection pool size.
     :param cfg: `Config` object, get it from `yascrapy.config` module. 
-    :returns: dict, contain `node`, `connection_pool` and `tag`. 
+    :returns: dict, contain `node`, `connection_pool`, `client` and `tag`.
+        `client` is `redis.Redis` object on the connection pool, reuse it.
 
     """
     if cfg is None:
@@ -23,17 +28,74 @@ def get_proxy_client(max_connections=100, cfg=None):
     return {
         "node": node,
         "connection_pool": conn_pool,
+        "client": redis.Redis(connection_pool=conn_pool),
         "tag": "%s:%s" % (node["Host"], node["Port"])
     }
 
 
-def get_clients(max_connections=100, nodes=[]):
+class SSDBRing(object):
+
+    """Hash ring with a precomputed tag to ssdb client map.
+
+    `get_node` keeps the `hash_ring.HashRing` interface, `get_client` returns the
+    ssdb client dict directly. With one ssdb node no hash is computed.
+
+    """
+
+    def __init__(self, ssdb_nodes, memo_size=0):
+        """Build hash ring of ssdb nodes.
+
+        :param ssdb_nodes: list, ssdb clients built by `get_clients`.
+        :param memo_size: optional int, remember the client of this many recently
+            used keys, 0 means no memo. Use it when the same keys are looked up repeatedly.
+
+        """
+        # Init hash_ring is expensive operation, need reused.
+        self.ring = hash_ring.HashRing([node["tag"] for node in ssdb_nodes])
+        self.clients = dict([(node["tag"], node) for node in ssdb_nodes])
+        self.single = ssdb_nodes[0] if len(ssdb_nodes) == 1 else None
+        self.memo_size = memo_size
+        self.memo = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_node(self, key):
+        """Get ssdb node tag by key."""
+        return self.ring.get_node(key)
+
+    def get_client(self, key):
+        """Get ssdb client by key.
+
+        :param key: string.
+        :returns: ssdb client, None if no ssdb node.
+
+        """
+        if self.single is not None:
+            return self.single
+        if not self.memo_size:
+            return self.clients.get(self.ring.get_node(key))
+        with self.lock:
+            client = self.memo.pop(key, None)
+            if client is not None:
+                self.memo[key] = client
+                return client
+        client = self.clients.get(self.ring.get_node(key))
+        if client is not None:
+            with self.lock:
+                self.memo[key] = client
+                if len(self.memo) > self.memo_size:
+                    self.memo.popitem(last=False)
+        return client
+
+
+def get_clients(max_connections=100, nodes=[], memo_size=0):
     """get multiple ssdb clients.
 
     :param max_connections: optional int, connection pool size.
+    :param memo_size: optional int, ring lookup memo size, see `SSDBRing`.
     :returns: touple, `(clients, ring)`. `clients` is list of ssdb client, 
-        each ssdb client is dict contains connection_pool and node info. 
-        `ring` is hash ring object.
+        each ssdb client is dict contains connection_pool, node info and
+        `client`, the `redis.Redis` object shared by all operations on this node.
+        `ring` is `SSDBRing` object.
 
     """
     ssdb_nodes = []
@@ -43,11 +105,10 @@ def get_clients(max_connections=100, nodes=[]):
         ssdb_nodes.append({
             "node": node,
             "connection_pool": conn_pool,
+            "client": redis.Redis(connection_pool=conn_pool),
             "tag": "%s:%s" % (node["Host"], node["Port"])
         })
-    servers = [node["tag"] for node in ssdb_nodes]
-    # Init hash_ring is expensive operation, need reused.
-    ring = hash_ring.HashRing(servers)
+    ring = SSDBRing(ssdb_nodes, memo_size=memo_size)
     return ssdb_nodes, ring
 
 
@@ -60,10 +121,91 @@ def get_client(clients, key):
 
     """
     ssdb_nodes, ring = clients
-    found_server = ring.get_node(key)
-    if found_server is None:
-        return None
-    for ssdb_node in ssdb_nodes:
-        if ssdb_node["tag"] == found_server:
-            return ssdb_node
-    return None
+    return ring.get_client(key)
+
+
+class KeyScanner(object):
+
+    """Iterate keys of one ssdb node in `(start, end]` page by page.
+
+    Every page is one `keys cursor end page_size` command continuing after
+    the last key seen, so keys need not be deleted to make progress and
+    memory is one page. The cursor moves past a page when the next page is
+    requested, and is saved to the `checkpoint` file then, a new scanner
+    with the same file continues after the last page handled.
+
+    :Example usage::
+
+        r = redis.Redis(host="127.0.0.1", port=8888)
+        scanner = KeyScanner(r, "http_response:test:", "http_response:test:z",
+                             checkpoint="/tmp/test_scan.json")
+        for keys in scanner.pages():
+            print len(keys)
+
+    """
+
+    def __init__(self, client, start, end, page_size=1000, cursor=None, checkpoint=None):
+        """
+        :param client: `redis.Redis` client of one ssdb node.
+        :param start: string, keys after it are scanned, it is not included.
+        :param end: string, last key of the range, included.
+        :param page_size: optional int, max keys of one page.
+        :param cursor: optional string, continue after this key instead of `start`.
+        :param checkpoint: optional string, file to load and save the cursor,
+            it is used only if it has the same `start` and `end`.
+
+        """
+        self.client = client
+        self.start = start
+        self.end = end
+        self.page_size = page_size
+        self.checkpoint = checkpoint
+        self.cursor = start
+        self.done = False
+        if cursor is not None:
+            self.cursor = cursor
+        elif checkpoint is not None:
+            self.load()
+
+    def load(self):
+        """Load cursor from `checkpoint` file if it exists."""
+        if not os.path.exists(self.checkpoint):
+            return
+        with open(self.checkpoint) as f:
+            d = json.loads(f.read())
+        if d["start"] == self.start and d["end"] == self.end:
+            self.cursor = d["cursor"]
+            self.done = d.get("done", False)
+
+    def save(self):
+        """Save cursor to `checkpoint` file, nothing is done if it is not set."""
+        if self.checkpoint is None:
+            return
+        tmp = "%s.tmp" % self.checkpoint
+        with open(tmp, "w") as f:
+            f.write(json.dumps({
+                "start": self.start, "end": self.end,
+                "cursor": self.cursor, "done": self.done
+            }))
+        os.rename(tmp, self.checkpoint)
+
+    def reset(self):
+        """Scan from `start` again, such as for keys added after a finished scan."""
+        self.cursor = self.start
+        self.done = False
+        self.save()
+
+    def pages(self):
+        """Generate lists of keys until the end of the range."""
+        while not self.done:
+            keys = self.client.execute_command("keys", self.cursor, self.end, self.page_size)
+            if keys:
+                yield keys
+                self.cursor = keys[-1]
+            self.done = len(keys) < self.page_size
+            self.save()
+
+    def __iter__(self):
+        for keys in self.pages():
+            for k in keys:
+                yield k
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""Fake ssdb and rabbitmq objects shared by the tests."""
+import Queue
+import threading
+from pika import spec
+from yascrapy.libs.pybloomd import BloomdFuture
+from yascrapy.base import BaseWorker
+from yascrapy.ssdb import get_clients
+
+
+class FakeRedis(object):
+
+    """`redis.Redis` of one ssdb node on a dict, commands in `fail` raise IOError."""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = 0
+        self.fail = set()
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def set(self, k, v):
+        self.data[k] = v
+
+    def get(self, k):
+        return self.data.get(k)
+
+    def mget(self, keys):
+        self._command("mget")
+        return [self.data.get(k) for k in keys]
+
+    def delete(self, *keys):
+        self._command("delete")
+        return len([self.data.pop(k) for k in keys if k in self.data])
+
+    def mset(self, d):
+        self.data.update(d)
+
+    def execute_command(self, name, *args):
+        if name == "GETDEL":
+            self._command("getdel")
+            return self.data.pop(args[0], None)
+        raise NotImplementedError(name)
+
+    def _command(self, name):
+        self.commands += 1
+        if name in self.fail:
+            raise IOError("%s fail" % name)
+
+
+class FakePipeline(object):
+
+    """Pipeline of a `FakeRedis`, one write per `execute`, commands before a
+    failed one are applied."""
+
+    def __init__(self, r):
+        self.r = r
+        self.cmds = []
+
+    def get(self, k):
+        self.cmds.append(("get", lambda: self.r.data.get(k)))
+
+    def mget(self, keys):
+        self.cmds.append(("mget", lambda: [self.r.data.get(k) for k in keys]))
+
+    def delete(self, *keys):
+        self.cmds.append(("delete", lambda: len([self.r.data.pop(k) for k in keys if k in self.r.data])))
+
+    def execute(self):
+        self.r.commands += 1
+        results = []
+        for name, cmd in self.cmds:
+            if name in self.r.fail:
+                raise IOError("%s fail" % name)
+            results.append(cmd())
+        return results
+
+
+class FakeSSDB(object):
+
+    """ssdb node on a dict for key scans and batch reads, thread safe."""
+
+    def __init__(self, data):
+        self.data = dict(data)
+        self.lock = threading.Lock()
+        self.commands = []
+        self.deleted = []
+
+    def execute_command(self, cmd, start, end, limit):
+        with self.lock:
+            self.commands.append((cmd, start, end, limit))
+            keys = sorted(k for k in self.data if start < k <= end)
+        return keys[:limit]
+
+    def mget(self, keys):
+        with self.lock:
+            return [self.data.get(k) for k in keys]
+
+    def delete(self, *keys):
+        with self.lock:
+            for k in keys:
+                self.data.pop(k, None)
+            self.deleted.extend(keys)
+
+
+class FakeBloomdFilter(object):
+
+    """bloomd filter on a set, `checks` counts checked keys."""
+
+    def __init__(self):
+        self.keys = set()
+        self.checks = 0
+        self.pipelines = []
+
+    def add(self, key):
+        self.keys.add(key)
+
+    def bulk(self, keys):
+        self.keys.update(keys)
+
+    def __contains__(self, key):
+        self.checks += 1
+        return key in self.keys
+
+    def multi(self, keys):
+        self.checks += len(keys)
+        return [k in self.keys for k in keys]
+
+    def auto_pipeline(self, max_commands=100, max_delay=0.005):
+        pipeline = FakeBloomdPipeline(self)
+        self.pipelines.append(pipeline)
+        return pipeline
+
+
+class FakeBloomdPipeline(object):
+
+    """`BloomdAutoPipeline` of a `FakeBloomdFilter`, futures are resolved by `flush`."""
+
+    def __init__(self, bloomd_filter):
+        self.filter = bloomd_filter
+        self.buf = []
+        self.flushes = 0
+        self.closed = False
+
+    def add(self, key, callback=None):
+        return self._append(lambda: self.filter.keys.add(key) or True, callback)
+
+    def check(self, key, callback=None):
+        return self._append(lambda: key in self.filter, callback)
+
+    def _append(self, cmd, callback):
+        future = BloomdFuture()
+        if callback is not None:
+            future.add_done_callback(callback)
+        self.buf.append((cmd, future))
+        return future
+
+    def flush(self):
+        buf = self.buf
+        self.buf = []
+        if buf:
+            self.flushes += 1
+        for cmd, future in buf:
+            future.set_result(cmd())
+
+    def close(self):
+        self.flush()
+        self.closed = True
+
+
+class FakeBloomdClient(object):
+
+    def __init__(self):
+        self.filter = FakeBloomdFilter()
+
+    def create_filter(self, name, capacity=None, prob=None):
+        return self.filter
+
+
+class FakeConnection(object):
+
+    """pika `SelectConnection`, timeouts run only with `run_timeouts`."""
+
+    def __init__(self):
+        self.timeouts = {}
+        self.next_id = 0
+
+    def add_timeout(self, deadline, callback):
+        self.next_id += 1
+        self.timeouts[self.next_id] = callback
+        return self.next_id
+
+    def remove_timeout(self, timeout_id):
+        self.timeouts.pop(timeout_id, None)
+
+    def run_timeouts(self):
+        timeouts = self.timeouts
+        self.timeouts = {}
+        for callback in timeouts.values():
+            callback()
+
+    def channel(self, on_open_callback=None):
+        pass
+
+
+class FakeChannel(object):
+
+    """pika `Channel` of a `FakeConnection`, `acks` keeps `(delivery_tag, multiple)`."""
+
+    def __init__(self, connection=None):
+        self.connection = connection or FakeConnection()
+        self.acked = []
+        self.acks = []
+        self.closed = False
+        self.prefetch_count = None
+        self._state = 2  # pika `Channel.OPEN`, logged by `AsyncConsumer`
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acked.append(delivery_tag)
+        self.acks.append((delivery_tag, multiple))
+
+    def basic_qos(self, prefetch_count=0):
+        self.prefetch_count = prefetch_count
+
+    def basic_consume(self, consumer_callback, queue):
+        return "ctag"
+
+    def add_on_cancel_callback(self, callback):
+        pass
+
+    def add_on_close_callback(self, callback):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeMethod(object):
+
+    NAME = "Basic.Deliver"
+
+    def __init__(self, delivery_tag):
+        self.delivery_tag = delivery_tag
+
+
+class FakeWorker(BaseWorker):
+
+    """`BaseWorker` without settings and clients, subclass it in tests."""
+
+    def __init__(self):
+        self.parse_pool = None
+        self.runtime = None
+        self._parsed = Queue.Queue()
+        self._parse_pending = 0
+        self._parse_conn = None
+        self._parse_timer = 0
+        self._batch = []
+        self._batch_id = 0
+        self.crawler_name = "test_crawler"
+        self.response_queue_count = 1
+        self.ssdb_clients = get_clients(nodes=[{"Host": "127.0.0.1", "Port": 8888}])
+        self.publish_channel = None
+
+
+class FakeFrame(object):
+
+    def __init__(self, method):
+        self.method = method
+
+
+class FakeImplChannel(object):
+
+    """pika `Channel` under a `BlockingChannel`, bodies in `nack_bodies` are nacked once."""
+
+    def __init__(self):
+        self.published = []
+        self.routing_keys = []
+        self.unconfirmed = []
+        self.callback = None
+        self.nack_bodies = set()
+
+    def confirm_delivery(self, callback=None, nowait=False):
+        self.callback = callback
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append(body)
+        self.routing_keys.append(routing_key)
+        self.unconfirmed.append((len(self.published), body))
+
+    def confirm(self):
+        unconfirmed = self.unconfirmed
+        self.unconfirmed = []
+        for tag, body in unconfirmed:
+            if body in self.nack_bodies:
+                self.nack_bodies.remove(body)
+                self.callback(FakeFrame(spec.Basic.Nack(delivery_tag=tag)))
+        if unconfirmed:
+            self.callback(FakeFrame(spec.Basic.Ack(delivery_tag=unconfirmed[-1][0], multiple=True)))
+
+
+class FakeBlockingChannel(object):
+
+    def __init__(self):
+        self._impl = FakeImplChannel()
+        self.flushes = 0
+
+    def _flush_output(self, *waiters):
+        self.flushes += 1
+        # confirms come back only when the publisher waits for them
+        if waiters:
+            self._impl.confirm()
+            self._impl.confirm()
+
+    def close(self):
+        pass
+
+
+class FakeBlockingConnection(object):
+
+    """pika `BlockingConnection`, keeps every channel it opened."""
+
+    def __init__(self):
+        self.channels = []
+
+    def channel(self):
+        ch = FakeBlockingChannel()
+        self.channels.append(ch)
+        return ch
+
+    def close(self):
+        pass
@@ -62,5 +62,10 @@ class TestQueues(unittest.TestCase):
         self.req_q.push(self.req, self.publish_channel)
         self.req_q.safe_push(self.req, self.publish_channel)
 
+    def test_request_queue_safe_push_many(self):
+        self.req_q.safe_push(self.req, self.publish_channel)
+        pushed = self.req_q.safe_push_many([self.req, self.req], self.publish_channel)
+        self.assertEqual(pushed, [])
+
 if __name__ == '__main__':
     unittest.main()
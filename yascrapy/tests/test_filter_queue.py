@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+from yascrapy.filter_queue import FilterQueue
+from yascrapy.libs.bloomfilter import BloomFilter
+from yascrapy.resources import Resources
+from yascrapy.tests.fakes import FakeBloomdClient
+
+
+class TestFilterQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.bloomd_client = FakeBloomdClient()
+        self.urls = ["http://stackoverflow.com/users?page=%d" % i for i in range(100)]
+
+    def test_bloomfilter(self):
+        f = BloomFilter(1000, 1e-3)
+        for url in self.urls:
+            self.assertTrue(f.add(url))
+        for url in self.urls:
+            self.assertTrue(url in f)
+        self.assertEqual(len(f), len(self.urls))
+        self.assertFalse("http://github.com" in f)
+        self.assertTrue(u"http://github.com/中文" not in f)
+        f.clear()
+        self.assertFalse(self.urls[0] in f)
+
+    def test_many(self):
+        q = FilterQueue(bloomd_client=self.bloomd_client, crawler_name="test")
+        self.assertEqual(q.is_member_many([]), [])
+        q.push_many(self.urls[:50])
+        res = q.is_member_many(self.urls)
+        self.assertEqual(res, [True] * 50 + [False] * 50)
+
+    def test_local_filter(self):
+        q = FilterQueue(bloomd_client=self.bloomd_client, crawler_name="test",
+                        local_capacity=1000, local_prob=1e-3)
+        q.push(self.urls[0])
+        self.assertTrue(q.is_member(self.urls[0]))
+        self.assertFalse(q.is_member(self.urls[1]))
+        self.assertEqual(self.bloomd_client.filter.checks, 1)
+
+        # urls set by other processes are found on bloomd and cached locally.
+        self.bloomd_client.filter.add(self.urls[2])
+        self.assertTrue(q.is_member(self.urls[2]))
+        self.assertTrue(q.is_member(self.urls[2]))
+        self.assertEqual(self.bloomd_client.filter.checks, 2)
+
+        q.push_many(self.urls[10:20])
+        self.assertEqual(q.is_member_many(self.urls[10:20]), [True] * 10)
+        stats = q.stats()
+        self.assertEqual(stats["local_hits"], 12)
+        self.assertEqual(stats["local_misses"], 2)
+
+    def test_pipeline_fork(self):
+        q = FilterQueue(bloomd_client=self.bloomd_client, crawler_name="test", pipeline_size=10)
+        self.assertEqual(self.bloomd_client.filter.pipelines, [])
+        future = q.push_async(self.urls[0])
+        q.flush()
+        self.assertTrue(future.result())
+        # a forked child creates its own pipeline
+        q._pipeline_pid = -1
+        q.push_async(self.urls[1])
+        q.close()
+        self.assertEqual(len(self.bloomd_client.filter.pipelines), 2)
+        self.assertTrue(self.bloomd_client.filter.pipelines[1].closed)
+        self.assertFalse(self.bloomd_client.filter.pipelines[0].closed)
+
+    def test_shared_local_filter(self):
+        resources = Resources()
+        local_filter = resources.local_filter("test", 1000, 1e-3)
+        self.assertTrue(resources.local_filter("test", 1000, 1e-3) is local_filter)
+        queues = [FilterQueue(bloomd_client=self.bloomd_client, crawler_name="test",
+                              local_filter=local_filter) for i in range(2)]
+        queues[0].push(self.urls[0])
+        # urls added by other threads of the process are found locally
+        self.assertTrue(queues[1].is_member(self.urls[0]))
+        self.assertEqual(self.bloomd_client.filter.checks, 0)
+
+    def test_bloomfilter_threads(self):
+        f = BloomFilter(10000, 1e-3)
+        urls = ["http://stackoverflow.com/users?page=%d" % i for i in range(4000)]
+
+        def _add(i):
+            f.bulk(urls[i::4])
+        threads = [threading.Thread(target=_add, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(f.multi(urls), [True] * len(urls))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import unittest
+from yascrapy.response_queue import Response
+from yascrapy.items import Field
+from yascrapy.items import ItemPlan
+from yascrapy.items import ItemError
+from yascrapy.utils import init_resp_data
+
+
+class UserItem(dict):
+    uid = None
+    name = Field(xpath='//h2[@class="user-card-name"]/text()[1]')
+    title = Field(css="title")
+    badges = Field(css=".badgecount", processors=[int], many=True)
+    avatar = Field(css="#avatar-card img", value="@src")
+    missing = Field(css=".missing", default="")
+
+
+class BadgeItem(dict):
+    title = Field(xpath="@title")
+    count = Field(css=".badgecount", processors=[int])
+
+
+class TestItems(unittest.TestCase):
+
+    def setUp(self):
+        html_file = os.path.join(os.path.dirname(__file__), "test.html")
+        resp_d = init_resp_data("test_crawler")
+        with open(html_file, "r") as f:
+            resp_d["html"] = f.read()
+        self.resp = Response()
+        self.resp.from_json(json.dumps(resp_d))
+
+    def test_item(self):
+        item = ItemPlan.from_item(UserItem).extract(self.resp)
+        self.assertTrue(isinstance(item, UserItem))
+        self.assertEqual(item["name"], self.resp.xpath('//h2[@class="user-card-name"]/text()[1]').extract()[0].strip())
+        self.assertEqual(item["title"], "User Gordon Linoff - Stack Overflow")
+        self.assertEqual(item["badges"], [int(v) for v in self.resp.css(".badgecount").extract()])
+        self.assertEqual(item["missing"], "")
+        self.assertTrue("uid" not in item)
+        self.assertEqual(type(item["title"]), str)
+
+    def test_scope(self):
+        items = ItemPlan.from_item(BadgeItem, scope='//span[contains(@class, "-alternate")]').extract(self.resp)
+        self.assertEqual(items[0], {"title": "20 gold badges", "count": 20})
+        self.assertEqual([item["count"] for item in items], [20, 98, 151])
+
+    def test_error(self):
+        self.assertRaises(ItemError, Field)
+        self.assertRaises(ItemError, Field, css="a", value="href")
+        self.assertRaises(ItemError, ItemPlan.from_item, dict)
+
+if __name__ == "__main__":
+    unittest.main()
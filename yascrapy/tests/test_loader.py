@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+from yascrapy.loader import CacheLoader
+from yascrapy.request_queue import RequestQueue
+from yascrapy.request_queue import LiteRequest
+from yascrapy.rabbitmq import QueueMonitor
+from yascrapy.tests.fakes import FakeSSDB
+from yascrapy.tests.fakes import FakeBlockingConnection
+
+
+class TestCacheLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.crawler_name = "test_crawler"
+        data = {}
+        for i in range(25):
+            r = LiteRequest(url="http://example.com/%d" % i, crawler_name=self.crawler_name)
+            data["http_request:%s:http://example.com/%d" % (self.crawler_name, i)] = r.encode()
+        data["http_request:%s:bad" % self.crawler_name] = "not a request"
+        data["http_request:other:http://example.com/"] = "other crawler"
+        self.ssdb = FakeSSDB(data)
+        filter_q = type("FilterQueue", (object,), {})()
+        self.req_qs = [RequestQueue(self.crawler_name, ssdb_clients=[], filter_q=filter_q,
+                                    queue_name="http_request:%s:%d" % (self.crawler_name, i))
+                       for i in range(3)]
+        self.conns = []
+
+    def conn_factory(self):
+        conn = FakeBlockingConnection()
+        self.conns.append(conn)
+        return conn
+
+    def published(self):
+        bodies = []
+        for conn in self.conns:
+            for ch in conn.channels:
+                bodies.extend(ch._impl.published)
+        return bodies
+
+    def test_load(self):
+        loader = CacheLoader(self.ssdb, self.req_qs, self.conn_factory, batch_size=4,
+                             queue_size=1, publish_threads=2)
+        loader.start(once=True)
+        self.assertTrue(loader.join(10))
+        self.assertEqual(len(self.published()), 25)
+        self.assertEqual(len(self.ssdb.deleted), 25)
+        # bad value and other crawler keys are left in ssdb
+        self.assertEqual(sorted(self.ssdb.data), ["http_request:other:http://example.com/",
+                                                  "http_request:test_crawler:bad"])
+        result = loader.throughput()
+        self.assertEqual(result["scan"]["items"], 26)
+        self.assertEqual(result["decode"]["items"], 26)
+        self.assertEqual(result["publish"]["items"], 25)
+        self.assertEqual(result["delete"]["items"], 25)
+        self.assertEqual(len(loader.inflight), 0)
+        self.assertEqual(loader.skipped, set(["http_request:test_crawler:bad"]))
+        self.assertTrue(loader.report().startswith("scan: 26"))
+        self.assertTrue(loader.report().endswith("skipped: 1"))
+
+    def test_skip_undecodable(self):
+        loader = CacheLoader(self.ssdb, self.req_qs, self.conn_factory, batch_size=10,
+                             idle_delay=0.01)
+        loader.start()
+        time.sleep(0.2)
+        loader.stop()
+        self.assertTrue(loader.join(10))
+        # the bad key is decoded once, the next passes leave it out
+        self.assertEqual(loader.throughput()["decode"]["items"], 26)
+        self.assertEqual(self.ssdb.data["http_request:test_crawler:bad"], "not a request")
+        self.assertEqual(len(self.published()), 25)
+
+    def test_monitor(self):
+        full = "http_request:%s:0" % self.crawler_name
+        depths = {}
+        for req_q in self.req_qs:
+            depths[req_q.queue_name] = 0
+        depths[full] = 100
+        monitor = QueueMonitor({}, sorted(depths))
+        monitor._depths = depths
+        loader = CacheLoader(self.ssdb, self.req_qs, self.conn_factory, batch_size=10,
+                             monitor=monitor, queue_max=100)
+        loader.start(once=True)
+        self.assertTrue(loader.join(10))
+        self.assertEqual(len(self.published()), 25)
+        routing_keys = set()
+        for conn in self.conns:
+            for ch in conn.channels:
+                routing_keys.update(ch._impl.routing_keys)
+        self.assertFalse(full in routing_keys)
+
+    def test_publish_fail_keeps_keys(self):
+        def conn_factory():
+            raise Exception("connection refused")
+        loader = CacheLoader(self.ssdb, self.req_qs, conn_factory, batch_size=10)
+        loader.start(once=True)
+        self.assertTrue(loader.join(10))
+        self.assertEqual(self.ssdb.deleted, [])
+        self.assertEqual(len(self.ssdb.data), 27)
+        self.assertEqual(len(loader.inflight), 0)
+
+if __name__ == "__main__":
+    unittest.main()
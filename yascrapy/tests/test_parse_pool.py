@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import Queue
+import unittest
+from yascrapy.parse_pool import ParsePool
+from yascrapy.request_queue import LiteRequest
+from yascrapy.ssdb import get_clients
+from yascrapy.utils import init_resp_data
+from yascrapy.tests.fakes import FakeChannel
+from yascrapy.tests.fakes import FakeMethod
+from yascrapy.tests.fakes import FakeWorker
+
+
+def parse(response):
+    if response.url == "error":
+        raise ValueError("parse error")
+    if response.url == "unpicklable":
+        return [{"processor": lambda v: v}]
+    item = {"title": response.xpath("//title/text()").extract()[0], "pid": os.getpid()}
+    return [item, LiteRequest(url=response.url + "?page=2", crawler_name="test_crawler")]
+
+
+class Worker(FakeWorker):
+
+    def __init__(self):
+        FakeWorker.__init__(self)
+        self.saved = []
+        self.pushed = []
+        self.resp_q = type("ResponseQueue", (object,), {"get_data": lambda q, k: k or None})()
+        self.req_q = type("RequestQueue", (object,), {
+            "safe_push_many": lambda q, requests, channel: self.pushed.extend(requests)})()
+        self.db_handler = type("Plugin", (object,), {"update": lambda p, items: self.saved.extend(items)})()
+
+
+class TestParsePool(unittest.TestCase):
+
+    def setUp(self):
+        worker = type("Worker", (object,), {})()
+        worker.crawler_name = "test_crawler"
+        worker.ssdb_clients = get_clients(nodes=[{"Host": "127.0.0.1", "Port": 8888}])
+        worker.parse = parse
+        self.pool = ParsePool(worker, 2)
+        html_file = os.path.join(os.path.dirname(__file__), "test.html")
+        self.resp_d = init_resp_data("test_crawler")
+        with open(html_file, "r") as f:
+            self.resp_d["html"] = f.read()
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_parse(self):
+        results = Queue.Queue()
+        for i in range(10):
+            self.resp_d["url"] = "http://stackoverflow.com/users/%d" % i
+            self.pool.submit(json.dumps(self.resp_d), lambda *res: results.put(res))
+        for url in ("error", "unpicklable"):
+            self.resp_d["url"] = url
+            self.pool.submit(json.dumps(self.resp_d), lambda *res: results.put(res))
+        urls = []
+        errors = []
+        for i in range(12):
+            items, requests, error = results.get(timeout=10)
+            if error is not None:
+                errors.append(error)
+                continue
+            self.assertEqual(items[0]["title"], "User Gordon Linoff - Stack Overflow")
+            self.assertNotEqual(items[0]["pid"], os.getpid())
+            self.assertTrue(isinstance(requests[0], LiteRequest))
+            urls.append(requests[0].url)
+        self.assertEqual(sorted(urls), sorted(["http://stackoverflow.com/users/%d?page=2" % i for i in range(10)]))
+        self.assertEqual(len(errors), 2)
+        self.assertTrue("parse error" in "".join(errors))
+        self.assertTrue("PicklingError" in "".join(errors))
+
+    def test_worker(self):
+        worker = Worker()
+        worker.parse_pool = self.pool
+        channel = FakeChannel()
+        self.resp_d["url"] = "http://stackoverflow.com/users/1"
+        worker._callback(channel, FakeMethod(1), None, json.dumps(self.resp_d))
+        worker._callback(channel, FakeMethod(2), None, "")
+        self.assertEqual(channel.acked, [2])
+        self.assertEqual(len(channel.connection.timeouts), 1)
+        while worker._parse_pending:
+            channel.connection.run_timeouts()
+        self.assertEqual(channel.acked, [2, 1])
+        self.assertEqual(worker.saved[0]["title"], "User Gordon Linoff - Stack Overflow")
+        self.assertEqual(worker.pushed[0].url, "http://stackoverflow.com/users/1?page=2")
+        self.resp_d["url"] = "error"
+        worker._callback(channel, FakeMethod(3), None, json.dumps(self.resp_d))
+        while worker._parse_pending:
+            channel.connection.run_timeouts()
+        self.assertTrue(channel.closed)
+        self.assertEqual(channel.acked, [2, 1])
+
+    def test_reconnect(self):
+        worker = Worker()
+        worker.parse_pool = self.pool
+        channel = FakeChannel()
+        self.resp_d["url"] = "http://stackoverflow.com/users/1"
+        for i in range(2):
+            worker._callback(channel, FakeMethod(i + 1), None, json.dumps(self.resp_d))
+        self.assertEqual(len(channel.connection.timeouts), 1)
+        # the connection is lost before its timeout runs, a new one is opened
+        new_channel = FakeChannel()
+        resp_q = worker.resp_q
+        worker.init_resp_queue(new_channel.connection)
+        worker.resp_q = resp_q
+        self.assertEqual(len(new_channel.connection.timeouts), 1)
+        worker._callback(new_channel, FakeMethod(1), None, json.dumps(self.resp_d))
+        self.assertEqual(len(new_channel.connection.timeouts), 1)
+        while worker._parse_pending:
+            new_channel.connection.run_timeouts()
+        # results of the old channel are dropped, its messages are redelivered
+        self.assertEqual(channel.acked, [])
+        self.assertEqual(new_channel.acked, [1])
+        self.assertEqual(len(worker.saved), 1)
+        channel.connection.run_timeouts()
+        self.assertEqual(new_channel.connection.timeouts, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import unittest
+import threading
+import SocketServer
+from yascrapy.libs.pybloomd import BloomdConnectionPool
+from yascrapy.libs.pybloomd import PooledBloomdClient
+from yascrapy.libs.pybloomd import BloomdClient
+from yascrapy.libs.pybloomd import BloomdError
+from yascrapy.bloomd import ShardedFilter
+
+
+class FakeBloomdHandler(SocketServer.StreamRequestHandler):
+
+    """Speak a subset of the bloomd text protocol, enough for client tests."""
+
+    def handle(self):
+        filters = self.server.filters
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            parts = line.strip().split(" ")
+            cmd, args = parts[0], parts[1:]
+            if cmd == "list":
+                out = ["START"] + ["%s 0.0001 1 1 0" % name for name in filters] + ["END"]
+            elif cmd == "create":
+                if args[0] in filters:
+                    out = ["Exists"]
+                else:
+                    filters[args[0]] = set()
+                    out = ["Done"]
+            elif cmd == "info":
+                out = ["START", "size %d" % len(filters[args[0]]), "END"]
+            elif cmd in ("s", "b"):
+                keys = filters[args[0]]
+                res = ["No" if k in keys else "Yes" for k in args[1:]]
+                keys.update(args[1:])
+                out = [" ".join(res)]
+            elif cmd in ("c", "m"):
+                keys = filters[args[0]]
+                out = [" ".join(["Yes" if k in keys else "No" for k in args[1:]])]
+            elif cmd == "flush":
+                out = ["Done"]
+            else:
+                out = ["Client Error: Command not supported"]
+            self.wfile.write("".join([l + "\n" for l in out]))
+            self.server.commands += 1
+
+
+class FakeBloomdServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        SocketServer.TCPServer.__init__(self, ("127.0.0.1", 0), FakeBloomdHandler)
+        self.filters = {}
+        self.commands = 0
+
+
+class TestPooledBloomdClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeBloomdServer()
+        t = threading.Thread(target=self.server.serve_forever)
+        t.daemon = True
+        t.start()
+        self.tag = "127.0.0.1:%d" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_pool_bounded(self):
+        pool = BloomdConnectionPool(self.tag, None, max_connections=2, wait_timeout=0.1)
+        c1 = pool.get_connection()
+        c2 = pool.get_connection()
+        self.assertRaises(BloomdError, pool.get_connection)
+        pool.release(c1)
+        self.assertTrue(pool.get_connection() is c1)
+        pool.release(c2, discard=True)
+        pool.close()
+
+    def test_idle_health_check(self):
+        pool = BloomdConnectionPool(self.tag, None, max_connections=1, idle_check_interval=0)
+        with pool.connection() as conn:
+            conn.send("list")
+            conn.readblock()
+        # a closed socket is readable with no pending response.
+        conn.sock.shutdown(0)
+        conn = pool.get_connection()
+        self.assertTrue(conn.sock is None)
+        pool.release(conn)
+
+    def test_shared_by_threads(self):
+        client = PooledBloomdClient([self.tag], max_connections=3)
+        f = client.create_filter("test", capacity=1000, prob=0.001)
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(50):
+                    key = "key_%d_%d" % (n, i)
+                    f.add(key)
+                    if key not in f:
+                        errors.append(key)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n, )) for n in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(f), 500)
+        self.assertTrue(len(client.server_conns[self.tag].pool.queue) <= 3)
+        res = f.pipeline().check("key_0_0").check("missing").execute()
+        self.assertEqual(res, [True, False])
+        client.close()
+
+    def test_auto_pipeline(self):
+        client = BloomdClient([self.tag])
+        f = client.create_filter("test", capacity=1000, prob=0.001)
+        f.add("key_0")
+        pipeline = f.auto_pipeline(max_commands=10, max_delay=60)
+        results = []
+        futures = [pipeline.check("key_%d" % i, callback=results.append) for i in range(10)]
+        # full buffer is flushed without waiting for max_delay
+        self.assertEqual([future.result(5) for future in futures], [True] + [False] * 9)
+        self.assertEqual(len(results), 10)
+
+        future = pipeline.add("key_1")
+        self.assertFalse(future.done())
+        pipeline.flush()
+        self.assertTrue(future.result(5))
+        pipeline.close()
+        self.assertRaises(BloomdError, pipeline.check, "key_1")
+
+    def test_auto_pipeline_delay(self):
+        client = BloomdClient([self.tag])
+        f = client.create_filter("test", capacity=1000, prob=0.001)
+        pipeline = f.auto_pipeline(max_commands=100, max_delay=0.01)
+        futures = [pipeline.add("key_%d" % i) for i in range(5)]
+        self.assertEqual([future.result(5) for future in futures], [True] * 5)
+        self.assertTrue(pipeline.check("key_4").result(5))
+        pipeline.close()
+
+    def test_sharded_filter(self):
+        other = FakeBloomdServer()
+        t = threading.Thread(target=other.serve_forever)
+        t.daemon = True
+        t.start()
+        other_tag = "127.0.0.1:%d" % other.server_address[1]
+        try:
+            for client in (BloomdClient([self.tag, other_tag]),
+                           PooledBloomdClient([self.tag, other_tag], max_connections=2)):
+                self.server.filters.clear()
+                other.filters.clear()
+                f = ShardedFilter(client, "test", capacity=1000, prob=0.001)
+                self.assertEqual(self.server.filters.keys(), ["test_shard_0"])
+                self.assertEqual(other.filters.keys(), ["test_shard_1"])
+                keys = ["key_%d" % i for i in range(100)]
+                self.assertEqual(f.multi(keys), [False] * 100)
+                self.assertEqual(f.bulk(keys[:50]), [True] * 50)
+                self.assertEqual(f.multi(keys), [True] * 50 + [False] * 50)
+                self.assertTrue(len(self.server.filters["test_shard_0"]) > 0)
+                self.assertTrue(len(other.filters["test_shard_1"]) > 0)
+                self.assertEqual(len(f), 50)
+                f.add(keys[99])
+                self.assertTrue(keys[99] in f)
+                pipeline = f.auto_pipeline(max_commands=10)
+                futures = [pipeline.check(k) for k in keys]
+                pipeline.flush()
+                self.assertEqual([future.result(5) for future in futures],
+                                 [True] * 50 + [False] * 49 + [True])
+                pipeline.close()
+        finally:
+            other.shutdown()
+            other.server_close()
+
+if __name__ == "__main__":
+    unittest.main()
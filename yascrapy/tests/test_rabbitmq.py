@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import unittest
+import pika
+from yascrapy import rabbitmq
+from yascrapy.rabbitmq import AsyncConsumer
+from yascrapy.rabbitmq import AsyncPublisher
+from yascrapy.rabbitmq import QueueMonitor
+from yascrapy.base import BaseProducer
+from yascrapy.filter_queue import FilterQueue
+from yascrapy.tests.fakes import FakeBlockingConnection
+from yascrapy.tests.fakes import FakeBloomdClient
+from yascrapy.tests.fakes import FakeChannel
+from yascrapy.tests.fakes import FakeMethod
+from yascrapy.tests.fakes import FakeWorker
+
+
+class TestAsyncConsumer(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = FakeWorker()
+        self.worker.ack_batch_size = 3
+        self.worker.ack_batch_delay = 0.1
+        cfg = {"RabbitmqIp": "127.0.0.1", "RabbitmqPort": 5672}
+        self.consumer = AsyncConsumer(cbk=self.worker._callback, cfg=cfg, worker=self.worker)
+        self.worker.consumer = self.consumer
+        self.channel = self.open_channel()
+
+    def open_channel(self):
+        channel = FakeChannel()
+        self.consumer._connection = channel.connection
+        self.consumer.on_channel_open(channel)
+        return channel
+
+    def ack(self, *tags):
+        for tag in tags:
+            self.worker.ack(self.channel, FakeMethod(tag))
+
+    def test_prefetch(self):
+        self.assertEqual(self.channel.prefetch_count, 3)
+
+    def test_no_batch(self):
+        self.consumer.ack_batch_size = 1
+        self.ack(2, 1)
+        self.assertEqual(self.channel.acks, [(2, False), (1, False)])
+
+    def test_out_of_order(self):
+        # 1 is not processed yet, nothing can be acked
+        self.ack(3, 2)
+        self.assertEqual(self.channel.acks, [])
+        self.assertEqual(self.channel.connection.timeouts, {})
+        self.ack(1)
+        self.assertEqual(self.channel.acks, [(3, True)])
+        self.ack(5, 4, 7)
+        self.assertEqual(self.channel.acks, [(3, True)])
+        self.ack(6)
+        self.assertEqual(self.channel.acks, [(3, True), (7, True)])
+        self.assertEqual(self.channel.connection.timeouts, {})
+
+    def test_timer(self):
+        self.ack(1)
+        self.assertEqual(self.channel.acks, [])
+        self.assertEqual(len(self.channel.connection.timeouts), 1)
+        self.channel.connection.run_timeouts()
+        self.assertEqual(self.channel.acks, [(1, True)])
+        self.ack(2, 4)
+        self.channel.connection.run_timeouts()
+        self.assertEqual(self.channel.acks, [(1, True), (2, True)])
+        # 4 waits for 3, no timer until then
+        self.assertEqual(self.channel.connection.timeouts, {})
+
+    def test_close_channel(self):
+        self.ack(1, 2, 4)
+        self.worker._close_channel(self.channel)
+        # 4 waits for 3 and is redelivered
+        self.assertEqual(self.channel.acks, [(2, True)])
+        self.assertTrue(self.channel.closed)
+        self.assertEqual(self.channel.connection.timeouts, {})
+        self.worker._close_channel(self.channel)
+        self.assertEqual(self.channel.acks, [(2, True)])
+
+    def test_reconnect(self):
+        self.ack(1, 3)
+        old = self.channel
+        self.channel = self.open_channel()
+        # delivery tags restart on the new channel
+        old.connection.run_timeouts()
+        self.ack(2)
+        self.channel.connection.run_timeouts()
+        self.assertEqual(old.acks, [])
+        self.assertEqual(self.channel.acks, [])
+        self.ack(1)
+        self.channel.connection.run_timeouts()
+        self.assertEqual(self.channel.acks, [(2, True)])
+
+
+class TestAsyncPublisher(unittest.TestCase):
+
+    def test_window(self):
+        publisher = AsyncPublisher(FakeBlockingConnection(), window=10)
+        impl = publisher.channel._impl
+        for i in range(25):
+            publisher.basic_publish(exchange="", routing_key="test", body=str(i))
+            self.assertTrue(len(publisher._outstanding) <= 10)
+        publisher.flush()
+        self.assertEqual(len(publisher._outstanding), 0)
+        self.assertEqual(impl.published, [str(i) for i in range(25)])
+
+    def test_resend_on_nack(self):
+        publisher = AsyncPublisher(FakeBlockingConnection(), window=100)
+        impl = publisher.channel._impl
+        impl.nack_bodies.add("3")
+        for i in range(5):
+            publisher.basic_publish(exchange="", routing_key="test", body=str(i))
+        publisher.flush()
+        self.assertEqual(impl.published, ["0", "1", "2", "3", "4", "3"])
+        self.assertEqual(publisher.nacked, 1)
+        self.assertEqual(len(publisher._outstanding), 0)
+
+
+class DepthChannel(object):
+
+    def __init__(self, depths):
+        self.depths = depths
+        self.closed = False
+
+    def queue_declare(self, queue, durable=False, passive=False):
+        if self.closed:
+            raise pika.exceptions.ChannelClosed()
+        if queue not in self.depths:
+            self.closed = True
+            raise pika.exceptions.ChannelClosed(404, "NOT_FOUND")
+        method = type("Method", (object,), {"message_count": self.depths[queue]})()
+        return type("Frame", (object,), {"method": method})()
+
+
+class DepthConnection(object):
+
+    def __init__(self, depths):
+        self.depths = depths
+        self.channels = 0
+
+    def channel(self):
+        self.channels += 1
+        return DepthChannel(self.depths)
+
+    def close(self):
+        pass
+
+
+class FakeResponse(object):
+
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class ChooseProducer(BaseProducer):
+
+    """`BaseProducer` without clients, `run` chooses more queues than the cached depths allow."""
+
+    def __init__(self, monitor):
+        self.queue_monitor = monitor
+        self._monitor_pid = None
+        self._req_queue_names = dict([(name, name) for name in monitor.queue_names])
+        self.request_queue_max = 5
+        self.publish_channel = None
+        self.filter_q = FilterQueue(bloomd_client=FakeBloomdClient(), crawler_name="test")
+
+    def run(self):
+        for i in range(30):
+            self.choose_request_queue()
+
+
+class TestQueueMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.depths = {"q0": 0, "q1": 3000, "q2": 5000}
+        self.conn = DepthConnection(self.depths)
+        self.cfg = {
+            "RabbitmqManagerIp": "127.0.0.1",
+            "RabbitmqManagerPort": 15672,
+            "RabbitmqUser": "guest",
+            "RabbitmqPassword": "guest",
+        }
+
+    def test_amqp(self):
+        monitor = QueueMonitor(self.cfg, ["q0", "missing", "q1", "q2"], conn_factory=lambda: self.conn)
+        self.assertEqual(monitor.poll(), self.depths)
+        # the channel closed by the missing queue is opened again
+        self.assertEqual(self.conn.channels, 2)
+        self.assertEqual(monitor.depth("q1"), 3000)
+        self.assertEqual(monitor.depth("missing"), None)
+        self.assertEqual(monitor.with_room(5000), ["q0", "missing", "q1"])
+
+    def test_http(self):
+        calls = []
+
+        def get(url, **kwargs):
+            calls.append(url)
+            return FakeResponse([{"name": "q0", "messages": 10}, {"name": "other", "messages": 1},
+                                 {"name": "q1"}])
+        get_orig = rabbitmq.requests.get
+        rabbitmq.requests.get = get
+        try:
+            monitor = QueueMonitor(self.cfg, ["q0", "q1"], source="http")
+            self.assertEqual(monitor.poll(), {"q0": 10, "q1": 0})
+        finally:
+            rabbitmq.requests.get = get_orig
+        self.assertEqual(calls, ["http://127.0.0.1:15672/api/queues/%2F"])
+
+    def test_choose(self):
+        monitor = QueueMonitor(self.cfg, ["q0", "q1", "q2"], conn_factory=lambda: self.conn)
+        monitor.poll()
+        counts = {"q0": 0, "q1": 0, "q2": 0}
+        for i in range(3000):
+            counts[monitor.choose(5000)] += 1
+        # q0 had 5000 room and q1 2000, both end up with about 3000 messages
+        self.assertEqual(counts["q2"], 0)
+        self.assertTrue(counts["q0"] > counts["q1"] * 2)
+        self.assertEqual(monitor.depth("q0") + monitor.depth("q1"), 3000 + 3000)
+        self.assertEqual(monitor.choose(5000, ["q2"]), None)
+        monitor.poll()
+        self.assertEqual(monitor.depth("q0"), 0)
+
+    def test_poll_error_keeps_depths(self):
+        conns = [self.conn]
+
+        def conn_factory():
+            if not conns:
+                raise Exception("connection refused")
+            return conns.pop()
+        monitor = QueueMonitor(self.cfg, ["q0", "q1"], conn_factory=conn_factory, interval=0.01)
+        monitor.start()
+        monitor._close()
+        monitor._poll_safe()
+        monitor.stop()
+        self.assertTrue(monitor.errors >= 1)
+        self.assertEqual(monitor.depths(), {"q0": 0, "q1": 3000})
+
+    def test_producer_fork(self):
+        depths = {"q0": 0, "q1": 0}
+        monitor = QueueMonitor(self.cfg, ["q0", "q1"], conn_factory=lambda: DepthConnection(depths),
+                               interval=0.01)
+        monitor.poll()
+        producer = ChooseProducer(monitor)
+        # like `yascrapy_producer`, built in the parent and started in a child
+        process = multiprocessing.Process(target=producer.start)
+        process.start()
+        process.join(10)
+        if process.is_alive():
+            process.terminate()
+        self.assertEqual(monitor._thread, None)
+        # the child goes on only if its own thread polls the depths raised by choose
+        self.assertEqual(process.exitcode, 0)
+
+if __name__ == "__main__":
+    unittest.main()
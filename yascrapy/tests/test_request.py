@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import unittest
+import json
+from yascrapy.request_queue import Request
+from yascrapy.request_queue import RequestQueue
+from yascrapy.request_queue import LiteRequest
+from yascrapy.request_queue import RequestError
+from yascrapy.request_queue import CODECS
+from yascrapy.request_queue import msgpack
+from yascrapy.filter_queue import FilterQueue
+from yascrapy.tests.fakes import FakeBloomdClient
+from yascrapy.tests.fakes import FakeImplChannel
+
+
+class TestRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.req_d = {
+            'crawler_name': 'test_crawler',
+            'url': u'http://stackoverflow.com/users/1144035/中文',
+            'proxy_name': 'http_china',
+            'method': 'POST',
+            'headers': {'User-Agent': 'yascrapy'},
+            'data': 'a=1',
+            'params': {'page': '1'},
+            'cookies': {},
+            'timeout': 10,
+        }
+        self.req = Request(**self.req_d)
+        # msgpack is an optional extra
+        self.codecs = [c for c in CODECS if c != "msgpack" or msgpack is not None]
+
+    def test_codecs(self):
+        for codec in self.codecs:
+            data = self.req.encode(codec)
+            r = Request()
+            r.decode(data)
+            for k, v in self.req_d.items():
+                self.assertEqual(getattr(r, k), v)
+
+    def test_json_compatible(self):
+        self.assertEqual(json.loads(self.req.encode("json")), json.loads(self.req.to_json()))
+        r = Request()
+        r.decode(self.req.to_json())
+        self.assertEqual(r.url, self.req.url)
+        self.assertTrue(len(self.req.encode("tuple")) < len(self.req.to_json()))
+
+    def test_unknown_codec(self):
+        self.assertRaises(RequestError, self.req.encode, "xml")
+        self.assertRaises(RequestError, Request().decode, "\xff")
+
+    def test_lite_request(self):
+        r = LiteRequest(**self.req_d)
+        self.assertFalse(hasattr(r, "__dict__"))
+        self.assertEqual(json.loads(r.to_json()), json.loads(self.req.to_json()))
+        for codec in self.codecs:
+            lite = LiteRequest()
+            lite.decode(self.req.encode(codec))
+            self.assertEqual(lite.encode(codec), self.req.encode(codec))
+        lib = r.to_request_lib()
+        self.assertTrue(isinstance(lib, Request))
+        self.assertEqual(lib.prepare().url, self.req.prepare().url)
+        self.assertEqual(LiteRequest().timeout, Request().timeout)
+        self.assertEqual(LiteRequest().method, Request().method)
+
+    def test_safe_push_pipeline(self):
+        bloomd_client = FakeBloomdClient()
+        for pipeline_size in (0, 100):
+            bloomd_client.filter.keys = set(["http://example.com/0"])
+            filter_q = FilterQueue(bloomd_client=bloomd_client, crawler_name="test_crawler",
+                                   pipeline_size=pipeline_size)
+            req_q = RequestQueue("test_crawler", ssdb_clients=[], filter_q=filter_q)
+            channel = FakeImplChannel()
+            reqs = [LiteRequest(url="http://example.com/%d" % i, crawler_name="test_crawler")
+                    for i in range(4)]
+            req_q.safe_push(reqs[0], channel)
+            req_q.safe_push(reqs[1], channel)
+            pushed = req_q.safe_push_many(reqs + reqs[2:3], channel)
+            self.assertEqual(pushed, reqs[2:])
+            self.assertEqual(len(channel.published), 3)
+            filter_q.close()
+            self.assertEqual(bloomd_client.filter.keys, set(r.url for r in reqs))
+        # checks are flushed at once, adds are sent by the pipeline or `close`
+        pipeline = bloomd_client.filter.pipelines[0]
+        self.assertEqual(len(bloomd_client.filter.pipelines), 1)
+        self.assertEqual(pipeline.flushes, 4)
+        self.assertTrue(pipeline.closed)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import tempfile
+import threading
+import unittest
+from yascrapy.resources import Resources
+from yascrapy.libs.pybloomd import PooledBloomdClient
+from yascrapy.plugins.mongo import Plugin as MongoHandler
+
+
+class TestResources(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_file = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps({
+                "RabbitmqIp": "127.0.0.1",
+                "RabbitmqPort": 5672,
+                "ProxyRedisIp": "127.0.0.1",
+                "ProxyRedisPort": 6379,
+                "SSDBNodes": [{"Host": "127.0.0.1", "Port": 8888}, {"Host": "127.0.0.2", "Port": 8888}],
+                "BloomdNodes": [{"Host": "127.0.0.1", "Port": 8673}]
+            }))
+
+    def tearDown(self):
+        os.remove(self.config_file)
+
+    def test_shared(self):
+        resources = Resources(self.config_file, threads=10)
+        res = []
+
+        def _get():
+            res.append((resources.cfg, resources.ssdb_clients, resources.proxy_client, resources.bloomd_client))
+        threads = [threading.Thread(target=_get) for i in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for r in res:
+            for a, b in zip(r, res[0]):
+                self.assertTrue(a is b)
+        self.assertTrue(isinstance(resources.bloomd_client, PooledBloomdClient))
+        self.assertEqual(len(resources.ssdb_clients[0]), 2)
+
+    def test_plugin(self):
+        resources = Resources(self.config_file)
+        handlers = []
+        for i in range(3):
+            fake_worker = type("Worker", (object, ), {})
+            fake_worker.db_name = "test"
+            fake_worker.mongo_tables = []
+            fake_worker.mongo_ip = "127.0.0.1"
+            fake_worker.mongo_port = 27017
+            fake_worker.resources = resources
+            handlers.append(MongoHandler(fake_worker))
+        self.assertTrue(handlers[0].client is handlers[2].client)
+        resources.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,8 +4,19 @@ import unittest
 import json
 from yascrapy.response_queue import Response
 from yascrapy.response_queue import Selector
+from yascrapy.response_queue import ResponseQueue
+from yascrapy.response_queue import train_dictionary
+from yascrapy.response_queue import lz4
+from yascrapy.response_queue import selector_cache
+from yascrapy.response_queue import NodePool
+from yascrapy.response_queue import node_pool
+from yascrapy.response_queue import StreamExtractor
+from yascrapy.response_queue import StreamField
+from yascrapy.ssdb import get_clients
+from yascrapy.tests.fakes import FakeRedis
 import os
 
+
 class TestResponse(unittest.TestCase):
     def setUp(self):
         html_file = os.path.join(os.path.dirname(__file__), "test.html")
@@ -119,5 +130,152 @@ class TestResponse(unittest.TestCase):
         for each in res:
             self.assertNotEqual(each, [])
 
+    def test_lazy_compat(self):
+        self.assertFalse("raw" in self.resp.__dict__ or "_content" in self.resp.__dict__)
+        self.assertEqual(self.resp.status_code, 200)
+        self.assertEqual(self.resp.url, self.resp_d["url"])
+        self.assertEqual(self.resp.content, self.resp.html.encode("utf-8"))
+        self.assertTrue(self.resp.raw is not None)
+        self.assertEqual(self.resp.encoding, "utf-8")
+        self.assertTrue(self.resp.text is self.resp.html)
+        self.assertEqual(self.resp.http_proxy, "127.0.0.1:8000")
+
+    def test_selector_cache(self):
+        selector_cache.clear()
+        for i in range(3):
+            self.assertNotEqual(self.resp.css(".badges .badgecount").extract(), [])
+        stats = selector_cache.stats()
+        self.assertEqual((stats["css_hits"], stats["css_misses"]), (2, 1))
+        self.assertEqual((stats["xpath_hits"], stats["xpath_misses"]), (2, 1))
+        selector_cache.resize(0)
+        self.resp.xpath("//h2").extract()
+        self.assertEqual(selector_cache.stats()["xpath_size"], 0)
+        selector_cache.resize(1024)
+
+    def test_stream(self):
+        extractor = StreamExtractor([
+            StreamField("title", "title"),
+            StreamField("name", "h2", attrs={"class": "user-card-name"}),
+            StreamField("badge", "span", attrs={"class": "badgecount"}),
+            StreamField("missing", "h2", attrs={"class": "missing"}),
+        ], chunk_size=4096)
+        res = self.resp.stream(extractor)
+        self.assertEqual(res["title"], "User Gordon Linoff - Stack Overflow")
+        self.assertEqual(res["name"], self.resp.xpath('//h2[@class="user-card-name"]')[0].strip())
+        self.assertEqual(res["badge"], "20")
+        self.assertEqual(res["missing"], None)
+        extractor = StreamExtractor([
+            StreamField("badges", "span", attrs={"class": "badgecount"}, value=lambda e: int(e.text), many=True),
+            StreamField("title", "title")
+        ])
+        res = self.resp.stream(extractor)
+        self.assertEqual(res["badges"][:3], [20, 98, 151])
+        self.assertEqual(len(res["badges"]), len(self.resp.css(".badgecount")))
+
+    def test_get_data(self):
+        ssdb_clients = get_clients(nodes=[{"Host": "127.0.0.1", "Port": 8888}])
+        redis = FakeRedis()
+        ssdb_clients[0][0]["client"] = redis
+        key = "http_response:test:1"
+        data = json.dumps(self.resp_d)
+        # pipelined GET and DEL, or one GETDEL
+        for use_getdel, delete_command in ((False, "delete"), (True, "getdel")):
+            resp_q = ResponseQueue(self.crawler_name, ssdb_clients=ssdb_clients, use_getdel=use_getdel)
+            redis.data[key] = data
+            redis.commands = 0
+            self.assertEqual(resp_q.get_data(key), data)
+            self.assertEqual(redis.commands, 1)
+            self.assertEqual(redis.data, {})
+            self.assertEqual(resp_q.get_data(key), None)
+            self.assertEqual(resp_q.get(key), (None, 1))
+            # not processed, put back for the redelivered message
+            resp_q.restore_data(key, data)
+            resp_q.restore_data("http_response:test:missing", None)
+            self.assertEqual(redis.data, {key: data})
+            redis.fail = set([delete_command])
+            self.assertRaises(IOError, resp_q.get_data, key)
+            redis.fail = set()
+            self.assertEqual(redis.data, {key: data})
+            resp, code = resp_q.get(key)
+            self.assertEqual((resp.url, code), (self.resp_d["url"], 0))
+            self.assertEqual(redis.data, {})
+
+    def test_get_many(self):
+        ssdb_clients = get_clients(nodes=[{"Host": "10.0.0.%d" % i, "Port": 8888} for i in range(3)])
+        for client in ssdb_clients[0]:
+            client["client"] = FakeRedis()
+        resp_q = ResponseQueue(self.crawler_name, ssdb_clients=ssdb_clients)
+        keys = ["http_response:test:%d" % i for i in range(30)]
+        for i, k in enumerate(keys[:20]):
+            d = dict(self.resp_d, url=str(i))
+            resp_q.ssdb_clients[1].get_client(k)["client"].data[k] = json.dumps(d)
+        responses = resp_q.get_many(keys)
+        self.assertEqual([r.url for r in responses[:20]], [str(i) for i in range(20)])
+        self.assertEqual(responses[20:], [None] * 10)
+        for client in ssdb_clients[0]:
+            self.assertEqual(client["client"].data, {})
+            # one MGET and one DEL
+            self.assertEqual(client["client"].commands, 2)
+        resp, code = resp_q.get(keys[0])
+        self.assertEqual((resp, code), (None, 1))
+        # one node pool is reused by later calls and other response queues
+        pool = node_pool.pool
+        resp_q.get_many(keys)
+        ResponseQueue(self.crawler_name, ssdb_clients=ssdb_clients).get_many(keys)
+        self.assertTrue(node_pool.pool is pool)
+        self.assertEqual(resp_q.get_many([]), [])
+        self.assertEqual(resp_q.get_many_data([]), [])
+
+    def test_node_pool(self):
+        pool = NodePool()
+        self.assertEqual(pool.map(lambda x: x * 2, [1, 2]), [2, 4])
+        small = pool.pool
+        self.assertEqual(pool.map(lambda x: x * 2, [1]), [2])
+        self.assertTrue(pool.pool is small)
+        # a larger pool replaces the old one, its threads exit
+        self.assertEqual(pool.map(lambda x: x * 2, [1, 2, 3]), [2, 4, 6])
+        self.assertEqual(pool.size, 3)
+        small.join()
+        pool.pool.close()
+
+    def test_get_many_error(self):
+        ssdb_clients = get_clients(nodes=[{"Host": "10.0.0.%d" % i, "Port": 8888} for i in range(3)])
+        for client in ssdb_clients[0]:
+            client["client"] = FakeRedis()
+        resp_q = ResponseQueue(self.crawler_name, ssdb_clients=ssdb_clients)
+        keys = ["http_response:test:%d" % i for i in range(30)]
+        for k in keys:
+            resp_q.ssdb_clients[1].get_client(k)["client"].data[k] = json.dumps(self.resp_d)
+        saved = [dict(client["client"].data) for client in ssdb_clients[0]]
+        # responses stay on every node if one node fails
+        for command in ("mget", "delete"):
+            ssdb_clients[0][1]["client"].fail = set([command])
+            self.assertRaises(IOError, resp_q.get_many_data, keys)
+            self.assertEqual([client["client"].data for client in ssdb_clients[0]], saved)
+
+    def test_compression(self):
+        ssdb_clients = get_clients(nodes=[{"Host": "10.0.0.%d" % i, "Port": 8888} for i in range(3)])
+        for client in ssdb_clients[0]:
+            client["client"] = FakeRedis()
+        dictionary = train_dictionary([self.resp.html, self.resp.html.replace("1", "2")])
+        ResponseQueue(self.crawler_name, ssdb_clients=ssdb_clients).save_dictionary(dictionary)
+        plain_size = len(self.resp.to_json())
+        cases = [("zlib", False, None), ("zlib", True, dictionary), ("zlib", False, dictionary)]
+        if lz4 is not None:
+            cases.append(("lz4", True, None))
+        for compression, html_only, d in cases:
+            resp_q = ResponseQueue(self.crawler_name, ssdb_clients=ssdb_clients, compression=compression,
+                                   compress_html_only=html_only, dictionary=d)
+            key = "http_response:test:%s:%s" % (compression, html_only)
+            resp_q.push_cache(self.resp, key)
+            data = ssdb_clients[1].get_client(key)["client"].data[key]
+            self.assertTrue(len(data) < plain_size / 3)
+            # a worker queue without compression settings detects the header
+            resp, code = ResponseQueue(self.crawler_name, ssdb_clients=ssdb_clients).get(key)
+            self.assertEqual(code, 0)
+            self.assertEqual(resp.html, self.resp.html)
+            self.assertEqual(resp.url, self.resp.url)
+            self.assertEqual(resp.status_code, 200)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import unittest
+from yascrapy.runtime import EventRuntime
+from yascrapy.response_queue import ResponseQueue
+from yascrapy.ssdb import get_clients
+from yascrapy.utils import init_resp_data
+from yascrapy.tests.fakes import FakeRedis
+from yascrapy.tests.fakes import FakeChannel
+from yascrapy.tests.fakes import FakeMethod
+from yascrapy.tests.fakes import FakeWorker
+
+
+class Worker(FakeWorker):
+
+    def __init__(self, ssdb_clients):
+        FakeWorker.__init__(self)
+        self.ssdb_clients = ssdb_clients
+        self.resp_q = ResponseQueue("test_crawler", ssdb_clients=ssdb_clients)
+        self.urls = []
+
+    def callback(self, channel, method, properties, body):
+        response, err = self.resp_q.get(body)
+        self.ack(channel, method)
+        if response is None:
+            return
+        if response.url == "error":
+            raise ValueError("callback error")
+        self.urls.append(response.url)
+
+
+class TestEventRuntime(unittest.TestCase):
+
+    def setUp(self):
+        self.ssdb_clients = get_clients(nodes=[{"Host": "127.0.0.1", "Port": 8888}])
+        self.redis = FakeRedis()
+        self.ssdb_clients[0][0]["client"] = self.redis
+        self.worker = Worker(self.ssdb_clients)
+        self.runtime = EventRuntime(self.worker, concurrency=500, fetch_threads=2, fetch_batch_size=10)
+        self.runtime.start_fetchers()
+        self.channel = FakeChannel()
+
+    def push(self, key, url):
+        resp_d = init_resp_data("test_crawler")
+        resp_d["url"] = url
+        self.redis.data[key] = json.dumps(resp_d)
+
+    def run_loop(self, channel=None):
+        channel = channel or self.channel
+        for i in range(100):
+            channel.connection.run_timeouts()
+            if not self.runtime._fetching and not self.runtime._pending:
+                return
+            time.sleep(0.01)
+
+    def test_callback(self):
+        self.assertEqual(self.worker.prefetch_count, 500)
+        for i in range(25):
+            self.push("k%d" % i, "u%d" % i)
+            self.worker._callback(self.channel, FakeMethod(i + 1), None, "k%d" % i)
+        self.worker._callback(self.channel, FakeMethod(26), None, "missing")
+        self.run_loop()
+        self.assertEqual(sorted(self.worker.urls), sorted(["u%d" % i for i in range(25)]))
+        self.assertEqual(sorted(self.channel.acked), range(1, 27))
+        self.assertEqual(self.redis.data, {})
+        self.assertEqual(self.worker.resp_q._preloaded, {})
+        self.assertEqual(self.runtime.stats()["dispatched"], 26)
+
+    def test_error(self):
+        for i, url in enumerate(["u0", "error", "u2"]):
+            self.push("k%d" % i, url)
+            self.worker._callback(self.channel, FakeMethod(i + 1), None, "k%d" % i)
+        self.run_loop()
+        self.assertTrue(self.channel.closed)
+        self.assertEqual(self.worker.urls, ["u0"])
+        # not processed, kept for redelivery
+        self.assertEqual(self.redis.data.keys(), ["k2"])
+
+    def test_error_queued_batches(self):
+        runtime = EventRuntime(self.worker, fetch_threads=1, fetch_batch_size=2)
+        runtime.start_fetchers()
+        for i, url in enumerate(["error", "u1", "u2", "u3"]):
+            self.push("k%d" % i, url)
+            self.worker._callback(self.channel, FakeMethod(i + 1), None, "k%d" % i)
+        while runtime._done_q.qsize() < 2:
+            time.sleep(0.01)
+        # both batches are drained by one timeout, the second one after the channel is closed
+        self.channel.connection.run_timeouts()
+        self.assertTrue(self.channel.closed)
+        self.assertEqual(self.worker.urls, [])
+        self.assertEqual(self.channel.acked, [1])
+        self.assertEqual(runtime.stats()["fetching"], 0)
+        self.assertEqual(sorted(self.redis.data), ["k1", "k2", "k3"])
+
+    def test_closed_channel(self):
+        self.push("k0", "u0")
+        self.worker._callback(self.channel, FakeMethod(1), None, "k0")
+        self.worker._batch_id += 1
+        self.run_loop()
+        self.assertEqual(self.worker.urls, [])
+        self.assertEqual(self.redis.data.keys(), ["k0"])
+
+    def test_reconnect(self):
+        for i in range(4):
+            self.push("k%d" % i, "u%d" % i)
+        for i in range(3):
+            self.worker._callback(self.channel, FakeMethod(i + 1), None, "k%d" % i)
+        # the batch timeout submits the fetch, its drain waits on the old connection
+        self.channel.connection.run_timeouts()
+        while self.runtime._done_q.empty():
+            time.sleep(0.01)
+        self.worker._callback(self.channel, FakeMethod(4), None, "k3")
+        self.assertEqual(self.runtime.stats()["fetching"], 1)
+        # the connection is lost, its timeouts never run
+        new_channel = FakeChannel()
+        self.worker.init_resp_queue(new_channel.connection)
+        self.assertEqual(len(new_channel.connection.timeouts), 1)
+        self.run_loop(new_channel)
+        self.assertEqual(self.runtime.stats()["fetching"], 0)
+        self.assertEqual(self.runtime.stats()["waiting"], 0)
+        self.assertEqual(self.worker.urls, [])
+        # fetched responses are put back for the redelivered messages
+        self.assertEqual(sorted(self.redis.data), ["k0", "k1", "k2", "k3"])
+        for i in range(4):
+            self.worker._callback(new_channel, FakeMethod(i + 1), None, "k%d" % i)
+        self.run_loop(new_channel)
+        self.assertEqual(sorted(self.worker.urls), ["u0", "u1", "u2", "u3"])
+        self.assertEqual(sorted(new_channel.acked), [1, 2, 3, 4])
+        self.assertEqual(self.channel.acked, [])
+        self.assertEqual(self.redis.data, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+import hash_ring
+from yascrapy.ssdb import get_clients
+from yascrapy.ssdb import get_client
+from yascrapy.ssdb import KeyScanner
+from yascrapy.tests.fakes import FakeSSDB
+
+
+class TestSSDB(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes = [{"Host": "10.0.0.%d" % i, "Port": 8888} for i in range(8)]
+        self.keys = ["http_response:test:http://stackoverflow.com/users?page=%d" % i for i in range(1000)]
+
+    def test_get_client(self):
+        ring = hash_ring.HashRing(["%s:%s" % (n["Host"], n["Port"]) for n in self.nodes])
+        for memo_size in (0, 10):
+            clients = get_clients(nodes=self.nodes, memo_size=memo_size)
+            for k in self.keys + self.keys[:20]:
+                self.assertEqual(get_client(clients, k)["tag"], ring.get_node(k))
+            self.assertTrue(len(clients[1].memo) <= memo_size)
+
+    def test_single_node(self):
+        clients = get_clients(nodes=self.nodes[:1])
+        self.assertEqual(get_client(clients, self.keys[0])["tag"], "10.0.0.0:8888")
+        self.assertEqual(get_client(get_clients(nodes=[]), self.keys[0]), None)
+
+
+class TestKeyScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.keys = ["http_response:test:%03d" % i for i in range(25)]
+        self.client = FakeSSDB(dict.fromkeys(self.keys + ["http_request:test:1", "http_response:tests:1"], ""))
+        self.start = "http_response:test:"
+        self.end = "http_response:test:z"
+        fd, self.checkpoint = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        os.remove(self.checkpoint)
+
+    def tearDown(self):
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def test_pages(self):
+        scanner = KeyScanner(self.client, self.start, self.end, page_size=10)
+        self.assertEqual([len(keys) for keys in scanner.pages()], [10, 10, 5])
+        self.assertEqual(list(KeyScanner(self.client, self.start, self.end, page_size=10)), self.keys)
+        # every page continues after the last key seen
+        self.assertEqual([c[1] for c in self.client.commands[:3]],
+                         [self.start, self.keys[9], self.keys[19]])
+        self.assertEqual(list(scanner.pages()), [])
+        scanner.reset()
+        self.assertEqual(list(scanner), self.keys)
+
+    def test_checkpoint(self):
+        scanner = KeyScanner(self.client, self.start, self.end, page_size=10, checkpoint=self.checkpoint)
+        pages = scanner.pages()
+        next(pages)
+        next(pages)
+        # the second page is not handled yet, only the first one is saved
+        resumed = KeyScanner(self.client, self.start, self.end, page_size=10, checkpoint=self.checkpoint)
+        self.assertEqual(list(resumed), self.keys[10:])
+        finished = KeyScanner(self.client, self.start, self.end, page_size=10, checkpoint=self.checkpoint)
+        self.assertEqual(list(finished), [])
+        other = KeyScanner(self.client, "http_request:test:", "http_request:test:z", checkpoint=self.checkpoint)
+        self.assertEqual(list(other), ["http_request:test:1"])
+
+if __name__ == "__main__":
+    unittest.main()
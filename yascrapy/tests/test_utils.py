@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import codecs
+import unittest
+from yascrapy import utils
+
+
+class TestDecode(unittest.TestCase):
+
+    def setUp(self):
+        self.text = u"<html><head><title>中文 页面</title></head><body>%s</body></html>" % (u"数据" * 100)
+
+    def test_declared(self):
+        html = self.text.encode("gbk")
+        self.assertEqual(utils.decode(html, content_type="text/html; charset=GBK"), self.text)
+        meta = self.text.replace(u"<head>", u'<head><meta charset="gb2312">')
+        self.assertEqual(utils.decode(meta.encode("gbk")), meta)
+        self.assertEqual(utils.decode(codecs.BOM_UTF16_LE + self.text.encode("utf-16-le")), self.text)
+        self.assertEqual(utils.decode(self.text.encode("utf-8"), content_type="text/html; charset=bogus"), self.text)
+        self.assertEqual(utils.decode(u"ok"), u"ok")
+
+    def test_host_cache(self):
+        text = u"<html><body>%s</body></html>" % (u"日本語のテキストです。" * 50)
+        html = text.encode("shift_jis")
+        url = "http://jp.example.com/page"
+        self.assertEqual(utils.decode(html, url=url), text)
+        encoding = utils.encoding_cache.get("jp.example.com")
+        self.assertTrue(encoding is not None)
+        self.assertEqual(utils.decode(html, url=url), text)
+
+if __name__ == "__main__":
+    unittest.main()
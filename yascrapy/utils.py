@@ -1,10 +1,36 @@
 #!/usr/bin/python
 # coding: utf-8
 import io
+import re
+import codecs
 import base64
+import threading
+import urlparse
+from collections import OrderedDict
 from requests.packages.urllib3 import HTTPResponse
 import chardet
 
+# utf-32 first, its little endian BOM starts with the utf-16 one
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+CHARSET_RE = re.compile(r"""charset\s*=\s*["']?([\w.:-]+)""", re.I)
+NON_ASCII_RE = re.compile(r"[\x80-\xff]")
+META_CHARSET_RE = re.compile(r"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)""", re.I)
+# labels decoded with their superset, as browsers do
+ENCODING_ALIASES = {
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "iso-8859-1": "cp1252",
+    "latin-1": "cp1252",
+    "ascii": "cp1252",
+    "us-ascii": "cp1252",
+}
+
 
 def init_req_data(crawler_name):
     return {
@@ -72,12 +98,93 @@ def add_urllib3_response(serialized, response, headers):
     response.raw = h
 
 
-def decode(s):
-    raw_s = s
-    if hasattr(s, "decode"):
-        try:
-            raw_s = s.decode("ascii")
-        except Exception:
-            encoding = chardet.detect(s)["encoding"]
-            raw_s = s.decode(encoding)
-    return raw_s
+class EncodingCache(object):
+
+    """LRU map of host to the encoding detected by `chardet` for its pages."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.hosts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, host):
+        with self.lock:
+            encoding = self.hosts.pop(host, None)
+            if encoding is not None:
+                self.hosts[host] = encoding
+            return encoding
+
+    def set(self, host, encoding):
+        with self.lock:
+            self.hosts.pop(host, None)
+            self.hosts[host] = encoding
+            while len(self.hosts) > self.maxsize:
+                self.hosts.popitem(last=False)
+
+
+encoding_cache = EncodingCache()
+
+
+def _normalize_encoding(label):
+    label = label.strip().lower()
+    label = ENCODING_ALIASES.get(label, label)
+    try:
+        return codecs.lookup(label).name
+    except LookupError:
+        return None
+
+
+def _try_decode(s, label):
+    encoding = _normalize_encoding(label) if label else None
+    if encoding is None:
+        return None
+    try:
+        return s.decode(encoding)
+    except (UnicodeDecodeError, LookupError):
+        return None
+
+
+def decode(s, content_type=None, url=None, sniff_size=4096, detect_size=16 * 1024):
+    """Decode html bytes to unicode, `chardet` is the last resort.
+
+    :param s: string, unicode is returned as it is.
+    :param content_type: optional string, http `Content-Type` header.
+    :param url: optional string, page url, encodings detected by `chardet` are cached by host.
+    :param sniff_size: optional int, bytes searched for `<meta charset>`.
+    :param detect_size: optional int, bytes given to `chardet`, from the first non-ascii byte.
+    :returns: unicode.
+
+    Encoding is taken from the BOM, the `Content-Type` charset, the meta
+    charset in the beginning of the page, utf-8, the host cache, then
+    `chardet` on `detect_size` bytes.
+    """
+    if not isinstance(s, str):
+        return s
+    for bom, encoding in BOMS:
+        if s.startswith(bom):
+            return s[len(bom):].decode(encoding, "replace")
+    if content_type:
+        m = CHARSET_RE.search(content_type)
+        raw_s = _try_decode(s, m.group(1)) if m else None
+        if raw_s is not None:
+            return raw_s
+    m = META_CHARSET_RE.search(s, 0, sniff_size)
+    raw_s = _try_decode(s, m.group(1)) if m else None
+    if raw_s is not None:
+        return raw_s
+    raw_s = _try_decode(s, "utf-8")
+    if raw_s is not None:
+        return raw_s
+    host = urlparse.urlparse(url).netloc if url else None
+    if host:
+        raw_s = _try_decode(s, encoding_cache.get(host))
+        if raw_s is not None:
+            return raw_s
+    # utf-8 failed, so there is a non-ascii byte
+    start = NON_ASCII_RE.search(s).start()
+    encoding = _normalize_encoding(chardet.detect(s[start:start + detect_size])["encoding"] or "cp1252")
+    if encoding is None:
+        encoding = "cp1252"
+    if host:
+        encoding_cache.set(host, encoding)
+    return s.decode(encoding, "replace")